@@ -9,6 +9,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stockpredictor.settings')
 django.setup()
 
 from django.contrib.auth.models import User
+from predictor.archive import order_count
 from predictor.models import StockOrder, TradingAccount, Portfolio
 
 # Get all users
@@ -18,7 +19,7 @@ print(f"Total users: {users.count()}\n")
 for user in users:
     print(f"User: {user.username}")
     print(f"  - Trading Account Balance: ৳{TradingAccount.get_or_create_account(user).balance}")
-    print(f"  - Total Orders: {StockOrder.objects.filter(user=user).count()}")
+    print(f"  - Total Orders: {order_count(user)} (archived: {user.archived_orders.count()})")
     print(f"  - Portfolio Items: {Portfolio.objects.filter(user=user).count()}")
     
     # Show recent orders
@@ -0,0 +1,130 @@
+"""
+Per-user account snapshots in the Django cache.
+
+A snapshot is what ``trading_data`` GET returns (balance, recent orders,
+holdings), stored under the account's ledger version:
+
+    account:<user id>:version       -> current ledger version
+    account:<user id>:v<version>    -> snapshot at that version
+
+Order execution writes the new snapshot right after its transaction
+commits and moves the version pointer to it, so the GET that follows a trade
+is answered from the cache without touching the database.
+
+The pointer only moves forward. Readers create it with ``cache.add`` (never
+overwriting one), commit hooks raise it only when it is behind, and since
+every commit bumps the ledger version by one, a reader that finds a snapshot
+stored for the version after the pointer knows the pointer fell behind (a
+reader's old value added just before a hook ran, or two hooks racing) and
+follows the snapshots forward. Whatever is cached expires after
+ACCOUNT_SNAPSHOT_TIMEOUT seconds at the latest.
+"""
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Portfolio, TradingAccount
+
+logger = logging.getLogger(__name__)
+
+# Orders and holdings listed in a snapshot
+SNAPSHOT_ROWS = 10
+
+
+def _version_key(user_id):
+    return f"account:{user_id}:version"
+
+
+def _snapshot_key(user_id, version):
+    return f"account:{user_id}:v{version}"
+
+
+def _timeout():
+    return getattr(settings, 'ACCOUNT_SNAPSHOT_TIMEOUT', 300)
+
+
+def account_version(user):
+    """Current ledger version of a user's account, from the cache when possible (None without an account)"""
+    version = cache.get(_version_key(user.pk))
+    if version is None:
+        version = TradingAccount.objects.filter(user=user).values_list('ledger_version', flat=True).first()
+        if version is not None:
+            cache.add(_version_key(user.pk), version, _timeout())
+        return version
+    return _catch_up(user.pk, version)
+
+
+def _catch_up(user_id, version):
+    """Follow snapshots stored for later versions than the pointer and move the pointer to the last one"""
+    latest = version
+    while cache.get(_snapshot_key(user_id, latest + 1)) is not None:
+        latest += 1
+    if latest != version:
+        _advance_version(user_id, latest)
+    return latest
+
+
+def _advance_version(user_id, version):
+    """Point the account at ``version`` unless the pointer already shows that or a later one"""
+    key = _version_key(user_id)
+    current = cache.get(key)
+    if current is None:
+        if cache.add(key, version, _timeout()):
+            return
+        current = cache.get(key)
+    if current is None or current < version:
+        cache.set(key, version, _timeout())
+
+
+def account_snapshot(user):
+    """Balance, recent orders and holdings of a user's account"""
+    version = account_version(user)
+    if version is not None:
+        snapshot = cache.get(_snapshot_key(user.pk, version))
+        if snapshot is not None:
+            return snapshot
+    snapshot = build_account_snapshot(user)
+    cache.set(_snapshot_key(user.pk, snapshot['ledger_version']), snapshot, _timeout())
+    cache.add(_version_key(user.pk), snapshot['ledger_version'], _timeout())
+    return snapshot
+
+
+def build_account_snapshot(user):
+    """Read a user's account snapshot from the database"""
+    from .orders import order_dict, order_history  # orders imports this module
+
+    account = TradingAccount.get_or_create_account(user)
+    orders, _ = order_history(user, limit=SNAPSHOT_ROWS, include_archived=True)
+    portfolio_items = Portfolio.objects.filter(user=user).order_by('-updated_at')[:SNAPSHOT_ROWS]
+    return {
+        'ledger_version': account.ledger_version,
+        'balance': float(account.balance),
+        'orders': [order_dict(order) for order in orders],
+        'portfolio': [{
+            'symbol': item.symbol,
+            'quantity': item.quantity,
+            'avg_price': float(item.avg_price)
+        } for item in portfolio_items],
+    }
+
+
+def store_account_snapshot(user, committed_version):
+    """Write a fresh snapshot and move the account's version pointer forward to it"""
+    version = committed_version
+    try:
+        snapshot = build_account_snapshot(user)
+        # Read after the commit, so at least committed_version (later if more orders landed since)
+        version = max(version, snapshot['ledger_version'])
+        cache.set(_snapshot_key(user.pk, snapshot['ledger_version']), snapshot, _timeout())
+    except Exception as e:
+        # The trade itself has committed; with no snapshot at the new version readers rebuild it
+        logger.error(f"Could not refresh account snapshot for user {user.pk}: {str(e)}")
+    _advance_version(user.pk, version)
+
+
+def refresh_account_snapshot_on_commit(user, committed_version):
+    """Replace a user's snapshot once the transaction that produced ``committed_version`` commits"""
+    transaction.on_commit(partial(store_account_snapshot, user, committed_version))
@@ -0,0 +1,76 @@
+"""
+Archival of old orders.
+
+``archive_orders`` moves StockOrder rows older than ORDER_ARCHIVE_AFTER_DAYS
+into ArchivedStockOrder in batches of ORDER_ARCHIVE_BATCH_SIZE, one short
+transaction per batch, so the hot table (and its indexes and vacuum work)
+stays proportional to recent activity. Rows keep their ids, which makes a
+re-run after an interrupted batch harmless and lets keyset cursors span
+both tables.
+
+Readers that need the full history go through ``order_history(...,
+include_archived=True)``, ``all_order_rows`` or ``order_count``; the account
+snapshot and the equity backfill already do.
+"""
+import heapq
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedStockOrder, StockOrder
+
+logger = logging.getLogger(__name__)
+
+ORDER_FIELDS = ('id', 'user_id', 'symbol', 'order_type', 'quantity', 'price', 'total_amount', 'timestamp')
+
+
+def archive_cutoff(days=None):
+    """Orders placed before this moment are due for archival"""
+    days = days if days is not None else getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 365)
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_orders(days=None, batch_size=None, max_batches=None):
+    """Move orders older than ``days`` into the archive; returns how many moved"""
+    cutoff = archive_cutoff(days)
+    batch_size = batch_size or getattr(settings, 'ORDER_ARCHIVE_BATCH_SIZE', 1000)
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        # Oldest first along the primary key; orders get ids in time order
+        rows = list(StockOrder.objects.filter(timestamp__lt=cutoff).order_by('id').values(*ORDER_FIELDS)[:batch_size])
+        if not rows:
+            break
+        with transaction.atomic():
+            ArchivedStockOrder.objects.bulk_create(
+                [ArchivedStockOrder(**row) for row in rows], ignore_conflicts=True,
+            )
+            StockOrder.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
+        batches += 1
+        logger.info(f"Archived {len(rows)} orders (batch {batches}, {moved} so far)")
+    return moved
+
+
+def order_count(user):
+    """Every order a user has placed, archived or not"""
+    return StockOrder.objects.filter(user=user).count() + ArchivedStockOrder.objects.filter(user=user).count()
+
+
+def all_order_rows(user_id, fields, chunk_size=2000):
+    """
+    ``fields`` tuples of a user's orders from both tables, oldest first
+    (``timestamp`` and ``id`` must be among the fields). With ``user_id``
+    None every user's orders are merged in id order instead.
+    """
+    ordering = ('timestamp', 'id') if user_id is not None else ('id',)
+    key_fields = tuple(fields.index(name) for name in ordering)
+
+    def rows(model):
+        orders = model.objects.all() if user_id is None else model.objects.filter(user_id=user_id)
+        return orders.order_by(*ordering).values_list(*fields).iterator(chunk_size=chunk_size)
+
+    return heapq.merge(rows(ArchivedStockOrder), rows(StockOrder), key=lambda row: tuple(row[i] for i in key_fields))
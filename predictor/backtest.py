@@ -0,0 +1,225 @@
+"""
+Walk-forward backtesting of the forecasting models.
+
+At every bar ``t`` of a history the model sees only the closes up to ``t``
+and forecasts the tomorrow / week / month horizons, which are then scored
+against the closes ``h`` bars later. There is no Python loop per day: the
+trailing windows ending at every bar are a strided view of the left-padded
+close array, laid out like the models' (symbols, days) close matrix, so a
+single batched ``fit`` over the windows produces the forecasts for every step
+of a symbol at once. Symbols are spread over a process pool.
+
+Scores are kept as sums and counts so per-symbol results add up into a
+universe total:
+
+* MAE and MAPE of the forecast price per horizon,
+* directional hit-rate (forecast and actual move on the same side of the
+  price the forecast was made from; flat actual moves are not counted),
+* calibration of ``confidence``: hit-rate per confidence bucket against the
+  bucket's mean confidence.
+"""
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .barstore import BarStore
+from .forecasting import HORIZONS, confidence_score, get_model
+
+# Bucket edges (percent) for calibration; confidence is clamped to 60-95
+CONFIDENCE_BINS = (60, 70, 80, 90, 96)
+
+# Noise the moving-average predictor adds per horizon, as a multiple of volatility * price
+NOISE_SCALES = {1: 0.5, 5: 1.5, 22: 3}
+
+
+def trailing_windows(closes, lookback):
+    """
+    Read-only (n, lookback) view whose row ``t`` holds the closes up to bar
+    ``t``, NaN-padded on the left while fewer than ``lookback`` exist.
+    """
+    padded = np.concatenate([np.full(lookback - 1, np.nan), closes])
+    return sliding_window_view(padded, lookback)
+
+
+def expanding_volatility(closes):
+    """Sample std (ddof=1) of the returns up to each bar; NaN below two returns"""
+    volatility = np.full(len(closes), np.nan)
+    if len(closes) < 3:
+        return volatility
+    returns = closes[1:] / closes[:-1] - 1
+    # Variance is shift-invariant; centring keeps the running sums well conditioned
+    centred = returns - returns.mean()
+    n = np.arange(1, len(returns) + 1)
+    sums = np.cumsum(centred)
+    squares = np.cumsum(centred * centred)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = (squares - sums * sums / n) / (n - 1)
+    volatility[1:] = np.where(n > 1, np.sqrt(np.maximum(variance, 0)), np.nan)
+    return volatility
+
+
+def walk_forward(closes, model_name='sma', lookback=250, min_history=10, noise_seed=None):
+    """
+    Forecasts made at every bar of one NaN-free close history.
+
+    Returns ``(steps, forecasts, confidence)``: the bar positions forecasts
+    were made at (those with at least ``min_history`` closes), a
+    (steps, horizons) array of forecast prices and the confidence the API
+    would have reported. Models only see the last ``lookback`` closes, which
+    matches the served predictors for every model but Holt, whose smoothing
+    is warmed up from ``lookback`` bars instead of the full history.
+
+    With ``noise_seed`` the moving-average predictor's Gaussian noise is
+    added (seeded), otherwise the central forecast is scored.
+    """
+    model = get_model(model_name)
+    horizons = list(HORIZONS.values())
+    first = max(min_history, model.min_history) - 1
+    if len(closes) <= first:
+        return np.arange(0), np.empty((0, len(horizons))), np.empty(0, dtype=int)
+
+    windows = trailing_windows(closes, max(lookback, model.min_history))[first:]
+    forecasts = model.predict(model.fit(windows), horizons)
+
+    steps = np.arange(first, len(closes))
+    latest = closes[steps]
+    volatility = expanding_volatility(closes)[steps]
+    if noise_seed is not None:
+        rng = np.random.default_rng(noise_seed)
+        scales = np.array([NOISE_SCALES.get(h, 0.5) for h in horizons])
+        sigma = np.nan_to_num(volatility * latest)[:, None] * scales[None, :]
+        forecasts = forecasts + rng.normal(0.0, 1.0, size=forecasts.shape) * sigma
+    forecasts = np.maximum(forecasts, 0)
+
+    confidence = confidence_score(steps + 1, volatility)
+    return steps, forecasts, confidence
+
+
+def score_forecasts(closes, steps, forecasts, confidence):
+    """Error sums per horizon, in a form that adds up across symbols (see merge_scores)"""
+    n_bins = len(CONFIDENCE_BINS) - 1
+    scores = {}
+    for j, (label, h) in enumerate(HORIZONS.items()):
+        has_target = steps + h < len(closes)
+        made_at = steps[has_target]
+        base = closes[made_at]
+        actual = closes[made_at + h]
+        forecast = forecasts[has_target, j]
+
+        error = np.abs(forecast - actual)
+        actual_move = np.sign(actual - base)
+        directional = actual_move != 0
+        hit = directional & (np.sign(forecast - base) == actual_move)
+
+        bucket = np.clip(np.digitize(confidence[has_target], CONFIDENCE_BINS) - 1, 0, n_bins - 1)
+        bucket, hit_d = bucket[directional], hit[directional]
+        conf_d = confidence[has_target][directional]
+        scores[label] = {
+            'n': int(has_target.sum()),
+            'abs_error': float(error.sum()),
+            'pct_error': float((error / actual).sum()),
+            'directional': int(directional.sum()),
+            'hits': int(hit.sum()),
+            'bin_n': np.bincount(bucket, minlength=n_bins).tolist(),
+            'bin_hits': np.bincount(bucket, weights=hit_d, minlength=n_bins).tolist(),
+            'bin_confidence': np.bincount(bucket, weights=conf_d, minlength=n_bins).tolist(),
+        }
+    return scores
+
+
+def merge_scores(total, scores):
+    """Add ``scores`` into ``total`` (both as returned by score_forecasts)"""
+    if total is None:
+        return {label: {k: list(v) if isinstance(v, list) else v for k, v in s.items()} for label, s in scores.items()}
+    for label, s in scores.items():
+        t = total[label]
+        for key, value in s.items():
+            if isinstance(value, list):
+                t[key] = [a + b for a, b in zip(t[key], value)]
+            else:
+                t[key] += value
+    return total
+
+
+def summarize(scores):
+    """Turn summed scores into MAE, MAPE, hit-rate and a calibration table per horizon"""
+    summary = {}
+    for label, s in scores.items():
+        calibration = []
+        weighted_gap = 0.0
+        for i in range(len(CONFIDENCE_BINS) - 1):
+            n = s['bin_n'][i]
+            if not n:
+                continue
+            hit_rate = s['bin_hits'][i] / n
+            mean_confidence = s['bin_confidence'][i] / n / 100
+            weighted_gap += n * abs(hit_rate - mean_confidence)
+            calibration.append({
+                'confidence': f"{CONFIDENCE_BINS[i]}-{CONFIDENCE_BINS[i + 1] - 1}",
+                'n': int(n),
+                'mean_confidence': round(mean_confidence, 4),
+                'hit_rate': round(hit_rate, 4),
+            })
+        summary[label] = {
+            'n': s['n'],
+            'mae': s['abs_error'] / s['n'] if s['n'] else None,
+            'mape': s['pct_error'] / s['n'] if s['n'] else None,
+            'hit_rate': s['hits'] / s['directional'] if s['directional'] else None,
+            # Expected calibration error: mean |hit-rate - confidence| over buckets
+            'calibration_error': weighted_gap / s['directional'] if s['directional'] else None,
+            'calibration': calibration,
+        }
+    return summary
+
+
+def backtest_symbol(task):
+    """
+    Process-pool worker: walk one symbol forward and score it.
+
+    ``closes`` may be None to read them from the bar store at
+    ``options['store_root']`` (between ``start`` and ``end``), which the
+    workers map from the shared page cache instead of receiving a copy.
+    """
+    symbol, closes, options = task
+    started = time.perf_counter()
+    store_root = options.pop('store_root', None)
+    start, end = options.pop('start', None), options.pop('end', None)
+    if closes is None:
+        columns = BarStore(store_root).read(symbol, start, end)
+        closes = columns['close'] if columns is not None else np.empty(0)
+    closes = np.asarray(closes, dtype=float)
+    closes = closes[np.isfinite(closes) & (closes > 0)]
+    noise_seed = zlib.crc32(symbol.encode()) if options.pop('noise', False) else None
+    steps, forecasts, confidence = walk_forward(closes, noise_seed=noise_seed, **options)
+    scores = score_forecasts(closes, steps, forecasts, confidence)
+    return symbol, scores, len(steps), time.perf_counter() - started
+
+
+def run_backtest(series_by_symbol, model_name='sma', workers=None, **options):
+    """
+    Backtest every symbol of ``series_by_symbol`` (symbol -> closes, or None
+    to load them from the bar store named by ``store_root``).
+
+    Runs in a process pool of ``workers`` processes (in-process when 1).
+    Returns ``(per_symbol, total)`` where ``per_symbol`` maps symbol ->
+    (scores, steps, seconds) and ``total`` is the merged scores.
+    """
+    options = dict(options, model_name=model_name)
+    tasks = [
+        (symbol, None if closes is None else np.asarray(closes, dtype=float), dict(options))
+        for symbol, closes in series_by_symbol.items()
+    ]
+    if workers == 1 or len(tasks) <= 1:
+        results = [backtest_symbol(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(backtest_symbol, tasks))
+
+    per_symbol, total = {}, None
+    for symbol, scores, n_steps, seconds in results:
+        per_symbol[symbol] = (scores, n_steps, seconds)
+        total = merge_scores(total, scores)
+    return per_symbol, total
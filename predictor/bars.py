@@ -0,0 +1,111 @@
+"""
+Helpers for daily OHLCV bar frames.
+
+Upstream libraries return dates either as a ``date`` column or as the index,
+sorted in either direction, with prices as strings. ``normalize_bars`` turns
+that into a frame indexed by a sorted, unique DatetimeIndex with numeric price
+columns, which is what the delta merge below relies on.
+"""
+import hashlib
+
+import pandas as pd
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Relative tolerance when checking an overlapping bar for upstream revisions
+REVISION_TOLERANCE = 1e-6
+
+
+def normalize_bars(df):
+    """Return ``df`` indexed by ascending bar date with numeric price columns"""
+    if df is None or df.empty:
+        return df
+
+    df = df.copy()
+    for col in PRICE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    date_column = next((c for c in df.columns if str(c).lower() == 'date'), None)
+    if date_column is not None:
+        df = df.set_index(date_column)
+    if not isinstance(df.index, pd.DatetimeIndex):
+        index = pd.to_datetime(df.index, errors='coerce')
+        if index.isna().all():
+            # No usable dates; leave the frame as the upstream sent it
+            return df
+        df.index = index
+        df = df[df.index.notna()]
+    df.index = df.index.normalize()
+    df.index.name = 'date'
+
+    df = df[~df.index.duplicated(keep='last')]
+    return df.sort_index()
+
+
+def has_bar_dates(df):
+    """Whether ``df`` is a normalized frame that can be merged by date"""
+    return df is not None and not df.empty and isinstance(df.index, pd.DatetimeIndex)
+
+
+def last_bar_date(df):
+    """Date of the most recent bar, or None"""
+    if not has_bar_dates(df):
+        return None
+    return df.index[-1].date()
+
+
+def anchor_bar_date(df, today):
+    """
+    Most recent bar that belongs to a finished session.
+
+    A bar dated today may still be moving, so it is refetched rather than used
+    to check for revisions.
+    """
+    if not has_bar_dates(df):
+        return None
+    completed = df.index[df.index < pd.Timestamp(today)]
+    if len(completed) == 0:
+        return None
+    return completed[-1].date()
+
+
+def is_revised(existing, delta, anchor):
+    """Whether the anchor bar is missing from ``delta`` or differs from what we stored"""
+    anchor = pd.Timestamp(anchor)
+    if anchor not in existing.index or anchor not in delta.index:
+        return True
+    for col in PRICE_COLUMNS:
+        if col in existing.columns and col in delta.columns:
+            old = existing.at[anchor, col]
+            new = delta.at[anchor, col]
+            if pd.isna(old) and pd.isna(new):
+                continue
+            if pd.isna(old) or pd.isna(new):
+                return True
+            if abs(old - new) > REVISION_TOLERANCE * max(1.0, abs(old)):
+                return True
+    return False
+
+
+def merge_bars(existing, delta, keep_since=None):
+    """Append ``delta`` to ``existing``, preferring delta rows on date clashes"""
+    merged = pd.concat([existing, delta])
+    merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+    if keep_since is not None:
+        merged = merged[merged.index >= pd.Timestamp(keep_since)]
+    return merged
+
+
+def series_digest(series):
+    """Stable content hash of a Series (values and index)"""
+    hashed = pd.util.hash_pandas_object(series, index=True).values.tobytes()
+    return hashlib.blake2b(hashed, digest_size=16).hexdigest()
+
+
+def data_version(df):
+    """Short version tag of a history: its last bar date and a hash of its contents"""
+    if df is None or df.empty:
+        return None
+    hashed = pd.util.hash_pandas_object(df, index=True).values.tobytes()
+    return f"{last_bar_date(df) or len(df)}:{hashlib.blake2b(hashed, digest_size=8).hexdigest()}"
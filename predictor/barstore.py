@@ -0,0 +1,284 @@
+"""
+Memory-mapped columnar store for daily bars.
+
+Each symbol is a directory holding one fixed-width little-endian file per
+column (``date`` as int32 days since 1970-01-01, OHLC as float64, volume as
+int64) plus ``meta.json`` with the committed row count. Reads open the
+column files with ``numpy.memmap``, so every worker process shares the OS
+page cache instead of holding its own copy, and slicing a date range only
+touches the pages it needs (the sorted date column is binary-searched).
+
+Writes are atomic for readers:
+
+* appends write past the committed length, fsync, then replace
+  ``meta.json``; a torn append is invisible and truncated by the next one,
+* revised histories are rewritten into a new generation of column files
+  that ``meta.json`` is switched to in one rename.
+
+Writers for the same symbol are serialized with a lock file.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .bars import REVISION_TOLERANCE, has_bar_dates, merge_bars, normalize_bars
+from .singleflight import _FileLock, _NullLock, fcntl
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = {
+    'date': np.dtype('<i4'),
+    'open': np.dtype('<f8'),
+    'high': np.dtype('<f8'),
+    'low': np.dtype('<f8'),
+    'close': np.dtype('<f8'),
+    'volume': np.dtype('<i8'),
+}
+
+_EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def to_day(value):
+    """Days since 1970-01-01 for a date, datetime, Timestamp or ISO string"""
+    return int((np.datetime64(pd.Timestamp(value).date(), 'D') - _EPOCH).astype(np.int64))
+
+
+def frame_to_columns(df):
+    """
+    Column arrays in store dtypes for a bar frame (missing prices become NaN,
+    volume 0). Raises ValueError unless the bars are dated by a ``date``
+    column or a date index.
+    """
+    dated = isinstance(df.index, pd.DatetimeIndex) or any(str(c).lower() == 'date' for c in df.columns)
+    if not df.empty and not dated and df.index.dtype.kind in 'biuf':
+        # normalize_bars would read row numbers as nanoseconds since 1970
+        raise ValueError("Bars need a 'date' column or a DatetimeIndex")
+    df = normalize_bars(df)
+    if not df.empty and not has_bar_dates(df):
+        raise ValueError("Bars have no parseable dates")
+    days = (df.index.values.astype('datetime64[D]') - _EPOCH).astype(np.int64)
+    columns = {'date': days.astype(COLUMNS['date'])}
+    for name, dtype in COLUMNS.items():
+        if name == 'date':
+            continue
+        if name in df.columns:
+            values = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float)
+        else:
+            values = np.full(len(df), np.nan)
+        if dtype.kind == 'i':
+            values = np.nan_to_num(values, nan=0.0)
+        columns[name] = values.astype(dtype)
+    return columns
+
+
+def columns_to_frame(columns):
+    """Bar frame (DatetimeIndex named 'date') from column arrays; copies the data"""
+    index = pd.DatetimeIndex((_EPOCH + columns['date'].astype(np.int64)).astype('datetime64[ns]'), name='date')
+    return pd.DataFrame({name: np.array(columns[name]) for name in COLUMNS if name != 'date'}, index=index)
+
+
+class BarStore:
+    """Per-symbol columnar bar files under ``root``"""
+
+    def __init__(self, root):
+        self.root = root
+        self._maps = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # -- reading ---------------------------------------------------------
+
+    def symbols(self):
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, name, 'meta.json'))
+        )
+
+    def length(self, symbol):
+        meta = self._meta(symbol)
+        return meta['rows'] if meta else 0
+
+    def read(self, symbol, start=None, end=None):
+        """
+        Zero-copy column views for bars dated ``start`` through ``end``
+        (inclusive, either may be None), or None if the symbol is not stored.
+        """
+        columns = self._columns(symbol)
+        if columns is None:
+            return None
+        dates = columns['date']
+        lo = int(np.searchsorted(dates, to_day(start), side='left')) if start is not None else 0
+        hi = int(np.searchsorted(dates, to_day(end), side='right')) if end is not None else len(dates)
+        return {name: values[lo:hi] for name, values in columns.items()}
+
+    def frame(self, symbol, start=None, end=None):
+        """The same bars as a DataFrame, or None"""
+        columns = self.read(symbol, start, end)
+        return columns_to_frame(columns) if columns is not None else None
+
+    def last_date(self, symbol):
+        columns = self._columns(symbol)
+        if columns is None or not len(columns['date']):
+            return None
+        return (_EPOCH + int(columns['date'][-1])).astype(object)
+
+    # -- writing ---------------------------------------------------------
+
+    def append(self, symbol, df):
+        """
+        Add the bars of ``df`` to the stored history.
+
+        Newer bars are appended. Bars overlapping the stored range must match
+        what is stored; if any was revised or is missing, or ``df`` reaches
+        back before the first stored bar, the merged history is rewritten.
+        Returns the number of bars added, or -1 after a rewrite.
+        """
+        incoming = frame_to_columns(df)
+        if not len(incoming['date']):
+            return 0
+        with self._writer(symbol):
+            meta = self._meta(symbol)
+            if meta is None or meta['rows'] == 0:
+                self._rewrite(symbol, incoming, meta)
+                return len(incoming['date'])
+
+            stored = self._columns(symbol)
+            first, last = int(stored['date'][0]), int(stored['date'][-1])
+            overlap = (incoming['date'] >= first) & (incoming['date'] <= last)
+            older = int((incoming['date'] < first).sum())
+            if older or (overlap.any() and self._revised(stored, incoming, overlap)):
+                reason = f"{older} bars older than stored" if older else "Revised bars"
+                logger.info(f"{reason} for {symbol}; rewriting stored history")
+                merged = merge_bars(columns_to_frame(stored), columns_to_frame(incoming))
+                self._rewrite(symbol, frame_to_columns(merged), meta)
+                return -1
+
+            newer = incoming['date'] > last
+            if not newer.any():
+                return 0
+            self._append_rows(symbol, {name: values[newer] for name, values in incoming.items()}, meta)
+            return int(newer.sum())
+
+    def write(self, symbol, df):
+        """Replace a symbol's history"""
+        with self._writer(symbol):
+            self._rewrite(symbol, frame_to_columns(df), self._meta(symbol))
+
+    def _revised(self, stored, incoming, overlap):
+        days = incoming['date'][overlap]
+        positions = np.searchsorted(stored['date'], days)
+        positions = np.minimum(positions, len(stored['date']) - 1)
+        if not np.array_equal(stored['date'][positions], days):
+            return True
+        for name, dtype in COLUMNS.items():
+            if name == 'date':
+                continue
+            old = np.asarray(stored[name][positions], dtype=float)
+            new = np.asarray(incoming[name][overlap], dtype=float)
+            both_nan = np.isnan(old) & np.isnan(new)
+            changed = np.abs(old - new) > REVISION_TOLERANCE * np.maximum(1.0, np.abs(old))
+            if ((changed | (np.isnan(old) != np.isnan(new))) & ~both_nan).any():
+                return True
+        return False
+
+    def _append_rows(self, symbol, columns, meta):
+        rows = meta['rows']
+        for name, dtype in COLUMNS.items():
+            path = self._column_path(symbol, name, meta['generation'])
+            with open(path, 'r+b') as fh:
+                # Drop anything a torn append left past the committed rows
+                fh.truncate(rows * dtype.itemsize)
+                fh.seek(0, os.SEEK_END)
+                fh.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+                fh.flush()
+                os.fsync(fh.fileno())
+        self._write_meta(symbol, dict(meta, rows=rows + len(columns['date'])))
+
+    def _rewrite(self, symbol, columns, meta):
+        os.makedirs(self._dir(symbol), exist_ok=True)
+        old_generation = meta['generation'] if meta else None
+        generation = (old_generation or 0) + 1
+        for name, dtype in COLUMNS.items():
+            with open(self._column_path(symbol, name, generation), 'wb') as fh:
+                fh.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+                fh.flush()
+                os.fsync(fh.fileno())
+        self._write_meta(symbol, {'rows': len(columns['date']), 'generation': generation})
+        if old_generation is not None:
+            # Readers still mapping the old files keep them alive until they unmap
+            for name in COLUMNS:
+                try:
+                    os.remove(self._column_path(symbol, name, old_generation))
+                except OSError:
+                    pass
+
+    # -- files -----------------------------------------------------------
+
+    def _dir(self, symbol):
+        safe = ''.join(c for c in symbol if c.isalnum() or c in '-_')
+        return os.path.join(self.root, safe)
+
+    def _column_path(self, symbol, name, generation):
+        return os.path.join(self._dir(symbol), f"{name}.{generation}.bin")
+
+    def _meta(self, symbol):
+        try:
+            with open(os.path.join(self._dir(symbol), 'meta.json')) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.warning(f"Unreadable bar store metadata for {symbol}: {str(e)}")
+            return None
+
+    def _write_meta(self, symbol, meta):
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir(symbol), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(meta, fh)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, os.path.join(self._dir(symbol), 'meta.json'))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _columns(self, symbol):
+        """Memory maps of the committed rows, reused while the metadata is unchanged"""
+        meta = self._meta(symbol)
+        if meta is None:
+            return None
+        key = (meta['generation'], meta['rows'])
+        with self._lock:
+            cached = self._maps.get(symbol)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+
+        rows = meta['rows']
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            if rows == 0:
+                columns[name] = np.empty(0, dtype=dtype)
+            else:
+                columns[name] = np.memmap(
+                    self._column_path(symbol, name, meta['generation']), dtype=dtype, mode='r', shape=(rows,)
+                )
+        with self._lock:
+            self._maps[symbol] = (key, columns)
+        return columns
+
+    def _writer(self, symbol):
+        if fcntl is None:
+            return _NullLock()
+        os.makedirs(self._dir(symbol), exist_ok=True)
+        return _FileLock(os.path.join(self._dir(symbol), 'write.lock'))
+
+
+bar_store = BarStore(getattr(settings, 'BAR_STORE_DIR', os.path.join(settings.BASE_DIR, 'cache', 'bars')))
@@ -0,0 +1,278 @@
+"""
+Two-tier cache for OHLCV price histories.
+
+The memory tier is an LRU bounded by the approximate byte size of the cached
+DataFrames. The disk tier pickles each symbol into PRICE_CACHE_DIR so entries
+survive worker restarts. Expiry follows the DSE session: a short TTL while the
+market is open, and a long one (up to the next open) once it has closed.
+
+``LRUMemo`` is a plain entry-bounded LRU for derived results (predictions).
+"""
+import copy
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .bars import data_version
+from .market_hours import is_market_open, seconds_until_next_open
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_nbytes(df):
+    """Approximate in-memory size of a DataFrame"""
+    try:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return 0
+
+
+class CacheEntry:
+    """A cached price history together with its provenance and expiry"""
+
+    __slots__ = ('data', 'source', 'stored_at', 'expires_at', 'nbytes', '_version')
+
+    def __init__(self, data, source, stored_at, expires_at):
+        self.data = data
+        self.source = source
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+        self.nbytes = _frame_nbytes(data)
+        self._version = None
+
+    @property
+    def version(self):
+        """Content version of the data (computed once, see bars.data_version)"""
+        if self._version is None:
+            self._version = data_version(self.data)
+        return self._version
+
+    def is_fresh(self, now=None):
+        return (now or time.time()) < self.expires_at
+
+
+class PriceCache:
+    """Thread-safe LRU (bounded by bytes) backed by a per-symbol disk store"""
+
+    def __init__(self, max_bytes, cache_dir=None, intraday_ttl=300, after_close_ttl=12 * 3600):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.intraday_ttl = intraday_ttl
+        self.after_close_ttl = after_close_ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'disk_errors': 0,
+        }
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def ttl(self):
+        """Seconds a freshly stored entry stays valid, based on DSE hours"""
+        if is_market_open():
+            return self.intraday_ttl
+        return max(self.intraday_ttl, min(self.after_close_ttl, seconds_until_next_open()))
+
+    def get(self, symbol):
+        """Return ``(data, source)`` for a fresh entry, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None:
+                if entry.is_fresh(now):
+                    self._entries.move_to_end(symbol)
+                    self._counters['memory_hits'] += 1
+                    return entry.data.copy(), entry.source
+                self._counters['expirations'] += 1
+                self._remove(symbol)
+
+        entry = self._read_disk(symbol)
+        with self._lock:
+            if entry is not None and entry.is_fresh(now):
+                self._counters['disk_hits'] += 1
+                self._insert(symbol, entry)
+                return entry.data.copy(), entry.source
+            self._counters['misses'] += 1
+        return None
+
+    def version(self, symbol):
+        """Version of a fresh in-memory entry, or None; never copies data or touches disk"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+        if entry is None or not entry.is_fresh():
+            return None
+        return entry.version
+
+    def disk_version(self, symbol):
+        """Modification stamp of a symbol's disk entry (lets other processes notice writes), or None"""
+        path = self._path(symbol)
+        if not path:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def peek(self, symbol):
+        """Return the stored entry even if it has expired, without counting a lookup"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+        if entry is None:
+            entry = self._read_disk(symbol)
+        if entry is None:
+            return None
+        return CacheEntry(entry.data.copy(), entry.source, entry.stored_at, entry.expires_at)
+
+    def set(self, symbol, data, source):
+        """Store a price history in both tiers; returns the entry's ``stored_at``"""
+        now = time.time()
+        entry = CacheEntry(data.copy(), source, now, now + self.ttl())
+        with self._lock:
+            self._insert(symbol, entry)
+        self._write_disk(symbol, entry)
+        return now
+
+    def invalidate(self, symbol):
+        """Drop a symbol from both tiers"""
+        with self._lock:
+            self._remove(symbol)
+        path = self._path(symbol)
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove cache file {path}: {str(e)}")
+
+    def stats(self):
+        """Counters and occupancy, for sizing the cache"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'hits': stats['memory_hits'] + stats['disk_hits'],
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            })
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+    # -- memory tier (callers hold self._lock) ---------------------------
+
+    def _insert(self, symbol, entry):
+        self._remove(symbol)
+        if entry.nbytes > self.max_bytes:
+            return
+        self._entries[symbol] = entry
+        self._bytes += entry.nbytes
+        while self._bytes > self.max_bytes and self._entries:
+            evicted_symbol, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self._counters['evictions'] += 1
+            logger.debug(f"Evicted {evicted_symbol} from price cache")
+
+    def _remove(self, symbol):
+        entry = self._entries.pop(symbol, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    # -- disk tier -------------------------------------------------------
+
+    def _path(self, symbol):
+        if not self.cache_dir:
+            return None
+        safe = ''.join(c for c in symbol if c.isalnum() or c in '-_')
+        return os.path.join(self.cache_dir, f"{safe}.pkl")
+
+    def _read_disk(self, symbol):
+        path = self._path(symbol)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as fh:
+                payload = pickle.load(fh)
+            return CacheEntry(payload['data'], payload['source'], payload['stored_at'], payload['expires_at'])
+        except Exception as e:
+            with self._lock:
+                self._counters['disk_errors'] += 1
+            logger.warning(f"Discarding unreadable cache file {path}: {str(e)}")
+            return None
+
+    def _write_disk(self, symbol, entry):
+        path = self._path(symbol)
+        if not path:
+            return
+        payload = {
+            'data': entry.data,
+            'source': entry.source,
+            'stored_at': entry.stored_at,
+            'expires_at': entry.expires_at,
+        }
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as fh:
+                pickle.dump(payload, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._lock:
+                self._counters['disk_errors'] += 1
+            logger.warning(f"Could not write cache file {path}: {str(e)}")
+
+
+class LRUMemo:
+    """Small thread-safe LRU for computed results, bounded by entry count"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        """Return a copy of the memoized value, or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = copy.deepcopy(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({'entries': len(self._entries), 'max_entries': self.max_entries})
+        return stats
+
+
+price_cache = PriceCache(
+    max_bytes=getattr(settings, 'PRICE_CACHE_MAX_BYTES', 32 * 1024 * 1024),
+    cache_dir=getattr(settings, 'PRICE_CACHE_DIR', None),
+    intraday_ttl=getattr(settings, 'PRICE_CACHE_INTRADAY_TTL', 300),
+    after_close_ttl=getattr(settings, 'PRICE_CACHE_AFTER_CLOSE_TTL', 12 * 3600),
+)
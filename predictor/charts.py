@@ -0,0 +1,134 @@
+"""
+Chart series for the prediction API.
+
+Charts cover a range counted back from the last bar (1M, 6M, 1Y, 5Y or max)
+and are labelled with the real bar dates. Long ranges are thinned on the
+server to a target point count, so multi-year charts stay a few KB of JSON:
+
+* line charts keep the visually significant closes with
+  Largest-Triangle-Three-Buckets (LTTB),
+* candle charts aggregate bars into daily, weekly (DSE weeks end on
+  Thursday), monthly or quarterly OHLC, whichever is the finest that fits.
+"""
+import numpy as np
+import pandas as pd
+
+# Calendar span of each chart range; None is the whole history
+CHART_RANGES = {
+    '1M': pd.DateOffset(months=1),
+    '6M': pd.DateOffset(months=6),
+    '1Y': pd.DateOffset(years=1),
+    '5Y': pd.DateOffset(years=5),
+    'max': None,
+}
+DEFAULT_CHART_RANGE = '1M'
+
+CHART_STYLES = ('line', 'ohlc')
+
+# Candle intervals tried from finest to coarsest
+OHLC_INTERVALS = (('day', None), ('week', 'W-THU'), ('month', 'ME'), ('quarter', 'QE'))
+
+
+def normalize_range(value):
+    """Canonical range key for a request value (case-insensitive), or None if unknown"""
+    if not value:
+        return DEFAULT_CHART_RANGE
+    for key in CHART_RANGES:
+        if key.lower() == str(value).strip().lower():
+            return key
+    return None
+
+
+def range_start(last_date, chart_range):
+    """First date inside ``chart_range`` ending at ``last_date`` (None for the whole history)"""
+    offset = CHART_RANGES[chart_range]
+    return None if offset is None else pd.Timestamp(last_date) - offset
+
+
+def date_labels(index):
+    """Short labels; the year is included once the chart spans more than a year"""
+    if len(index) and index[-1] - index[0] > pd.Timedelta(days=366):
+        return index.strftime('%b %d, %Y').tolist()
+    return index.strftime('%b %d').tolist()
+
+
+def lttb(x, y, threshold):
+    """
+    Indices of the ``threshold`` points Largest-Triangle-Three-Buckets keeps.
+
+    The first and last points are always kept; from every bucket in between
+    the point forming the largest triangle with the previously kept point
+    and the average of the next bucket is chosen.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = (np.floor(np.arange(threshold - 1) * (n - 2) / (threshold - 2)) + 1).astype(int)
+    edges[-1] = n - 1
+
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def line_series(prices, max_points):
+    """Labels and closes of ``prices`` (Series indexed by bar date), thinned with LTTB"""
+    if isinstance(prices.index, pd.DatetimeIndex):
+        x = prices.index.asi8
+    else:
+        x = np.arange(len(prices))
+    kept = lttb(x, prices.to_numpy(dtype=float), max_points)
+    prices = prices.iloc[kept]
+    return {
+        'labels': _labels(prices.index),
+        'data': [round(float(p), 2) for p in prices.values],
+    }
+
+
+def ohlc_series(df, max_points):
+    """Candles for ``df`` at the finest interval that fits in ``max_points``"""
+    bars = pd.DataFrame({
+        col: pd.to_numeric(df[col], errors='coerce') if col in df.columns else df['close']
+        for col in ('open', 'high', 'low', 'close')
+    }, index=df.index).dropna(subset=['close'])
+    for col in ('open', 'high', 'low'):
+        bars[col] = bars[col].fillna(bars['close'])
+
+    interval = 'day'
+    for interval, rule in OHLC_INTERVALS:
+        if rule is not None:
+            candles = bars.assign(bar_date=bars.index).resample(rule).agg({
+                'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'bar_date': 'last',
+            }).dropna(subset=['close'])
+            # Label each candle with its last real bar, not the period end
+            candles = candles.set_index('bar_date')
+        else:
+            candles = bars
+        if len(candles) <= max_points:
+            break
+    candles = candles.tail(max_points)
+
+    return {
+        'labels': _labels(candles.index),
+        'interval': interval,
+        'data': [round(float(p), 2) for p in candles['close']],
+        'ohlc': {col: [round(float(p), 2) for p in candles[col]] for col in ('open', 'high', 'low', 'close')},
+    }
+
+
+def _labels(index):
+    if isinstance(index, pd.DatetimeIndex):
+        return date_labels(index)
+    return [str(i) for i in index]
@@ -0,0 +1,192 @@
+"""
+Long-lived upstream clients shared by all requests in a worker.
+
+bdshare and stocksurferbd talk to the DSE websites through the module-level
+``requests`` API, which opens a fresh connection (and TLS handshake) per call.
+The registry owns pooled ``requests.Session`` objects with keep-alive and a
+per-host connection cap, and rebinds those libraries' ``requests`` reference
+to a session-backed stand-in. Library objects that are expensive to build
+(``StockSurferBD``) are created once per thread and reused.
+
+The HTTP transport is pluggable: ``UPSTREAM_HTTP_TRANSPORT`` may name a
+callable returning a ``requests`` adapter, e.g. one that redirects to a local
+stub server in tests.
+"""
+import atexit
+import logging
+import sys
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    REQUESTS_AVAILABLE = False
+    HTTPAdapter = object
+
+logger = logging.getLogger(__name__)
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default timeout and counts requests per connection"""
+
+    def __init__(self, default_timeout=None, **kwargs):
+        self.default_timeout = default_timeout
+        self.requests_sent = 0
+        self._count_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.default_timeout
+        with self._count_lock:
+            self.requests_sent += 1
+        return super().send(request, **kwargs)
+
+    def connection_stats(self):
+        """New connections opened vs requests served, summed over live host pools"""
+        connections = served = 0
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            served += pool.num_requests
+        return {
+            'requests': self.requests_sent,
+            'connections_opened': connections,
+            'connection_reuse_rate': round(1 - connections / served, 4) if served else 0.0,
+        }
+
+
+class _SessionRequests:
+    """Stand-in for the ``requests`` module that sends calls through a pooled Session"""
+
+    def __init__(self, session):
+        self._session = session
+
+    def request(self, method, url, **kwargs):
+        return self._session.request(method, url, **kwargs)
+
+    def get(self, url, params=None, **kwargs):
+        return self._session.get(url, params=params, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self._session.post(url, data=data, json=json, **kwargs)
+
+    def __getattr__(self, name):
+        # Exceptions, status codes etc. still come from the real module
+        return getattr(requests, name)
+
+
+class ClientRegistry:
+    """Thread-safe registry of pooled HTTP sessions and per-thread library clients"""
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=True,
+                 default_timeout=None, transport_factory=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.default_timeout = default_timeout
+        self.transport_factory = transport_factory
+        self._sessions = {}
+        self._adapters = {}
+        self._local = threading.local()
+        self._instances_created = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _make_adapter(self):
+        if self.transport_factory is not None:
+            return self.transport_factory()
+        return PooledHTTPAdapter(
+            default_timeout=self.default_timeout,
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+
+    def session(self, name='default'):
+        """Shared keep-alive session for an upstream; created on first use"""
+        with self._lock:
+            session = self._sessions.get(name)
+            if session is None:
+                session = requests.Session()
+                adapter = self._make_adapter()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[name] = session
+                self._adapters[name] = adapter
+            return session
+
+    def instance(self, name, factory):
+        """Per-thread long-lived object (for library clients of unknown thread safety)"""
+        instances = getattr(self._local, 'instances', None)
+        if instances is None:
+            instances = self._local.instances = {}
+        client = instances.get(name)
+        if client is None:
+            client = instances[name] = factory()
+            with self._lock:
+                self._instances_created[name] = self._instances_created.get(name, 0) + 1
+        return client
+
+    def bind_library(self, package, name=None):
+        """Route a library's module-level ``requests`` calls through a pooled session"""
+        if not REQUESTS_AVAILABLE:
+            return 0
+        proxy = _SessionRequests(self.session(name or package))
+        bound = 0
+        for module_name, module in list(sys.modules.items()):
+            if module is None or not (module_name == package or module_name.startswith(package + '.')):
+                continue
+            if getattr(module, 'requests', None) is requests:
+                module.requests = proxy
+                bound += 1
+        if bound:
+            logger.info(f"Routed {bound} {package} module(s) through pooled HTTP session")
+        return bound
+
+    def stats(self):
+        """Request and connection counts per upstream session"""
+        with self._lock:
+            adapters = dict(self._adapters)
+            created = dict(self._instances_created)
+        stats = {}
+        for name, adapter in adapters.items():
+            if hasattr(adapter, 'connection_stats'):
+                stats[name] = adapter.connection_stats()
+        stats['instances_created'] = created
+        return stats
+
+    def close(self):
+        """Close every pooled connection (called at worker shutdown)"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            sessions = list(self._sessions.items())
+        for name, session in sessions:
+            adapter = self._adapters.get(name)
+            if hasattr(adapter, 'connection_stats'):
+                logger.info(f"Closing {name} HTTP pool: {adapter.connection_stats()}")
+            session.close()
+
+
+def _transport_factory():
+    path = getattr(settings, 'UPSTREAM_HTTP_TRANSPORT', None)
+    return import_string(path) if path else None
+
+
+upstream_clients = ClientRegistry(
+    pool_connections=getattr(settings, 'UPSTREAM_HTTP_POOL_CONNECTIONS', 10),
+    pool_maxsize=getattr(settings, 'UPSTREAM_HTTP_POOL_MAXSIZE', 10),
+    default_timeout=getattr(settings, 'UPSTREAM_HTTP_TIMEOUT', 15),
+    transport_factory=_transport_factory(),
+)
+atexit.register(upstream_clients.close)
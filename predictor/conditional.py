@@ -0,0 +1,50 @@
+"""
+HTTP validators and caching headers for the JSON APIs.
+
+ETags are built from data versions a view can look up without doing its
+expensive work (the cached history's version, a snapshot generation, a
+user's ledger version), so ``django.views.decorators.http.condition`` can
+answer 304 before anything is fetched, predicted or serialized. Responses
+whose version is only known after the work carry the same ETag and go
+through ``conditional_response``, which answers a match with a 304.
+"""
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .market_hours import is_market_open
+
+
+def make_etag(*parts):
+    """Strong, quoted ETag over the string forms of ``parts``"""
+    digest = hashlib.blake2b('|'.join(str(part) for part in parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def market_data_max_age():
+    """Seconds shared caches may reuse market-data responses: short while DSE trades"""
+    if is_market_open():
+        return getattr(settings, 'API_CACHE_MAX_AGE_OPEN', 60)
+    return getattr(settings, 'API_CACHE_MAX_AGE_CLOSED', 900)
+
+
+def cache_public(response, etag, max_age):
+    """Validators and Cache-Control for responses any browser or CDN may store"""
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=max_age, stale_while_revalidate=30)
+    return response
+
+
+def cache_private(response, etag):
+    """Validators for per-user responses: stored by the browser only, always revalidated"""
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_response(request, response):
+    """``response``, or a 304 if the request's If-None-Match matches its ETag"""
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200 or not response.has_header('ETag'):
+        return response
+    return get_conditional_response(request, etag=response['ETag'], response=response)
@@ -0,0 +1,201 @@
+"""
+Daily equity curve of the paper-trading accounts.
+
+Each trading day after the close ``snapshot_equity`` values every account's
+holdings at that day's closing prices and upserts one ``EquitySnapshot`` row
+per user, from the current ``TradingAccount`` and ``Portfolio`` rows, in a
+few queries whatever the history length. ``backfill_equity`` rebuilds the
+rows of past days by replaying each user's orders, archived ones included.
+
+Holdings are carried at average cost, so P&L splits without per-lot
+bookkeeping:
+
+* unrealized = market value of the holdings - their cost basis,
+* realized = cash + cost basis - STARTING_BALANCE (a buy only moves money
+  from cash into cost basis; a sell swaps cost basis for its proceeds).
+
+A holding without any stored close is valued at cost.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+
+from .archive import all_order_rows
+from .bars import has_bar_dates
+from .barstore import bar_store
+from .cache import price_cache
+from .market_hours import is_trading_day
+from .models import STARTING_BALANCE, EquitySnapshot, Portfolio, TradingAccount
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+
+SNAPSHOT_FIELDS = ('cash', 'holdings_value', 'cost_basis', 'equity', 'realized_pnl', 'unrealized_pnl')
+
+
+def close_history(symbol, end):
+    """Closes of ``symbol`` up to ``end`` (Series by bar date) from the bar store or, failing that, the price cache"""
+    df = bar_store.frame(symbol, end=end)
+    if df is None or df.empty:
+        entry = price_cache.peek(symbol)
+        df = entry.data if entry is not None and has_bar_dates(entry.data) else None
+    if df is None or 'close' not in df.columns:
+        return None
+    closes = pd.to_numeric(df['close'], errors='coerce').dropna()
+    return closes[closes.index <= pd.Timestamp(end)]
+
+
+def closes_on(symbols, day):
+    """Latest close at or before ``day`` per symbol (None when nothing is stored)"""
+    closes = {}
+    for symbol in symbols:
+        history = close_history(symbol, day)
+        closes[symbol] = float(history.iloc[-1]) if history is not None and len(history) else None
+    return closes
+
+
+def valuation(cash, holdings, closes):
+    """Snapshot fields for ``cash`` and (symbol, quantity, avg_price) holdings at ``closes``"""
+    cost_basis = Decimal('0')
+    holdings_value = Decimal('0')
+    for symbol, quantity, avg_price in holdings:
+        cost = quantity * avg_price
+        close = closes.get(symbol)
+        cost_basis += cost
+        holdings_value += quantity * Decimal(str(round(close, 2))) if close is not None else cost
+    cost_basis = cost_basis.quantize(CENT)
+    holdings_value = holdings_value.quantize(CENT)
+    return {
+        'cash': cash,
+        'holdings_value': holdings_value,
+        'cost_basis': cost_basis,
+        'equity': cash + holdings_value,
+        'realized_pnl': cash + cost_basis - STARTING_BALANCE,
+        'unrealized_pnl': holdings_value - cost_basis,
+    }
+
+
+def save_snapshots(rows):
+    """Insert or overwrite (user, date) rows"""
+    EquitySnapshot.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['user', 'date'],
+        update_fields=list(SNAPSHOT_FIELDS),
+    )
+
+
+def snapshot_equity(day=None):
+    """Value every account at ``day``'s close (default: today) and upsert its row; returns the row count"""
+    day = day or timezone.localdate()
+    holdings = {}
+    for user_id, symbol, quantity, avg_price in Portfolio.objects.values_list(
+            'user_id', 'symbol', 'quantity', 'avg_price').iterator(chunk_size=2000):
+        holdings.setdefault(user_id, []).append((symbol, quantity, avg_price))
+    closes = closes_on({symbol for items in holdings.values() for symbol, _, _ in items}, day)
+
+    rows = [
+        EquitySnapshot(user_id=user_id, date=day, **valuation(balance, holdings.get(user_id, ()), closes))
+        for user_id, balance in TradingAccount.objects.values_list('user_id', 'balance').iterator(chunk_size=2000)
+    ]
+    with transaction.atomic():
+        save_snapshots(rows)
+    logger.info(f"Equity snapshot for {day}: {len(rows)} accounts")
+    return len(rows)
+
+
+def trading_days(start, end):
+    return [d.date() for d in pd.date_range(start, end) if is_trading_day(d)]
+
+
+def replay_equity(orders, days, close_table):
+    """
+    Snapshot fields per day from a user's (local date, type, symbol, quantity,
+    price, total) orders, oldest first, replayed at average cost.
+    """
+    cash = STARTING_BALANCE
+    positions = {}  # symbol -> [quantity, avg_price]
+    orders = iter(orders)
+    pending = next(orders, None)
+    curve = []
+    for day in days:
+        while pending is not None and pending[0] <= day:
+            _, order_type, symbol, quantity, price, total = pending
+            held, avg_price = positions.get(symbol, (0, Decimal('0')))
+            if order_type == 'BUY':
+                cash -= total
+                positions[symbol] = [held + quantity, ((held * avg_price + total) / (held + quantity)).quantize(CENT)]
+            else:
+                cash += total
+                if held - quantity > 0:
+                    positions[symbol] = [held - quantity, avg_price]
+                else:
+                    positions.pop(symbol, None)
+            pending = next(orders, None)
+        closes = {symbol: close_table[symbol].get(day) for symbol in positions if symbol in close_table}
+        holdings = [(symbol, quantity, avg_price) for symbol, (quantity, avg_price) in positions.items()]
+        curve.append((day, valuation(cash, holdings, closes)))
+    return curve
+
+
+def backfill_equity(user_ids=None, start=None, end=None):
+    """
+    Rebuild the equity rows of past trading days from order history.
+
+    Covers each user's first order (or ``start``) through ``end`` (default
+    yesterday; the daily snapshot owns today). Returns {user id: rows written}.
+    """
+    end = end or timezone.localdate() - timedelta(days=1)
+    users = TradingAccount.objects.values_list('user_id', flat=True)
+    if user_ids:
+        users = users.filter(user_id__in=user_ids)
+
+    close_table = {}  # symbol -> {trading day: close}, shared by every user
+
+    def load_closes(symbols):
+        for symbol in symbols - close_table.keys():
+            history = close_history(symbol, end)
+            if history is None or history.empty:
+                close_table[symbol] = {}
+                continue
+            # Carry the last close over days without a bar
+            index = pd.DatetimeIndex([pd.Timestamp(d) for d in trading_days(history.index[0], end)])
+            filled = history.reindex(history.index.union(index)).ffill().reindex(index)
+            close_table[symbol] = {ts.date(): float(v) for ts, v in filled.items() if pd.notna(v)}
+
+    written = {}
+    for user_id in list(users):
+        orders = [
+            (timezone.localdate(timestamp), order_type, symbol, quantity, price, total)
+            for timestamp, _, order_type, symbol, quantity, price, total in all_order_rows(
+                user_id, ('timestamp', 'id', 'order_type', 'symbol', 'quantity', 'price', 'total_amount'))
+        ]
+        first = start or (orders[0][0] if orders else None)
+        if first is None or first > end:
+            written[user_id] = 0
+            continue
+        load_closes({order[2] for order in orders})
+        rows = [
+            EquitySnapshot(user_id=user_id, date=day, **fields)
+            for day, fields in replay_equity(orders, trading_days(first, end), close_table)
+        ]
+        with transaction.atomic():
+            save_snapshots(rows)
+        written[user_id] = len(rows)
+    return written
+
+
+def equity_curve(user, start=None, end=None):
+    """A user's snapshot rows between two dates (inclusive), oldest first"""
+    rows = EquitySnapshot.objects.filter(user=user)
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    return rows.order_by('date').values_list('date', *SNAPSHOT_FIELDS)
@@ -0,0 +1,108 @@
+"""
+Streaming exports of orders and holdings as CSV or JSON Lines.
+
+Rows are read with ``QuerySet.iterator(chunk_size=EXPORT_CHUNK_SIZE)``,
+encoded one at a time and handed out in blocks of about EXPORT_BLOCK_SIZE
+bytes (optionally gzip-compressed on the fly), so memory stays flat however
+many orders an account holds. Order exports include archived orders.
+"""
+import csv
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from .archive import all_order_rows
+from .models import Portfolio
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BLOCK_SIZE = 64 * 1024
+
+EXPORT_COLUMNS = {
+    'orders': ('id', 'user_id', 'timestamp', 'symbol', 'order_type', 'quantity', 'price', 'total_amount'),
+    'holdings': ('user_id', 'symbol', 'quantity', 'avg_price', 'created_at', 'updated_at'),
+}
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+def export_rows(dataset, user_id=None):
+    """Tuples of EXPORT_COLUMNS[dataset] for one user (every user when None)"""
+    columns = EXPORT_COLUMNS[dataset]
+    if dataset == 'orders':
+        return all_order_rows(user_id, columns, chunk_size=EXPORT_CHUNK_SIZE)
+    holdings = Portfolio.objects.all() if user_id is None else Portfolio.objects.filter(user_id=user_id)
+    return holdings.order_by('user_id', 'symbol').values_list(*columns).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+class _Line:
+    """File-like target that hands back what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_rows(columns, rows, fmt):
+    """Text lines for ``rows``: a header then one line per row (csv), or one object per line (jsonl)"""
+    if fmt == 'csv':
+        writer = csv.writer(_Line())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([_plain(value) for value in row])
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(columns, map(_plain, row))), separators=(',', ':')) + '\n'
+
+
+def blocks(lines, size=EXPORT_BLOCK_SIZE):
+    """UTF-8 blocks of roughly ``size`` bytes from text lines"""
+    pending = []
+    pending_bytes = 0
+    for line in lines:
+        data = line.encode()
+        pending.append(data)
+        pending_bytes += len(data)
+        if pending_bytes >= size:
+            yield b''.join(pending)
+            pending = []
+            pending_bytes = 0
+    if pending:
+        yield b''.join(pending)
+
+
+def gzipped(chunks):
+    """A gzip stream of ``chunks``, compressed as they arrive"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(dataset, fmt, user_id=None, compress=False):
+    """Bytes of a whole export, produced lazily"""
+    if dataset not in EXPORT_COLUMNS:
+        raise ValueError(f"dataset must be one of {', '.join(EXPORT_COLUMNS)}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    stream = blocks(encode_rows(EXPORT_COLUMNS[dataset], export_rows(dataset, user_id), fmt))
+    return gzipped(stream) if compress else stream
+
+
+def export_filename(dataset, fmt, compress=False, label=None):
+    name = f"{label}-{dataset}" if label else dataset
+    return f"{name}.{fmt}{'.gz' if compress else ''}"
+
+
+def export_content_type(fmt, compress=False):
+    if compress:
+        return 'application/gzip'
+    return 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
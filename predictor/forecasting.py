@@ -0,0 +1,275 @@
+"""
+Pluggable forecasting models with batched fit/predict.
+
+Every model works on a whole batch of symbols at once: ``fit`` takes a
+(symbols, days) matrix of closing prices, right-aligned and NaN-padded on the
+left for shorter histories, and returns a dict of parameter arrays whose
+first axis is the symbol; ``predict`` turns those parameters into price
+forecasts for a list of horizons (in trading days).
+
+Models register themselves by name. ``forecast_symbols`` selects one, reuses
+fitted parameters cached per (model, version, symbol, input hash), fits only
+the misses and returns results in the same shape as the moving-average
+predictor so the API can serve either.
+"""
+import numpy as np
+from django.conf import settings
+
+from .bars import series_digest
+from .cache import LRUMemo
+
+# Trading-day horizons behind the API's tomorrow / week / month forecasts
+HORIZONS = {'tomorrow': 1, 'week': 5, 'month': 22}
+
+_registry = {}
+
+
+def register_model(cls):
+    """Class decorator adding a model to the registry under ``cls.name``"""
+    _registry[cls.name] = cls
+    return cls
+
+
+def get_model(name, **kwargs):
+    """Instantiate a registered model; raises KeyError for unknown names"""
+    return _registry[name](**kwargs)
+
+
+def available_models():
+    return sorted(_registry)
+
+
+def close_matrix(series_by_symbol):
+    """Right-align each symbol's non-NaN closes into one NaN-padded matrix"""
+    symbols = list(series_by_symbol)
+    arrays = [np.asarray(series_by_symbol[s], dtype=float) for s in symbols]
+    arrays = [a[~np.isnan(a)] for a in arrays]
+    width = max((len(a) for a in arrays), default=0)
+    matrix = np.full((len(symbols), width), np.nan)
+    for i, values in enumerate(arrays):
+        if len(values):
+            matrix[i, width - len(values):] = values
+    return symbols, matrix
+
+
+def latest_prices(closes):
+    return closes[:, -1] if closes.shape[1] else np.full(closes.shape[0], np.nan)
+
+
+def return_volatility(closes):
+    """Sample standard deviation of bar-over-bar returns per row (NaN below two returns)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = closes[:, 1:] / closes[:, :-1] - 1
+        n = (~np.isnan(returns)).sum(axis=1)
+        mean = np.nansum(returns, axis=1) / n
+        variance = np.nansum((returns - mean[:, None]) ** 2, axis=1) / (n - 1)
+    return np.where(n > 1, np.sqrt(variance), np.nan)
+
+
+def confidence_score(n_rows, volatility):
+    """Confidence heuristic shared by all models: more data and lower volatility score higher"""
+    data_quality = np.minimum(100, np.asarray(n_rows) * 2)  # More data = higher quality
+    volatility_factor = np.maximum(0, 100 - np.asarray(volatility) * 1000)
+    return np.clip(((data_quality + volatility_factor) / 2).astype(int), 60, 95)  # Clamp between 60-95%
+
+
+class ForecastModel:
+    """Base class: batched fit over a close matrix, batched predict over horizons"""
+    name = None
+    version = '1'
+    min_history = 10
+
+    def fit(self, closes):
+        raise NotImplementedError
+
+    def predict(self, params, horizons):
+        raise NotImplementedError
+
+
+@register_model
+class MovingAverageModel(ForecastModel):
+    """Central forecast of the moving-average predictor (its trend term, without the noise)"""
+    name = 'sma'
+    version = '1'
+    # Multipliers the moving-average predictor applies to its trend per horizon
+    TREND_MULTIPLIERS = {1: 0.1, 5: 0.7, 22: 3}
+
+    def fit(self, closes):
+        latest = latest_prices(closes)
+        lengths = (~np.isnan(closes)).sum(axis=1)
+        smas = []
+        for window in (5, 10, 20):
+            if window <= closes.shape[1]:
+                sma = np.where(lengths >= window, np.nanmean(closes[:, -window:], axis=1), latest)
+            else:
+                sma = latest
+            smas.append(sma)
+        return {'latest': latest, 'trend': (smas[0] + smas[1] + smas[2]) / 3 - latest}
+
+    def predict(self, params, horizons):
+        multipliers = np.array([self.TREND_MULTIPLIERS.get(h, 0.1 * h) for h in horizons])
+        return params['latest'][:, None] + params['trend'][:, None] * multipliers[None, :]
+
+
+@register_model
+class LinearTrendModel(ForecastModel):
+    """Least-squares straight line through the last ``lookback`` closes"""
+    name = 'linear'
+    version = '1'
+
+    def __init__(self, lookback=20):
+        self.lookback = lookback
+
+    def fit(self, closes):
+        y = closes[:, -self.lookback:]
+        mask = ~np.isnan(y)
+        x = np.broadcast_to(np.arange(y.shape[1], dtype=float), y.shape)
+        yz = np.where(mask, y, 0.0)
+        xz = np.where(mask, x, 0.0)
+        n = mask.sum(axis=1)
+        sx, sy = xz.sum(axis=1), yz.sum(axis=1)
+        sxx, sxy = (xz * xz).sum(axis=1), (xz * yz).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+            intercept = (sy - slope * sx) / n
+        slope = np.where(n > 1, slope, 0.0)
+        return {'slope': slope, 'intercept': intercept, 'x_last': np.full(len(n), y.shape[1] - 1.0)}
+
+    def predict(self, params, horizons):
+        x = params['x_last'][:, None] + np.asarray(horizons, dtype=float)[None, :]
+        return params['intercept'][:, None] + params['slope'][:, None] * x
+
+
+@register_model
+class HoltWintersModel(ForecastModel):
+    """
+    Holt's double exponential smoothing (Holt-Winters without a seasonal term,
+    since daily closes have no stable season).
+    """
+    name = 'holt'
+    version = '1'
+
+    def __init__(self, alpha=0.5, beta=0.1):
+        self.alpha = alpha
+        self.beta = beta
+
+    def fit(self, closes):
+        level = np.full(closes.shape[0], np.nan)
+        trend = np.zeros(closes.shape[0])
+        for col in range(closes.shape[1]):
+            y = closes[:, col]
+            started = ~np.isnan(level)
+            valid = ~np.isnan(y)
+            new_level = self.alpha * y + (1 - self.alpha) * (level + trend)
+            new_trend = self.beta * (new_level - level) + (1 - self.beta) * trend
+            update = started & valid
+            trend = np.where(update, new_trend, trend)
+            level = np.where(update, new_level, np.where(~started & valid, y, level))
+        return {'level': level, 'trend': trend}
+
+    def predict(self, params, horizons):
+        h = np.asarray(horizons, dtype=float)[None, :]
+        return params['level'][:, None] + params['trend'][:, None] * h
+
+
+@register_model
+class AutoRegressiveModel(ForecastModel):
+    """AR(p) on daily returns, fitted per symbol by batched least squares"""
+    name = 'ar'
+    version = '2'
+
+    def __init__(self, p=3, lookback=250, ridge=1e-8, min_observations=20):
+        self.p = p
+        self.lookback = lookback
+        self.ridge = ridge
+        # Fewer usable returns than this give unstable coefficients that explode over 22 steps
+        self.min_observations = max(min_observations, p + 2)
+
+    def fit(self, closes):
+        closes = closes[:, -(self.lookback + 1):]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = closes[:, 1:] / closes[:, :-1] - 1
+        p = self.p
+        n_symbols = closes.shape[0]
+        if returns.shape[1] <= p:
+            coef = np.zeros((n_symbols, p + 1))
+            return {'coef': coef, 'recent': np.zeros((n_symbols, p)), 'latest': latest_prices(closes)}
+
+        # Design matrix [1, r_{t-1}, ..., r_{t-p}] for every target r_t
+        target = returns[:, p:]
+        lags = [returns[:, p - k:returns.shape[1] - k] for k in range(1, p + 1)]
+        X = np.stack([np.ones_like(target)] + lags, axis=2)
+        valid = np.isfinite(target) & np.isfinite(X).all(axis=2)
+        X = np.where(valid[:, :, None], X, 0.0)
+        y = np.where(valid, target, 0.0)
+
+        XtX = np.einsum('ntk,ntj->nkj', X, X) + self.ridge * np.eye(p + 1)[None, :, :]
+        Xty = np.einsum('ntk,nt->nk', X, y)
+        coef = np.linalg.solve(XtX, Xty[:, :, None])[:, :, 0]
+        # Too few usable observations: fall back to a random walk
+        coef = np.where((valid.sum(axis=1) >= self.min_observations)[:, None], coef, 0.0)
+
+        recent = returns[:, ::-1][:, :p]  # r_t, r_{t-1}, ...
+        return {'coef': coef, 'recent': np.nan_to_num(recent), 'latest': latest_prices(closes)}
+
+    def predict(self, params, horizons):
+        coef, recent = params['coef'], params['recent'].copy()
+        price = params['latest'].copy()
+        horizons = list(horizons)
+        out = np.empty((len(price), len(horizons)))
+        for step in range(1, max(horizons) + 1):
+            r_next = coef[:, 0] + (coef[:, 1:] * recent).sum(axis=1)
+            price = price * (1 + r_next)
+            recent = np.concatenate([r_next[:, None], recent[:, :-1]], axis=1)
+            for j, h in enumerate(horizons):
+                if h == step:
+                    out[:, j] = price
+        return out
+
+
+fitted_params = LRUMemo(max_entries=getattr(settings, 'FORECAST_PARAMS_CACHE_SIZE', 16384))
+
+
+def forecast_symbols(model, series_by_symbol, row_counts=None):
+    """
+    Forecast every symbol with ``model`` (a ForecastModel instance).
+
+    ``series_by_symbol`` maps symbol -> closing-price Series. Returns symbol ->
+    result dict shaped like the moving-average predictor's, or None for
+    histories shorter than ``model.min_history``.
+    """
+    results = {symbol: None for symbol in series_by_symbol}
+    usable = {s: p for s, p in series_by_symbol.items() if p.notna().sum() >= model.min_history}
+    if not usable:
+        return results
+
+    symbols, closes = close_matrix(usable)
+
+    # Reuse fitted parameters for inputs we have seen; fit the rest in one batch
+    keys = [f"{model.name}|{model.version}|{s}|{series_digest(usable[s])}" for s in symbols]
+    cached = [fitted_params.get(key) for key in keys]
+    missing = [i for i, params in enumerate(cached) if params is None]
+    if missing:
+        fitted = model.fit(closes[missing])
+        for j, i in enumerate(missing):
+            cached[i] = {name: values[j] for name, values in fitted.items()}
+            fitted_params.set(keys[i], cached[i])
+    params = {name: np.stack([p[name] for p in cached]) for name in cached[0]}
+
+    forecasts = model.predict(params, list(HORIZONS.values()))
+    latest = latest_prices(closes)
+    volatility = return_volatility(closes)
+    counts = np.array([(row_counts or {}).get(s, len(usable[s])) for s in symbols])
+    confidence = confidence_score(counts, volatility)
+
+    for i, symbol in enumerate(symbols):
+        predictions = {label: max(0, float(forecasts[i, j])) for j, label in enumerate(HORIZONS)}
+        results[symbol] = {
+            'predictions': predictions,
+            'current_price': float(latest[i]),
+            'confidence': int(confidence[i]),
+            'volatility': float(volatility[i]),
+            'trend': 'up' if predictions['month'] > latest[i] else 'down',
+            'model': model.name,
+        }
+    return results
@@ -0,0 +1,185 @@
+"""
+Streaming indicator state, updated in O(1) per new bar.
+
+``IndicatorState`` carries everything ``predict_price_simple_moving_average``
+needs (latest price, SMA 5/10/20, return volatility, bar count) so a stored
+state can be advanced by the bars that arrived since it was saved instead of
+recomputing rolling windows over the whole history. Values match the pandas
+calculations (``rolling().mean()``, ``ewm(adjust=False)``,
+``pct_change().std()``) up to floating point rounding. States serialize to
+plain dicts for checkpointing.
+"""
+import math
+
+import pandas as pd
+
+from .indicators import SMA_WINDOWS, EMA_WINDOWS
+
+
+class RollingSMA:
+    """Simple moving average over a ring buffer of the last ``window`` prices"""
+
+    def __init__(self, window):
+        self.window = window
+        self.buffer = [0.0] * window
+        self.position = 0
+        self.count = 0
+        self.total = 0.0
+
+    def update(self, price):
+        outgoing = self.buffer[self.position]
+        self.buffer[self.position] = price
+        self.position = (self.position + 1) % self.window
+        if self.count < self.window:
+            self.count += 1
+            self.total += price
+        else:
+            self.total += price - outgoing
+        if self.position == 0:
+            # Re-sum once per lap so rounding error cannot accumulate
+            self.total = math.fsum(self.buffer[:self.count])
+
+    @property
+    def value(self):
+        return self.total / self.window if self.count == self.window else math.nan
+
+    def to_dict(self):
+        return {'window': self.window, 'buffer': self.buffer, 'position': self.position,
+                'count': self.count, 'total': self.total}
+
+    @classmethod
+    def from_dict(cls, data):
+        sma = cls(data['window'])
+        sma.buffer = list(data['buffer'])
+        sma.position = data['position']
+        sma.count = data['count']
+        sma.total = data['total']
+        return sma
+
+
+class EMA:
+    """Exponential moving average with ``adjust=False`` semantics"""
+
+    def __init__(self, span, value=math.nan):
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self.value = value
+
+    def update(self, price):
+        if math.isnan(self.value):
+            self.value = price
+        else:
+            self.value = self.alpha * price + (1 - self.alpha) * self.value
+
+    def to_dict(self):
+        return {'span': self.span, 'value': self.value}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['span'], data['value'])
+
+
+class RunningVariance:
+    """Welford's running mean and sample variance"""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['count'], data['mean'], data['m2'])
+
+
+class IndicatorState:
+    """All per-symbol indicators the moving-average model needs, updated bar by bar"""
+
+    def __init__(self):
+        self.sma = {window: RollingSMA(window) for window in SMA_WINDOWS}
+        self.ema = {span: EMA(span) for span in EMA_WINDOWS}
+        self.returns = RunningVariance()
+        self.last_price = math.nan
+        self.last_date = None
+        self.n_rows = 0
+        self.n_prices = 0
+
+    def update(self, price, bar_date=None):
+        """Advance by one bar; a missing price counts as a row but changes nothing else"""
+        self.n_rows += 1
+        if bar_date is not None:
+            self.last_date = pd.Timestamp(bar_date)
+        if price is None or math.isnan(price):
+            return
+        price = float(price)
+        for sma in self.sma.values():
+            sma.update(price)
+        for ema in self.ema.values():
+            ema.update(price)
+        if not math.isnan(self.last_price):
+            if self.last_price == 0:
+                ret = math.copysign(math.inf, price) if price else math.nan
+            else:
+                ret = price / self.last_price - 1
+            self.returns.update(ret)
+        self.last_price = price
+        self.n_prices += 1
+
+    def extend(self, prices):
+        """Apply the bars of a price Series that are newer than ``last_date``"""
+        if self.last_date is not None and isinstance(prices.index, pd.DatetimeIndex):
+            prices = prices[prices.index > self.last_date]
+        dated = isinstance(prices.index, pd.DatetimeIndex)
+        for bar_date, price in prices.items():
+            self.update(float(price), bar_date if dated else None)
+        return self
+
+    @classmethod
+    def from_prices(cls, prices):
+        """Build a state by replaying a price Series"""
+        return cls().extend(pd.to_numeric(prices, errors='coerce'))
+
+    @property
+    def volatility(self):
+        """Standard deviation of returns, with the model's 0.02 default when there are none"""
+        return self.returns.std if self.returns.count > 0 else 0.02
+
+    def to_dict(self):
+        return {
+            'sma': [sma.to_dict() for sma in self.sma.values()],
+            'ema': [ema.to_dict() for ema in self.ema.values()],
+            'returns': self.returns.to_dict(),
+            'last_price': self.last_price,
+            'last_date': self.last_date.isoformat() if self.last_date is not None else None,
+            'n_rows': self.n_rows,
+            'n_prices': self.n_prices,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.sma = {item['window']: RollingSMA.from_dict(item) for item in data['sma']}
+        state.ema = {item['span']: EMA.from_dict(item) for item in data['ema']}
+        state.returns = RunningVariance.from_dict(data['returns'])
+        state.last_price = data['last_price']
+        state.last_date = pd.Timestamp(data['last_date']) if data['last_date'] else None
+        state.n_rows = data['n_rows']
+        state.n_prices = data['n_prices']
+        return state
@@ -0,0 +1,139 @@
+"""
+Vectorized indicator engine over a whole universe of symbols.
+
+Closing prices are held as one float64 matrix of shape (symbols, days), aligned
+on the union of bar dates. Symbols with shorter or gappy histories simply have
+NaNs. Before computing rolling indicators each row is "compacted": its valid
+prices are moved to the right end in their original order, so windows always
+cover a symbol's own last N bars (the same thing ``prices.dropna().rolling(N)``
+does per symbol), and every indicator is computed for all symbols at once.
+"""
+import numpy as np
+import pandas as pd
+
+SMA_WINDOWS = (5, 10, 20)
+EMA_WINDOWS = (5, 10, 20)
+
+
+def compact_rows(matrix):
+    """
+    Move each row's non-NaN values to the right, keeping their order.
+
+    Returns ``(compacted, order)`` where ``order`` maps compacted positions
+    back to columns of ``matrix``.
+    """
+    valid = ~np.isnan(matrix)
+    order = np.argsort(valid, axis=1, kind='stable')
+    return np.take_along_axis(matrix, order, axis=1), order
+
+
+def rolling_mean(compacted, window):
+    """Trailing mean over ``window`` bars per row; NaN until a row has a full window"""
+    n_rows, n_cols = compacted.shape
+    out = np.full((n_rows, n_cols), np.nan)
+    if window > n_cols:
+        return out
+    valid = ~np.isnan(compacted)
+    sums = np.concatenate([np.zeros((n_rows, 1)), np.cumsum(np.where(valid, compacted, 0.0), axis=1)], axis=1)
+    counts = np.concatenate([np.zeros((n_rows, 1)), np.cumsum(valid, axis=1)], axis=1)
+    window_sums = sums[:, window:] - sums[:, :-window]
+    window_counts = counts[:, window:] - counts[:, :-window]
+    out[:, window - 1:] = np.where(window_counts == window, window_sums / window, np.nan)
+    return out
+
+
+def exponential_mean(compacted, span):
+    """EMA with ``adjust=False`` semantics, seeded at each row's first valid price"""
+    alpha = 2.0 / (span + 1)
+    out = np.full(compacted.shape, np.nan)
+    previous = np.full(compacted.shape[0], np.nan)
+    for col in range(compacted.shape[1]):
+        x = compacted[:, col]
+        current = np.where(np.isnan(previous), x, alpha * x + (1 - alpha) * previous)
+        # A NaN price (only possible in the leading padding) keeps the state
+        current = np.where(np.isnan(x), previous, current)
+        out[:, col] = current
+        previous = current
+    return out
+
+
+def simple_returns(compacted):
+    """Bar-over-bar returns; the first column is NaN like ``pct_change``"""
+    returns = np.full(compacted.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[:, 1:] = compacted[:, 1:] / compacted[:, :-1] - 1
+    return returns
+
+
+class IndicatorEngine:
+    """SMA, EMA, returns and volatility for every symbol in one pass"""
+
+    def __init__(self, symbols, dates, closes):
+        self.symbols = list(symbols)
+        self.dates = dates
+        self.closes = np.asarray(closes, dtype=float)
+        self._row = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.compute()
+
+    @classmethod
+    def from_series(cls, series_by_symbol):
+        """Build from ``{symbol: Series of closes}`` aligned on their indexes"""
+        symbols, columns = [], []
+        for symbol, series in series_by_symbol.items():
+            series = pd.to_numeric(series, errors='coerce')
+            if not series.index.is_unique:
+                series = series.reset_index(drop=True)
+            symbols.append(symbol)
+            columns.append(series.rename(symbol))
+        if not columns:
+            return cls([], pd.Index([]), np.empty((0, 0)))
+
+        frame = pd.concat(columns, axis=1, join='outer')
+        if isinstance(frame.index, pd.DatetimeIndex):
+            frame = frame.sort_index()
+        return cls(symbols, frame.index, frame.to_numpy(dtype=float).T)
+
+    def compute(self):
+        """(Re)compute every indicator from ``self.closes``"""
+        self.compacted, self.order = compact_rows(self.closes)
+        self.n_bars = (~np.isnan(self.closes)).sum(axis=1)
+        self.sma = {window: rolling_mean(self.compacted, window) for window in SMA_WINDOWS}
+        self.ema = {span: exponential_mean(self.compacted, span) for span in EMA_WINDOWS}
+        self.returns = simple_returns(self.compacted)
+
+        # Sample standard deviation of returns (ddof=1, like pandas)
+        n_returns = (~np.isnan(self.returns)).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.nansum(self.returns, axis=1) / n_returns
+            variance = np.nansum((self.returns - mean[:, None]) ** 2, axis=1) / (n_returns - 1)
+        self.volatility = np.where(n_returns > 1, np.sqrt(variance), np.nan)
+        self.latest_close = self.compacted[:, -1] if self.compacted.shape[1] else np.full(len(self.symbols), np.nan)
+
+    def latest(self, values):
+        """Last column of an indicator matrix (each symbol's most recent bar)"""
+        if values.shape[1] == 0:
+            return np.full(values.shape[0], np.nan)
+        return values[:, -1]
+
+    def lookup(self, symbol):
+        """Latest indicator values for one symbol, or None if unknown"""
+        row = self._row.get(symbol)
+        if row is None:
+            return None
+        result = {
+            'close': float(self.latest_close[row]),
+            'n_bars': int(self.n_bars[row]),
+            'volatility': float(self.volatility[row]),
+        }
+        for window, values in self.sma.items():
+            result[f'sma_{window}'] = float(self.latest(values)[row])
+        for span, values in self.ema.items():
+            result[f'ema_{span}'] = float(self.latest(values)[row])
+        return result
+
+    def series(self, symbol, values):
+        """An indicator matrix row for one symbol as a Series on the original dates"""
+        row = self._row[symbol]
+        out = np.full(self.closes.shape[1], np.nan)
+        out[self.order[row]] = values[row]
+        return pd.Series(out, index=self.dates, name=symbol)
@@ -0,0 +1,328 @@
+"""
+Background ingestion that keeps the price store warm.
+
+``Ingester`` refreshes every listed symbol on an asyncio loop so that web
+requests find fresh entries in the shared price cache (and bar store)
+instead of paying the upstream latency themselves:
+
+* while DSE is open a cycle runs every ``interval`` seconds; once it has
+  closed one more cycle picks up the final bars, then the worker sleeps
+  until the next open,
+* at most ``concurrency`` symbols are in flight; the blocking upstream calls
+  run on a thread pool of the same size,
+* each source has a token-bucket rate limit shared by all in-flight symbols,
+* failed refreshes are retried with full-jitter exponential backoff,
+* the time since each symbol's last successful refresh (its ingestion lag)
+  is written to INGEST_STATUS_FILE and reported by the metrics endpoint.
+
+Refreshes go through the same single-flight lock as the web workers, so a
+symbol is never fetched twice at once across processes.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .bars import last_bar_date, normalize_bars
+from .market_hours import is_market_open, is_trading_day, last_market_close, local_now, seconds_until_next_open
+from .sources import HISTORY_DAYS, DataSource
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Thread-safe token bucket: ``rate`` calls per second with bursts up to ``burst``"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class StubSource:
+    """
+    Local stand-in for the upstream libraries: a deterministic random walk
+    per symbol over the DSE calendar, with configurable latency and failure
+    rate. Today's bar moves while the market is open.
+    """
+
+    def __init__(self, latency=0.05, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, symbol, since=None):
+        with self._lock:
+            delay = self._random.uniform(0.5, 1.5) * self.latency
+            fail = self._random.random() < self.failure_rate
+        time.sleep(delay)
+        if fail:
+            raise ConnectionError(f"stub source failure for {symbol}")
+        return self.bars(symbol, since)
+
+    def bars(self, symbol, since=None):
+        today = local_now().date()
+        dates = [d for d in pd.date_range(today - timedelta(days=HISTORY_DAYS), today) if is_trading_day(d)]
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+        closes = 100 * np.cumprod(1 + rng.normal(0.0003, 0.015, size=len(dates)))
+        if is_market_open():
+            # Intraday: the last bar drifts from minute to minute
+            minute = int(time.time() // 60)
+            closes[-1] *= 1 + np.random.default_rng([self.seed, zlib.crc32(symbol.encode()), minute]).normal(0, 0.002)
+        df = pd.DataFrame({
+            'date': dates,
+            'open': closes * 0.995,
+            'high': closes * 1.01,
+            'low': closes * 0.99,
+            'close': closes,
+            'volume': rng.integers(10_000, 1_000_000, size=len(dates)),
+        })
+        df = normalize_bars(df)
+        if since is not None:
+            df = df[df.index >= pd.Timestamp(since)]
+        return df
+
+
+class SymbolStatus:
+    """Ingestion bookkeeping for one symbol"""
+
+    __slots__ = ('last_success', 'last_attempt', 'last_bar_date', 'source', 'attempts', 'failures', 'last_error')
+
+    def __init__(self):
+        self.last_success = None
+        self.last_attempt = None
+        self.last_bar_date = None
+        self.source = None
+        self.attempts = 0
+        self.failures = 0
+        self.last_error = None
+
+    def to_dict(self):
+        return {
+            'last_success': self.last_success,
+            'last_attempt': self.last_attempt,
+            'last_bar_date': self.last_bar_date,
+            'source': self.source,
+            'attempts': self.attempts,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
+
+
+class Ingester:
+    """Refreshes ``symbols`` into the price store on a market-hours schedule"""
+
+    def __init__(self, symbols, sources, update, rate_limits=None, concurrency=8, interval=60,
+                 retries=3, backoff=1.0, max_backoff=30.0, status_file=None, max_sleep=15 * 60):
+        self.symbols = list(symbols)
+        self.sources = [s for s in sources if s.available]
+        self.update = update
+        self.limiters = {
+            name: RateLimiter(rate, burst=max(1, int(rate)))
+            for name, rate in (rate_limits or {}).items() if rate
+        }
+        self.concurrency = concurrency
+        self.interval = interval
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.status_file = status_file
+        self.max_sleep = max_sleep
+        self.status = {symbol: SymbolStatus() for symbol in self.symbols}
+        self.cycles = 0
+        self.last_cycle = None
+        self._stopping = asyncio.Event()
+
+    # -- upstream --------------------------------------------------------
+
+    def fetch(self, symbol, since=None):
+        """Rate-limited fetch from the first healthy source (runs in a worker thread)"""
+        for source in self.sources:
+            if not source.breaker.allow():
+                continue
+            limiter = self.limiters.get(source.name)
+            if limiter is not None:
+                limiter.acquire()
+            data = source.call(symbol, since)
+            if data is not None:
+                return data, source.name
+        return None, None
+
+    # -- scheduling ------------------------------------------------------
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self, once=False):
+        """Run cycles until stopped (or a single cycle with ``once``)"""
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='ingest'))
+        while not self._stopping.is_set():
+            if once or is_market_open() or self._missed_close():
+                await self.run_cycle()
+            if once:
+                return
+            await self._sleep(self._next_delay())
+
+    def _missed_close(self):
+        """Whether no cycle has finished since the last session closed"""
+        return self.last_cycle is None or self.last_cycle['finished_at'] < last_market_close().timestamp()
+
+    def _next_delay(self):
+        if is_market_open():
+            elapsed = self.last_cycle['seconds'] if self.last_cycle else 0
+            return max(1.0, self.interval - elapsed)
+        # Wake at the open (or periodically, so status and stop requests stay responsive)
+        return max(1.0, min(self.max_sleep, seconds_until_next_open()))
+
+    async def _sleep(self, seconds):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    # -- one cycle -------------------------------------------------------
+
+    async def run_cycle(self):
+        """Refresh every symbol once with bounded concurrency"""
+        started = time.time()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(symbol):
+            async with semaphore:
+                return await self.refresh(symbol)
+
+        results = await asyncio.gather(*(bounded(symbol) for symbol in self.symbols))
+        self.cycles += 1
+        self.last_cycle = {
+            'number': self.cycles,
+            'started_at': started,
+            'finished_at': time.time(),
+            'seconds': round(time.time() - started, 3),
+            'succeeded': sum(results),
+            'failed': len(results) - sum(results),
+        }
+        self.write_status()
+        return self.last_cycle
+
+    async def refresh(self, symbol):
+        """Refresh one symbol, retrying with jittered backoff; returns success"""
+        status = self.status[symbol]
+        for attempt in range(self.retries + 1):
+            status.attempts += 1
+            status.last_attempt = time.time()
+            error = 'no source returned data'
+            try:
+                data, source = await asyncio.to_thread(self.update, symbol, self.fetch)
+            except Exception as e:
+                data, source = None, None
+                error = str(e)
+                logger.error(f"Ingest of {symbol} raised: {str(e)}")
+            if data is not None:
+                status.last_success = time.time()
+                bar_date = last_bar_date(data)
+                status.last_bar_date = bar_date.isoformat() if bar_date else None
+                status.source = source
+                status.last_error = None
+                return True
+            status.failures += 1
+            status.last_error = error
+            if attempt < self.retries and not self._stopping.is_set():
+                # Full jitter: uniform over the exponential backoff window
+                await self._sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+        logger.warning(f"Giving up on {symbol} this cycle after {self.retries + 1} attempts")
+        return False
+
+    # -- reporting -------------------------------------------------------
+
+    def lags(self, now=None):
+        """Seconds since each symbol's last successful refresh (None if never)"""
+        now = now or time.time()
+        return {
+            symbol: round(now - status.last_success, 3) if status.last_success else None
+            for symbol, status in self.status.items()
+        }
+
+    def write_status(self):
+        if not self.status_file:
+            return
+        payload = {
+            'written_at': time.time(),
+            'market_open': is_market_open(),
+            'cycle': self.last_cycle,
+            'symbols': {symbol: status.to_dict() for symbol, status in self.status.items()},
+        }
+        directory = os.path.dirname(self.status_file) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(payload, fh)
+            os.replace(tmp_path, self.status_file)
+        except OSError as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            logger.warning(f"Could not write ingest status {self.status_file}: {str(e)}")
+
+
+def ingest_status(path=None, now=None):
+    """
+    The last status written by the ingestion worker, with each symbol's lag
+    (seconds since its last successful refresh) computed as of ``now``.
+    """
+    path = path or getattr(settings, 'INGEST_STATUS_FILE', None)
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as fh:
+            status = json.load(fh)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Unreadable ingest status {path}: {str(e)}")
+        return None
+    now = now or time.time()
+    lags = []
+    for symbol_status in status['symbols'].values():
+        last_success = symbol_status.get('last_success')
+        symbol_status['lag_s'] = round(now - last_success, 3) if last_success else None
+        if last_success:
+            lags.append(symbol_status['lag_s'])
+    status['max_lag_s'] = max(lags) if lags else None
+    status['never_ingested'] = sum(1 for s in status['symbols'].values() if not s.get('last_success'))
+    return status
+
+
+def stub_data_source(**kwargs):
+    """A DataSource backed by StubSource, for running the worker without upstream access"""
+    stub = StubSource(**kwargs)
+    return DataSource('stub', lambda symbol, since: stub(symbol, since), available=True,
+                      deadline=getattr(settings, 'DATA_SOURCE_DEADLINE', 10.0))
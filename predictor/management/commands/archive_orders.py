@@ -0,0 +1,31 @@
+"""
+Move old orders out of the hot StockOrder table.
+
+Meant to run from cron outside trading hours, e.g.
+
+    0 3 * * *  python manage.py archive_orders
+
+Orders stay reachable through the history API with ``archived=1``.
+"""
+from django.core.management.base import BaseCommand
+
+from predictor.archive import archive_cutoff, archive_orders
+from predictor.models import StockOrder
+
+
+class Command(BaseCommand):
+    help = 'Archive orders older than ORDER_ARCHIVE_AFTER_DAYS in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive orders older than this many days (default: ORDER_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, help='Rows moved per transaction (default: ORDER_ARCHIVE_BATCH_SIZE)')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders due')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            due = StockOrder.objects.filter(timestamp__lt=archive_cutoff(options['days'])).count()
+            self.stdout.write(f"{due} orders due for archival")
+            return
+        moved = archive_orders(options['days'], options['batch_size'], options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} orders"))
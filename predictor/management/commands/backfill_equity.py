@@ -0,0 +1,44 @@
+"""
+Rebuild past equity snapshots from order history, e.g. for accounts that
+traded before snapshot_equity was scheduled:
+
+    python manage.py backfill_equity
+    python manage.py backfill_equity --users alice bob --start 2026-01-01
+
+Closing prices come from the bar store (see import_bars), so backfilled
+days are only as complete as the stored bars.
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from predictor.equity import backfill_equity
+
+
+class Command(BaseCommand):
+    help = "Replay users' orders to fill in their daily equity snapshots for past trading days"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', nargs='+', help='Usernames (default: every trading account)')
+        parser.add_argument('--start', help='First day (YYYY-MM-DD, default: each user\'s first order)')
+        parser.add_argument('--end', help='Last day (YYYY-MM-DD, default: yesterday)')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['users']:
+            user_ids = list(User.objects.filter(username__in=options['users']).values_list('id', flat=True))
+            if not user_ids:
+                raise CommandError('No such users')
+        written = backfill_equity(user_ids, start=self._date(options['start']), end=self._date(options['end']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {sum(written.values())} equity snapshots for {len(written)} accounts"
+        ))
+
+    @staticmethod
+    def _date(value):
+        if not value:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date {value!r}")
+        return day
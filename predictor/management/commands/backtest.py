@@ -0,0 +1,115 @@
+"""
+Walk-forward backtest of a forecasting model over locally stored bars.
+
+Bars come from the memory-mapped bar store (BAR_STORE_DIR), which the worker
+processes map directly, or from a directory of ``<SYMBOL>.csv`` files with
+``date`` and ``close`` columns, so years of history can be replayed without
+touching the upstream sources:
+
+    python manage.py import_bars data/bars
+    python manage.py backtest --model sma --workers 8
+"""
+import os
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor.backtest import run_backtest, summarize
+from predictor.bars import normalize_bars
+from predictor.barstore import bar_store
+from predictor.forecasting import available_models
+
+
+class Command(BaseCommand):
+    help = 'Replay stored daily bars and score tomorrow/week/month forecasts (MAE, hit-rate, confidence calibration)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default='sma', help=f"Forecasting model ({', '.join(available_models())})")
+        parser.add_argument('--symbols', nargs='+', help='Only these symbols (default: everything in the store)')
+        parser.add_argument('--csv-dir', help='Directory of <SYMBOL>.csv files (default: the bar store)')
+        parser.add_argument('--start', help='First bar date (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last bar date (YYYY-MM-DD)')
+        parser.add_argument('--lookback', type=int, default=250, help='Bars each forecast sees')
+        parser.add_argument('--noise', action='store_true', help="Include the predictor's seeded noise")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+        parser.add_argument('--per-symbol', action='store_true', help='Also print a line per symbol')
+
+    def handle(self, *args, **options):
+        if options['model'] not in available_models():
+            raise CommandError(f"Unknown model {options['model']!r}")
+
+        if options['csv_dir']:
+            series = self._load_csv(options)
+        else:
+            # Workers read their symbol's closes straight from the bar store
+            stored = set(bar_store.symbols())
+            series = {symbol: None for symbol in self._symbols(options) if symbol in stored}
+        if not series:
+            raise CommandError('No bars to backtest')
+
+        started = time.perf_counter()
+        per_symbol, total = run_backtest(
+            series,
+            model_name=options['model'],
+            workers=options['workers'],
+            lookback=options['lookback'],
+            noise=options['noise'],
+            store_root=bar_store.root,
+            start=options['start'],
+            end=options['end'],
+        )
+        elapsed = time.perf_counter() - started
+        steps = sum(n for _, n, _ in per_symbol.values())
+
+        if options['per_symbol']:
+            for symbol, (scores, n_steps, seconds) in sorted(per_symbol.items()):
+                month = summarize(scores)['month']
+                self.stdout.write(
+                    f"{symbol:<12}{n_steps:>7} steps  month MAPE {self._pct(month['mape'])}"
+                    f"  hit {self._pct(month['hit_rate'])}  {seconds * 1000:.1f}ms"
+                )
+
+        self.stdout.write(
+            f"{options['model']}: {len(series)} symbols, {steps} forecast dates in {elapsed:.2f}s "
+            f"({steps / elapsed if elapsed else 0:,.0f} dates/s)"
+        )
+        self.stdout.write(f"{'horizon':<10}{'n':>9}{'MAE':>10}{'MAPE':>9}{'hit':>8}{'calib err':>11}")
+        summary = summarize(total)
+        for label, s in summary.items():
+            mae = f"{s['mae']:.3f}" if s['mae'] is not None else '-'
+            self.stdout.write(
+                f"{label:<10}{s['n']:>9}{mae:>10}{self._pct(s['mape']):>9}"
+                f"{self._pct(s['hit_rate']):>8}{self._pct(s['calibration_error']):>11}"
+            )
+        for label, s in summary.items():
+            buckets = '  '.join(
+                f"{b['confidence']}%: {b['hit_rate']:.0%} of {b['n']}" for b in s['calibration']
+            )
+            self.stdout.write(f"calibration {label}: {buckets or '-'}")
+
+    def _symbols(self, options):
+        if options['symbols']:
+            return [s.upper() for s in options['symbols']]
+        if options['csv_dir']:
+            return sorted(os.path.splitext(f)[0].upper() for f in os.listdir(options['csv_dir']) if f.endswith('.csv'))
+        return bar_store.symbols()
+
+    def _load_csv(self, options):
+        series = {}
+        for symbol in self._symbols(options):
+            path = os.path.join(options['csv_dir'], f"{symbol}.csv")
+            df = normalize_bars(pd.read_csv(path)) if os.path.exists(path) else None
+            if df is None or df.empty or 'close' not in df.columns:
+                self.stderr.write(f"{symbol}: no stored bars")
+                continue
+            if options['start']:
+                df = df[df.index >= pd.Timestamp(options['start'])]
+            if options['end']:
+                df = df[df.index <= pd.Timestamp(options['end'])]
+            series[symbol] = df['close'].to_numpy(dtype=float)
+        return series
+
+    @staticmethod
+    def _pct(value):
+        return f"{value:.1%}" if value is not None else '-'
@@ -0,0 +1,55 @@
+"""
+Side-by-side fit/predict timings for the registered forecasting models.
+
+Runs every model on the same synthetic random-walk universe and reports the
+time per 1000 symbols, e.g.
+
+    python manage.py benchmark_models --symbols 5000 --days 500
+"""
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from predictor.forecasting import HORIZONS, available_models, get_model
+
+
+class Command(BaseCommand):
+    help = 'Benchmark batched fit/predict of every registered forecasting model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', type=int, default=1000, help='Symbols in the synthetic universe')
+        parser.add_argument('--days', type=int, default=250, help='Bars per symbol')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per model (best time is reported)')
+        parser.add_argument('--models', nargs='+', help='Only these models (default: all)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        n_symbols, n_days = options['symbols'], options['days']
+        returns = rng.normal(0.0003, 0.02, size=(n_symbols, n_days))
+        closes = 100 * np.cumprod(1 + returns, axis=1)
+        # Ragged histories: a quarter of the symbols listed part-way through
+        listed_at = rng.integers(0, n_days // 2, size=n_symbols)
+        ragged = rng.random(n_symbols) < 0.25
+        closes[ragged[:, None] & (np.arange(n_days)[None, :] < listed_at[:, None])] = np.nan
+        closes = np.stack([np.concatenate([row[np.isnan(row)], row[~np.isnan(row)]]) for row in closes])
+
+        horizons = list(HORIZONS.values())
+        per_thousand = 1000 / n_symbols
+        self.stdout.write(f"{n_symbols} symbols x {n_days} days, best of {options['repeat']}")
+        self.stdout.write(f"{'model':<10}{'fit ms/1k':>12}{'predict ms/1k':>16}")
+        for name in options['models'] or available_models():
+            model = get_model(name)
+            fit_times, predict_times = [], []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                params = model.fit(closes)
+                fitted = time.perf_counter()
+                model.predict(params, horizons)
+                fit_times.append(fitted - started)
+                predict_times.append(time.perf_counter() - fitted)
+            self.stdout.write(
+                f"{name:<10}{min(fit_times) * 1000 * per_thousand:>12.2f}"
+                f"{min(predict_times) * 1000 * per_thousand:>16.2f}"
+            )
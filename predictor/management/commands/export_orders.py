@@ -0,0 +1,46 @@
+"""
+Export orders (archived ones included) or holdings for one user or everyone,
+streamed straight to a file or stdout:
+
+    python manage.py export_orders --user alice --format jsonl -o alice.jsonl
+    python manage.py export_orders --dataset holdings --gzip -o holdings.csv.gz
+"""
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor.export import EXPORT_COLUMNS, EXPORT_FORMATS, export_stream
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSON Lines export of orders or holdings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', choices=sorted(EXPORT_COLUMNS), default='orders')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--user', help='Username (default: every user)')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output')
+        parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+
+    def handle(self, *args, **options):
+        user_id = None
+        if options['user']:
+            user_id = User.objects.filter(username=options['user']).values_list('id', flat=True).first()
+            if user_id is None:
+                raise CommandError(f"Unknown user {options['user']!r}")
+
+        stream = export_stream(options['dataset'], options['format'], user_id=user_id, compress=options['gzip'])
+        written = 0
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in stream:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                out.close()
+            else:
+                out.flush()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written:,} bytes to {options['output']}"))
@@ -0,0 +1,47 @@
+"""
+Load daily bars from CSV files into the bar store.
+
+Each ``<SYMBOL>.csv`` needs a ``date`` column and any of open/high/low/close/
+volume. Bars newer than the stored ones are appended; revised overlaps and
+bars older than the stored ones rewrite the symbol's history. Files without
+usable dates are reported and skipped.
+
+    python manage.py import_bars data/bars
+"""
+import os
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor.barstore import bar_store
+
+
+class Command(BaseCommand):
+    help = 'Import <SYMBOL>.csv daily bars into the memory-mapped bar store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_dir', help='Directory of <SYMBOL>.csv files')
+        parser.add_argument('--replace', action='store_true', help='Overwrite stored histories instead of appending')
+
+    def handle(self, *args, **options):
+        csv_dir = options['csv_dir']
+        if not os.path.isdir(csv_dir):
+            raise CommandError(f"{csv_dir} is not a directory")
+
+        files = sorted(f for f in os.listdir(csv_dir) if f.endswith('.csv'))
+        imported = 0
+        for filename in files:
+            symbol = os.path.splitext(filename)[0].upper()
+            df = pd.read_csv(os.path.join(csv_dir, filename))
+            try:
+                if options['replace']:
+                    bar_store.write(symbol, df)
+                    self.stdout.write(f"{symbol}: wrote {len(df)} bars")
+                else:
+                    added = bar_store.append(symbol, df)
+                    self.stdout.write(f"{symbol}: {'rewrote stored history' if added < 0 else f'added {added} bars'}")
+            except ValueError as e:
+                self.stderr.write(f"{symbol}: skipped {filename}: {e}")
+                continue
+            imported += 1
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} of {len(files)} files into {bar_store.root}"))
@@ -0,0 +1,97 @@
+"""
+Long-running worker that keeps every listed symbol fresh in the price store.
+
+    python manage.py ingest_prices                 # real sources, runs forever
+    python manage.py ingest_prices --stub --once   # one cycle against the local stub
+
+Run one instance per host next to the web workers (systemd, supervisor, ...).
+"""
+import asyncio
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor.ingest import Ingester, stub_data_source
+from predictor.sources import source_manager
+from predictor.universe import universe_symbols
+from predictor.views import stock_fetches, update_stock_data
+
+
+def _refresh(symbol, fetch):
+    # Shares the web workers' per-symbol lock, so nobody fetches the same symbol concurrently
+    result, _ = stock_fetches.do(symbol, lambda: update_stock_data(symbol, fetch=fetch, serve_stale=False))
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Refresh every listed symbol into the shared price store on a market-hours schedule'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', nargs='+', help='Only these symbols (default: whole universe)')
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'INGEST_CONCURRENCY', 8))
+        parser.add_argument('--interval', type=float, default=getattr(settings, 'INGEST_INTERVAL', 60),
+                            help='Seconds between cycles while the market is open')
+        parser.add_argument('--retries', type=int, default=3, help='Retries per symbol and cycle')
+        parser.add_argument('--once', action='store_true', help='Run a single cycle and exit')
+        parser.add_argument('--stub', action='store_true', help='Use the local stub source instead of upstream')
+        parser.add_argument('--stub-latency', type=float, default=0.05, help='Mean stub latency in seconds')
+        parser.add_argument('--stub-failure-rate', type=float, default=0.0, help='Fraction of stub calls that fail')
+        parser.add_argument('--rate', action='append', default=[], metavar='SOURCE=PER_SECOND',
+                            help='Override a source rate limit, e.g. --rate bdshare=2')
+
+    def handle(self, *args, **options):
+        rate_limits = dict(getattr(settings, 'INGEST_RATE_LIMITS', {}))
+        for item in options['rate']:
+            name, _, rate = item.partition('=')
+            try:
+                rate_limits[name] = float(rate)
+            except ValueError:
+                raise CommandError(f"Bad --rate {item!r}; expected SOURCE=PER_SECOND")
+
+        if options['stub']:
+            sources = [stub_data_source(latency=options['stub_latency'], failure_rate=options['stub_failure_rate'])]
+        else:
+            sources = source_manager.sources
+        if not any(source.available for source in sources):
+            raise CommandError('No data source available; install bdshare or stocksurferbd, or use --stub')
+
+        symbols = [s.upper() for s in options['symbols']] if options['symbols'] else universe_symbols()
+        ingester = Ingester(
+            symbols, sources, _refresh,
+            rate_limits=rate_limits,
+            concurrency=options['concurrency'],
+            interval=options['interval'],
+            retries=options['retries'],
+            status_file=getattr(settings, 'INGEST_STATUS_FILE', None),
+        )
+        asyncio.run(self._run(ingester, options['once']))
+
+    async def _run(self, ingester, once):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, ingester.stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows / not the main thread
+
+        task = asyncio.create_task(ingester.run(once=once))
+        reported = 0
+        while not task.done():
+            await asyncio.wait([task], timeout=1)
+            if ingester.cycles > reported:
+                reported = ingester.cycles
+                self._report(ingester)
+        task.result()
+
+    def _report(self, ingester):
+        cycle = ingester.last_cycle
+        lags = sorted(lag for lag in ingester.lags().values() if lag is not None)
+        lag_text = f"lag p50 {lags[len(lags) // 2]:.1f}s max {lags[-1]:.1f}s" if lags else 'no data yet'
+        self.stdout.write(
+            f"cycle {cycle['number']}: {cycle['succeeded']}/{cycle['succeeded'] + cycle['failed']} symbols "
+            f"in {cycle['seconds']:.2f}s, {lag_text}"
+        )
+        for symbol, status in sorted(ingester.status.items()):
+            if status.last_error:
+                self.stderr.write(f"  {symbol}: {status.last_error}")
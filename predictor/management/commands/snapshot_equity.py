@@ -0,0 +1,34 @@
+"""
+Record every trading account's value at today's close.
+
+Meant to run from cron after the DSE close and the price refresh, e.g.
+
+    50 14 * * 0-4  python manage.py snapshot_equity
+
+Re-running for the same day overwrites that day's rows.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from predictor.equity import snapshot_equity
+from predictor.market_hours import is_trading_day, local_now
+
+
+class Command(BaseCommand):
+    help = "Value every trading account's holdings at the day's closing prices and store its equity snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Trading day to record (YYYY-MM-DD, default: today)')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            day = parse_date(options['date'])
+            if day is None:
+                raise CommandError(f"Invalid date {options['date']!r}")
+        else:
+            day = local_now().date()
+            if not is_trading_day(local_now()):
+                self.stdout.write(f"{day} is not a trading day; nothing to record")
+                return
+        count = snapshot_equity(day)
+        self.stdout.write(self.style.SUCCESS(f"Stored {count} equity snapshots"))
@@ -0,0 +1,76 @@
+"""
+Precompute predictions for the whole symbol universe.
+
+Meant to run from cron after the DSE close, e.g.
+
+    45 14 * * 0-4  python manage.py snapshot_predictions
+
+Each run writes a new generation; predict_stock serves the newest completed
+one and computes live only for symbols it does not contain.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from predictor.bars import last_bar_date
+from predictor.models import PredictionGeneration, PredictionSnapshot
+from predictor.universe import universe_symbols
+from predictor.views import fetch_many, predict_symbols, prediction_payload
+
+
+class Command(BaseCommand):
+    help = 'Fetch every listed symbol, compute predictions and chart data, and store them as a new snapshot generation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', nargs='+', help='Only snapshot these symbols (default: whole universe)')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent upstream fetches')
+        parser.add_argument('--keep', type=int, default=3, help='Completed generations to retain')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        symbols = [s.upper() for s in options['symbols']] if options['symbols'] else universe_symbols()
+
+        frames, sources, errors = fetch_many(symbols, max_workers=options['workers'])
+        predictions = predict_symbols(frames)
+
+        generation = PredictionGeneration.objects.create()
+        rows = []
+        for symbol in symbols:
+            prediction_result = predictions.get(symbol)
+            if prediction_result is None:
+                errors.setdefault(symbol, 'Insufficient data')
+                continue
+            df = frames[symbol]
+            rows.append(PredictionSnapshot(
+                generation=generation,
+                symbol=symbol,
+                last_bar_date=last_bar_date(df),
+                payload=prediction_payload(symbol, df, prediction_result, sources[symbol]),
+            ))
+
+        with transaction.atomic():
+            PredictionSnapshot.objects.bulk_create(rows, batch_size=500)
+            generation.symbol_count = len(rows)
+            generation.completed_at = timezone.now()
+            generation.save(update_fields=['symbol_count', 'completed_at'])
+
+        self._prune(options['keep'])
+
+        for symbol, error in sorted(errors.items()):
+            self.stderr.write(f"{symbol}: {error}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Generation {generation.id}: {len(rows)}/{len(symbols)} symbols in {time.monotonic() - started:.1f}s"
+        ))
+
+    def _prune(self, keep):
+        """Delete everything older than the newest ``keep`` completed generations"""
+        kept = list(
+            PredictionGeneration.objects.filter(completed_at__isnull=False)
+            .order_by('-id').values_list('id', flat=True)[:max(1, keep)]
+        )
+        if kept:
+            deleted, _ = PredictionGeneration.objects.filter(id__lt=min(kept)).delete()
+            if deleted:
+                self.stdout.write(f"Pruned {deleted} old snapshot rows")
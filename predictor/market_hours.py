@@ -0,0 +1,57 @@
+"""
+Dhaka Stock Exchange trading calendar helpers.
+
+DSE trades Sunday to Thursday, 10:00 - 14:30 Asia/Dhaka. Public holidays are
+not modelled; on those days the market simply looks "open" with no new bars.
+"""
+from datetime import time, timedelta
+from django.utils import timezone
+
+# Python weekday(): Monday=0 ... Sunday=6
+TRADING_WEEKDAYS = {6, 0, 1, 2, 3}
+MARKET_OPEN = time(10, 0)
+MARKET_CLOSE = time(14, 30)
+
+
+def local_now():
+    """Current time in the project time zone (Asia/Dhaka)"""
+    return timezone.localtime()
+
+
+def is_trading_day(moment):
+    """Whether the given date/datetime falls on a DSE trading weekday"""
+    return moment.weekday() in TRADING_WEEKDAYS
+
+
+def is_market_open(now=None):
+    """Whether the DSE continuous session is running right now"""
+    now = now or local_now()
+    return is_trading_day(now) and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def next_market_open(now=None):
+    """Datetime of the next session open strictly after ``now``"""
+    now = now or local_now()
+    candidate = now.replace(hour=MARKET_OPEN.hour, minute=MARKET_OPEN.minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    while not is_trading_day(candidate):
+        candidate += timedelta(days=1)
+    return candidate
+
+
+def seconds_until_next_open(now=None):
+    """Seconds from ``now`` until the next session open"""
+    now = now or local_now()
+    return (next_market_open(now) - now).total_seconds()
+
+
+def last_market_close(now=None):
+    """Datetime of the most recent session close at or before ``now``"""
+    now = now or local_now()
+    candidate = now.replace(hour=MARKET_CLOSE.hour, minute=MARKET_CLOSE.minute, second=0, microsecond=0)
+    if candidate > now:
+        candidate -= timedelta(days=1)
+    while not is_trading_day(candidate):
+        candidate -= timedelta(days=1)
+    return candidate
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.5 on 2026-10-17 04:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictor', '0002_stockorder_tradingaccount_portfolio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('symbol_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PredictionSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20)),
+                ('last_bar_date', models.DateField(blank=True, null=True)),
+                ('payload', models.JSONField()),
+                ('generation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='predictor.predictiongeneration')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['symbol', '-generation'], name='predictor_snapshot_sym_gen')],
+                'unique_together': {('generation', 'symbol')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-17 04:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictor', '0003_predictiongeneration_predictionsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tradingaccount',
+            name='ledger_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-17 04:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictor', '0004_tradingaccount_ledger_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockorder',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='predictor_order_user_ts'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.5 on 2026-10-17 05:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictor', '0005_stockorder_user_timestamp_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquitySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('cash', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('holdings_value', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('cost_basis', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('equity', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('realized_pnl', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('unrealized_pnl', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='equity_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['date'],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from decimal import Decimal
 
 class UserProfile(models.Model):
@@ -27,10 +28,16 @@ def save_user_profile(sender, instance, **kwargs):
         instance.profile.save()
 
 
+# Cash every trading account opens with
+STARTING_BALANCE = Decimal('100000.00')
+
+
 class TradingAccount(models.Model):
     """User's trading account with balance"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='trading_account')
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=100000.00)
+    # Bumped on every change to the balance, orders or portfolio (used for ETags)
+    ledger_version = models.PositiveBigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -42,7 +49,7 @@ class TradingAccount(models.Model):
         """Get or create trading account for user"""
         account, created = cls.objects.get_or_create(
             user=user,
-            defaults={'balance': Decimal('100000.00')}
+            defaults={'balance': STARTING_BALANCE}
         )
         return account
 
@@ -64,11 +71,37 @@ class StockOrder(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # A user's history newest first; id breaks timestamp ties for keyset paging
+            models.Index(fields=['user', '-timestamp', '-id'], name='predictor_order_user_ts'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.order_type} {self.quantity} {self.symbol} @ ৳{self.price}"
 
 
+class ArchivedStockOrder(models.Model):
+    """A StockOrder moved out of the hot table by archive_orders; keeps its original id"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    symbol = models.CharField(max_length=20)
+    order_type = models.CharField(max_length=4, choices=StockOrder.ORDER_TYPES)
+    quantity = models.IntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    timestamp = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', '-timestamp', '-id'], name='predictor_archorder_user_ts'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.order_type} {self.quantity} {self.symbol} @ ৳{self.price} (archived)"
+
+
 class Portfolio(models.Model):
     """User's stock portfolio holdings"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='portfolio_items')
@@ -85,3 +118,74 @@ class Portfolio(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.symbol}: {self.quantity} @ ৳{self.avg_price}"
 
+
+class EquitySnapshot(models.Model):
+    """A user's paper portfolio valued at one trading day's close"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='equity_snapshots')
+    date = models.DateField()
+    cash = models.DecimalField(max_digits=14, decimal_places=2)
+    holdings_value = models.DecimalField(max_digits=14, decimal_places=2)
+    cost_basis = models.DecimalField(max_digits=14, decimal_places=2)
+    equity = models.DecimalField(max_digits=14, decimal_places=2)
+    realized_pnl = models.DecimalField(max_digits=14, decimal_places=2)
+    unrealized_pnl = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        # The unique (user, date) index also serves range scans of one user's curve
+        unique_together = ['user', 'date']
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.user.username} {self.date}: ৳{self.equity}"
+
+
+class PredictionGeneration(models.Model):
+    """One run of the snapshot_predictions command"""
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    symbol_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"Generation {self.id} ({self.symbol_count} symbols)"
+
+
+class PredictionSnapshot(models.Model):
+    """Precomputed predict_stock response for one symbol in one generation"""
+    generation = models.ForeignKey(PredictionGeneration, on_delete=models.CASCADE, related_name='snapshots')
+    symbol = models.CharField(max_length=20)
+    last_bar_date = models.DateField(null=True, blank=True)
+    payload = models.JSONField()
+
+    class Meta:
+        unique_together = ['generation', 'symbol']
+        indexes = [
+            models.Index(fields=['symbol', '-generation'], name='predictor_snapshot_sym_gen'),
+        ]
+
+    def __str__(self):
+        return f"{self.symbol} @ generation {self.generation_id}"
+
+    @classmethod
+    def _newest(cls, symbol, max_age=None):
+        snapshots = cls.objects.filter(symbol=symbol, generation__completed_at__isnull=False)
+        if max_age is not None:
+            snapshots = snapshots.filter(generation__completed_at__gte=timezone.now() - max_age)
+        return snapshots.order_by('-generation_id')
+
+    @classmethod
+    def latest_generation_for(cls, symbol, max_age=None):
+        """Id of the newest completed generation holding a symbol, without loading the payload"""
+        return cls._newest(symbol, max_age).values_list('generation_id', flat=True).first()
+
+    @classmethod
+    def latest_for(cls, symbol, max_age=None):
+        """Payload from the newest completed generation for a symbol, in one indexed query"""
+        snapshot = cls._newest(symbol, max_age).values('generation_id', 'payload').first()
+        if snapshot is None:
+            return None
+        payload = snapshot['payload']
+        payload['snapshot_generation'] = snapshot['generation_id']
+        return payload
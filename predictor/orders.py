@@ -0,0 +1,322 @@
+"""
+Order execution for the paper-trading accounts.
+
+Every order runs in one transaction that starts by updating the user's
+``TradingAccount`` row. That first write takes the row lock (on SQLite, the
+database write lock), so concurrent orders from the same user queue up
+behind it instead of reading the same balance and overwriting each other.
+The balance changes are ``F()`` expressions (a BUY's debit is conditional
+on the balance covering it); holdings are read and rewritten under that
+account lock.
+
+An order costs at most ``ORDER_QUERY_BUDGET`` queries, not counting the
+transaction's own BEGIN/COMMIT:
+
+* BUY: debit the account if the balance covers it, read the holding, grow
+  it (or insert it), insert the order, read the new balance back,
+* SELL: credit the account, read the holding, shrink or delete it, insert
+  the order, read the new balance back.
+
+Once the transaction commits the user's cached account snapshot is replaced
+(see accounts.py); that happens outside the budget.
+
+A basket of orders (``execute_orders``) takes the same lock, reads the
+balance and the basket's holdings once, replays the orders in Python and
+writes the outcome back with ``bulk_create``/``bulk_update``, so its query
+count does not grow with the number of orders (except that SQLite's limit
+on statement parameters splits the order insert every ~140 orders).
+"""
+import base64
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .accounts import refresh_account_snapshot_on_commit
+from .models import ArchivedStockOrder, Portfolio, StockOrder, TradingAccount
+
+ORDER_TYPES = ('BUY', 'SELL')
+
+ORDER_QUERY_BUDGET = 5
+
+CENT = Decimal('0.01')
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+
+# Basket modes: reject everything if any order fails, or fill whatever can be filled
+BULK_MODES = ('all', 'best_effort')
+
+
+class OrderRejected(ValueError):
+    """An order the account cannot fill (bad input, funds or shares)"""
+
+
+def parse_order(data):
+    """Validated (symbol, order_type, quantity, price) from a request payload"""
+    try:
+        symbol = str(data.get('symbol', '')).strip().upper()
+        order_type = str(data.get('type', '')).strip().upper()
+        quantity = int(data.get('quantity', 0))
+        price = Decimal(str(data.get('price', 0))).quantize(CENT)
+    except (TypeError, ValueError, InvalidOperation):
+        raise OrderRejected('Invalid order data')
+    if not symbol or order_type not in ORDER_TYPES or quantity <= 0 or price <= 0:
+        raise OrderRejected('Invalid order data')
+    return symbol, order_type, quantity, price
+
+
+def execute_order(user, symbol, order_type, quantity, price):
+    """
+    Fill one order atomically. Returns the saved StockOrder and the account's
+    new (balance, ledger_version); raises OrderRejected, leaving nothing
+    changed, when the account cannot fill it.
+    """
+    total = (quantity * price).quantize(CENT)
+    with transaction.atomic():
+        if order_type == 'BUY':
+            _debit(user, total)
+            _add_shares(user, symbol, quantity, total)
+        else:
+            _credit(user, total)
+            _remove_shares(user, symbol, quantity)
+        order = StockOrder.objects.create(
+            user=user, symbol=symbol, order_type=order_type,
+            quantity=quantity, price=price, total_amount=total,
+        )
+        balance, ledger_version = TradingAccount.objects.filter(user=user).values_list(
+            'balance', 'ledger_version').get()
+        refresh_account_snapshot_on_commit(user, ledger_version)
+    return order, balance, ledger_version
+
+
+def _account_change(balance):
+    return {'balance': balance, 'ledger_version': F('ledger_version') + 1, 'updated_at': timezone.now()}
+
+
+def _debit(user, total):
+    accounts = TradingAccount.objects.filter(user=user)
+    if accounts.filter(balance__gte=total).update(**_account_change(F('balance') - total)):
+        return
+    # Either the balance is short or this user never traded before
+    account = TradingAccount.get_or_create_account(user)
+    if account.balance < total or not accounts.filter(balance__gte=total).update(**_account_change(F('balance') - total)):
+        raise OrderRejected('Insufficient balance')
+
+
+def _credit(user, total):
+    if not TradingAccount.objects.filter(user=user).update(**_account_change(F('balance') + total)):
+        raise OrderRejected("You don't own this stock")
+
+
+def _add_shares(user, symbol, quantity, total):
+    # The account row locked by _debit keeps other orders for this user out until commit
+    holding = Portfolio.objects.filter(user=user, symbol=symbol)
+    owned = holding.values_list('quantity', 'avg_price').first()
+    if owned is None:
+        Portfolio.objects.create(user=user, symbol=symbol, quantity=quantity, avg_price=(total / quantity).quantize(CENT))
+        return
+    owned_quantity, avg_price = owned
+    new_quantity = owned_quantity + quantity
+    holding.update(
+        quantity=new_quantity,
+        avg_price=((owned_quantity * avg_price + total) / new_quantity).quantize(CENT),
+        updated_at=timezone.now(),
+    )
+
+
+def _remove_shares(user, symbol, quantity):
+    holding = Portfolio.objects.filter(user=user, symbol=symbol)
+    owned = holding.values_list('quantity', flat=True).first()
+    if owned is None:
+        raise OrderRejected("You don't own this stock")
+    if owned < quantity:
+        raise OrderRejected('Insufficient shares to sell')
+    if owned == quantity:
+        holding.delete()
+    else:
+        holding.update(quantity=F('quantity') - quantity, updated_at=timezone.now())
+
+
+def execute_orders(user, payloads, mode='all'):
+    """
+    Fill a basket of order payloads in one transaction, in the given order.
+
+    Returns (results, balance, ledger_version, applied): one result dict per
+    payload (``status`` ``filled`` with the ``order_id``, or ``rejected``
+    with the ``error``) and whether anything was written. In ``all`` mode a
+    single rejection rolls the whole basket back and the orders that would
+    have filled are reported as ``skipped``.
+    """
+    if mode not in BULK_MODES:
+        raise OrderRejected(f"mode must be one of {', '.join(BULK_MODES)}")
+
+    parsed = []
+    for payload in payloads:
+        try:
+            if not isinstance(payload, dict):
+                raise OrderRejected('Invalid order data')
+            parsed.append(parse_order(payload))
+        except OrderRejected as e:
+            parsed.append(e)
+
+    with transaction.atomic():
+        # Take the account lock before reading anything the basket depends on
+        if not TradingAccount.objects.filter(user=user).update(ledger_version=F('ledger_version') + 1):
+            TradingAccount.get_or_create_account(user)
+            TradingAccount.objects.filter(user=user).update(ledger_version=F('ledger_version') + 1)
+        balance_before, ledger_version = TradingAccount.objects.filter(user=user).values_list(
+            'balance', 'ledger_version').get()
+        symbols = {order[0] for order in parsed if not isinstance(order, OrderRejected)}
+        holdings = {item.symbol: item for item in Portfolio.objects.filter(user=user, symbol__in=symbols)}
+        existing = set(holdings)
+
+        results, fills, balance = _replay(parsed, balance_before, holdings, user)
+        if not fills or (mode == 'all' and len(fills) < len(parsed)):
+            # Nothing is written, including the ledger bump above
+            transaction.set_rollback(True)
+            for result in results:
+                if result['status'] == 'filled':
+                    result['status'] = 'skipped'
+
+            return results, balance_before, ledger_version - 1, False
+
+        now = timezone.now()
+        orders = StockOrder.objects.bulk_create([
+            StockOrder(user=user, symbol=symbol, order_type=order_type, quantity=quantity,
+                       price=price, total_amount=(quantity * price).quantize(CENT))
+            for _, (symbol, order_type, quantity, price) in fills
+        ])
+        for (index, _), order in zip(fills, orders):
+            results[index]['order_id'] = order.id
+
+        touched = {order[0] for _, order in fills}
+        emptied = [symbol for symbol in touched & existing if holdings[symbol].quantity == 0]
+        changed = [holdings[symbol] for symbol in touched & existing if holdings[symbol].quantity > 0]
+        created = [holdings[symbol] for symbol in touched - existing if holdings[symbol].quantity > 0]
+        for item in changed:
+            item.updated_at = now
+        if emptied:
+            Portfolio.objects.filter(user=user, symbol__in=emptied).delete()
+        if changed:
+            Portfolio.objects.bulk_update(changed, ['quantity', 'avg_price', 'updated_at'])
+        if created:
+            Portfolio.objects.bulk_create(created)
+        TradingAccount.objects.filter(user=user).update(balance=balance, updated_at=now)
+        refresh_account_snapshot_on_commit(user, ledger_version)
+    return results, balance, ledger_version, True
+
+
+def _replay(parsed, balance, holdings, user):
+    """Apply the orders to an in-memory balance and holdings; returns (results, fills, balance)"""
+    results, fills = [], []
+    for index, order in enumerate(parsed):
+        if isinstance(order, OrderRejected):
+            results.append({'index': index, 'status': 'rejected', 'error': str(order)})
+            continue
+        symbol, order_type, quantity, price = order
+        total = (quantity * price).quantize(CENT)
+        holding = holdings.get(symbol)
+        owned = holding.quantity if holding is not None else 0
+        error = None
+        if order_type == 'BUY':
+            if total > balance:
+                error = 'Insufficient balance'
+            else:
+                balance -= total
+                if holding is None:
+                    holding = holdings[symbol] = Portfolio(user=user, symbol=symbol, quantity=0, avg_price=Decimal('0'))
+                holding.avg_price = ((owned * holding.avg_price + total) / (owned + quantity)).quantize(CENT)
+                holding.quantity = owned + quantity
+        elif owned == 0:
+            error = "You don't own this stock"
+        elif owned < quantity:
+            error = 'Insufficient shares to sell'
+        else:
+            balance += total
+            holding.quantity = owned - quantity
+        if error:
+            results.append({'index': index, 'status': 'rejected', 'error': error})
+        else:
+            results.append({'index': index, 'status': 'filled'})
+            fills.append((index, order))
+    return results, fills, balance
+
+
+def order_dict(order):
+    """JSON form of a StockOrder"""
+    return {
+        'id': order.id,
+        'symbol': order.symbol,
+        'type': order.order_type,
+        'quantity': order.quantity,
+        'price': float(order.price),
+        'total': float(order.total_amount),
+        'timestamp': order.timestamp.isoformat(),
+    }
+
+
+def encode_cursor(order):
+    """Opaque cursor pointing just past ``order`` in newest-first order"""
+    return base64.urlsafe_b64encode(f"{order.timestamp.isoformat()}|{order.id}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from a cursor; ValueError if it was not made by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        stamp, order_id = raw.split('|')
+        timestamp = parse_datetime(stamp)
+        if timestamp is None:
+            raise ValueError(stamp)
+        return timestamp, int(order_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def local_day_start(value):
+    """Aware midnight (in TIME_ZONE) opening a YYYY-MM-DD day; ValueError if malformed"""
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f'Invalid date {value!r}')
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def order_history(user, cursor=None, limit=HISTORY_PAGE_SIZE, symbol=None, order_type=None, start=None, end=None,
+                  include_archived=False):
+    """
+    One page of a user's orders, newest first, and the cursor of the next page
+    (None on the last page).
+
+    Pages are keyset-based on (timestamp, id) and walk the
+    ``predictor_order_user_ts`` index, so a deep page costs the same as the
+    first. ``start``/``end`` are inclusive YYYY-MM-DD days. With
+    ``include_archived`` the archive table is paged the same way and merged in.
+    """
+    models = (StockOrder, ArchivedStockOrder) if include_archived else (StockOrder,)
+    page = []
+    for model in models:
+        orders = model.objects.filter(user=user)
+        if symbol:
+            orders = orders.filter(symbol=symbol.upper())
+        if order_type:
+            orders = orders.filter(order_type=order_type.upper())
+        if start:
+            orders = orders.filter(timestamp__gte=local_day_start(start))
+        if end:
+            orders = orders.filter(timestamp__lt=local_day_start(end) + timedelta(days=1))
+        if cursor:
+            timestamp, order_id = decode_cursor(cursor)
+            # The plain range bound lets the index seek; the OR only sorts out timestamp ties
+            orders = orders.filter(timestamp__lte=timestamp).filter(
+                Q(timestamp__lt=timestamp) | Q(id__lt=order_id))
+        page.extend(orders.order_by('-timestamp', '-id')[:limit + 1])
+
+    if include_archived:
+        page = sorted(page, key=lambda order: (order.timestamp, order.id), reverse=True)[:limit + 1]
+    if len(page) > limit:
+        return page[:limit], encode_cursor(page[limit - 1])
+    return page, None
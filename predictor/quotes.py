@@ -0,0 +1,50 @@
+"""
+Latest-quote view of a price history.
+
+A quote is the last bar of a symbol's history: its close as the price, the
+percentage change from the previous close, the bar's volume and date, and
+``updated``, when that history was stored.
+"""
+import time
+
+import pandas as pd
+
+from .bars import has_bar_dates
+
+
+def quote_from_bars(symbol, df, stored_at=None):
+    """Quote dict for the last bar of ``df`` stored at ``stored_at`` (default now), or None without usable closes"""
+    if df is None or df.empty or 'close' not in df.columns:
+        return None
+    closes = pd.to_numeric(df['close'], errors='coerce')
+    valid = closes.dropna()
+    if valid.empty:
+        return None
+
+    price = float(valid.iloc[-1])
+    previous = float(valid.iloc[-2]) if len(valid) > 1 else price
+    change = (price / previous - 1) * 100 if previous else 0.0
+    volume = 0
+    if 'volume' in df.columns:
+        last_volume = pd.to_numeric(df['volume'], errors='coerce').loc[valid.index[-1]]
+        volume = int(last_volume) if pd.notna(last_volume) else 0
+    return {
+        'symbol': symbol,
+        'price': round(price, 2),
+        'change': round(change, 2),
+        'volume': volume,
+        'date': valid.index[-1].date().isoformat() if has_bar_dates(df) else None,
+        'updated': round(stored_at if stored_at is not None else time.time(), 3),
+    }
+
+
+def quote_version(quote):
+    """Microsecond version of a quote, derived from when its data was stored"""
+    return round(quote['updated'] * 1_000_000)
+
+
+def same_quote(a, b):
+    """Whether two quotes show the same market data (ignoring when they were made)"""
+    if a is None or b is None:
+        return a is b
+    return all(a[key] == b[key] for key in ('price', 'change', 'volume', 'date'))
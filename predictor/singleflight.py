@@ -0,0 +1,174 @@
+"""
+Per-key request coalescing ("single flight").
+
+While a call for a key is in progress, further callers for the same key wait
+for it and share its result instead of starting their own. Within a worker
+this is done with threads; across workers an optional lock file per key
+serializes the upstream call so that later workers can pick the result up
+from a shared store (the on-disk price cache) once they get the lock. A
+worker waits at most ``lock_timeout`` seconds for that lock; after that it
+gives up and answers from ``fallback`` instead.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, threads only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Pause between attempts to take a busy lock file
+LOCK_POLL_INTERVAL = 0.05
+
+
+class LockTimeout(Exception):
+    """The lock file stayed busy for longer than the caller was willing to wait"""
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its outcome"""
+
+    def __init__(self, lock_dir=None, lock_timeout=None):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.lock_timeout = lock_timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._coalesced_by_key = Counter()
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key, fn, fallback=None):
+        """
+        Call ``fn()`` for ``key``, or wait for the call already running.
+
+        Returns ``(result, shared)`` where ``shared`` is True for callers that
+        received another caller's result. Exceptions are re-raised in every
+        caller. If another worker holds the key's lock file past
+        ``lock_timeout``, ``fallback()`` (or ``fn()`` when there is none)
+        supplies the result without the lock.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            try:
+                with self._process_lock(key):
+                    call.result = fn()
+            except LockTimeout:
+                logger.warning(f"Gave up waiting for the {key} lock after {self.lock_timeout}s")
+                with self._lock:
+                    self._counters['lock_timeouts'] += 1
+                call.result = (fallback or fn)()
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self._counters['flights'] += 1
+                self._counters['coalesced'] += call.waiters
+                if call.waiters:
+                    self._coalesced_by_key[key] += call.waiters
+                if call.waiters > self._counters['max_coalesced']:
+                    self._counters['max_coalesced'] = call.waiters
+            call.done.set()
+
+        if call.waiters:
+            logger.info(f"Coalesced {call.waiters} callers onto fetch for {key}")
+        if call.error is not None:
+            raise call.error
+        return call.result, False
+
+    def stats(self):
+        """Flight and coalescing counters"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_flight'] = len(self._calls)
+            stats['coalesced_by_key'] = dict(self._coalesced_by_key.most_common(20))
+        stats['cross_process'] = bool(self.lock_dir)
+        return stats
+
+    def _process_lock(self, key):
+        if not self.lock_dir:
+            return _NullLock()
+        safe = ''.join(c for c in str(key) if c.isalnum() or c in '-_')
+        return _FileLock(os.path.join(self.lock_dir, f"{safe}.lock"), timeout=self.lock_timeout)
+
+
+class _NullLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FileLock:
+    """
+    Exclusive ``flock`` on a per-key file, shared by all workers on the host.
+    With a ``timeout`` the lock is polled without blocking and LockTimeout is
+    raised once it has stayed busy that many seconds.
+    """
+
+    def __init__(self, path, timeout=None):
+        self.path = path
+        self.timeout = timeout
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = open(self.path, 'a')
+        try:
+            if self.timeout is None:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+            else:
+                self._acquire(time.monotonic() + self.timeout)
+        except BaseException:
+            self._fh.close()
+            raise
+        return self
+
+    def _acquire(self, deadline):
+        while True:
+            try:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LockTimeout(self.path)
+                time.sleep(min(LOCK_POLL_INTERVAL, remaining))
+
+    def __exit__(self, *exc):
+        try:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._fh.close()
+        return False
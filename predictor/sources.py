@@ -0,0 +1,344 @@
+"""
+Upstream price sources and the manager that chooses between them.
+
+Each source has its own deadline, a latency histogram and a circuit breaker.
+The manager starts the highest-priority healthy source and, if it has not
+answered by its p95 latency, sends a hedged request to the next one; the
+first usable answer wins. A source that keeps failing is skipped until its
+cool-down has passed.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from .bars import normalize_bars
+from .clients import upstream_clients
+from .market_hours import local_now
+
+logger = logging.getLogger(__name__)
+
+# Try to import bdshare and stocksurferbd
+try:
+    import bdshare as bd
+    BD_SHARE_AVAILABLE = True
+except ImportError:
+    BD_SHARE_AVAILABLE = False
+    logger.warning("bdshare library not available. Install it using: pip install bdshare")
+
+try:
+    from stocksurferbd import StockSurferBD
+    STOCK_SURFER_AVAILABLE = True
+except ImportError:
+    STOCK_SURFER_AVAILABLE = False
+    logger.warning("stocksurferbd library not available. Install it using: pip install stocksurferbd")
+
+# Reuse pooled keep-alive connections for both libraries' HTTP calls
+if BD_SHARE_AVAILABLE:
+    upstream_clients.bind_library('bdshare')
+if STOCK_SURFER_AVAILABLE:
+    upstream_clients.bind_library('stocksurferbd')
+
+# Days of history kept per symbol
+HISTORY_DAYS = 60
+
+
+def get_stock_data_bdshare(symbol, start=None):
+    """Fetch stock data using bdshare library, from ``start`` (default: 60 days ago)"""
+    try:
+        if not BD_SHARE_AVAILABLE:
+            return None
+
+        # Get today's data
+        today = datetime.now()
+        end_date = today.strftime('%Y-%m-%d')
+        if start is None:
+            start = today - timedelta(days=HISTORY_DAYS)
+        start_date = start.strftime('%Y-%m-%d')
+
+        # Fetch historical data - bdshare API: get_hist_data(start, end, code)
+        df = bd.get_hist_data(start=start_date, end=end_date, code=symbol)
+
+        if df is not None and not df.empty:
+            # Convert price columns to numeric and order bars by date
+            return normalize_bars(df)
+        return None
+    except Exception as e:
+        logger.error(f"Error fetching data from bdshare: {str(e)}")
+        return None
+
+
+def get_stock_data_stocksurfer(symbol, days=HISTORY_DAYS):
+    """Fetch the last ``days`` days of stock data using stocksurferbd library"""
+    try:
+        if not STOCK_SURFER_AVAILABLE:
+            return None
+
+        # Reuse this thread's StockSurferBD client instead of building one per call
+        stock_data = upstream_clients.instance('stocksurferbd', StockSurferBD)
+        data = stock_data.get_hist_data(symbol, days=days)
+
+        if data is not None and not data.empty:
+            # Convert price columns to numeric and order bars by date
+            return normalize_bars(data)
+        return None
+    except Exception as e:
+        logger.error(f"Error fetching data from stocksurferbd: {str(e)}")
+        return None
+
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is open-ended)
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+
+class LatencyHistogram:
+    """Bucketed latency counts plus a window of recent samples for percentiles"""
+
+    def __init__(self, window=200):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.recent = deque(maxlen=window)
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        with self._lock:
+            self.counts[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+            self.recent.append(seconds)
+            self.total += 1
+
+    def percentile(self, pct):
+        """Percentile of recent latencies in seconds, or None without samples"""
+        with self._lock:
+            samples = sorted(self.recent)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.total
+        buckets = {f"le_{bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, counts)}
+        buckets['inf'] = counts[-1]
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            'count': total,
+            'buckets': buckets,
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class CircuitBreaker:
+    """
+    Opens after consecutive failures and lets a single trial call through
+    after a cool-down. A trial whose outcome is never recorded stops
+    blocking others after another cool-down.
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=60):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go ahead; while half-open only one caller gets the trial"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.cooldown:
+                return False
+            if self.trial_started is not None and now - self.trial_started < self.cooldown:
+                return False
+            self.trial_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                # (Re-)open; a failed half-open trial restarts the cool-down
+                self.opened_at = time.monotonic()
+                self.trial_started = None
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                return 'half-open'
+            return 'open'
+
+
+class DataSource:
+    """One upstream fetcher with its deadline, latency histogram and breaker"""
+
+    def __init__(self, name, fetch, available=True, deadline=10.0, breaker=None):
+        self.name = name
+        self.fetch = fetch
+        self.available = available
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyHistogram()
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def call(self, symbol, since):
+        """Run the fetch, recording latency and feeding the breaker"""
+        started = time.monotonic()
+        try:
+            data = self.fetch(symbol, since)
+        except Exception as e:
+            logger.error(f"Error fetching data from {self.name}: {str(e)}")
+            data = None
+        elapsed = time.monotonic() - started
+        self.latency.observe(elapsed)
+
+        if data is None:
+            self.count('failures')
+            self.breaker.record_failure()
+        elif elapsed > self.deadline:
+            # The manager has already given up on this call
+            self.count('late')
+            self.breaker.record_failure()
+        else:
+            self.count('successes')
+            self.breaker.record_success()
+        return data
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats.update({
+            'available': self.available,
+            'breaker': self.breaker.state,
+            'deadline_s': self.deadline,
+            'latency': self.latency.snapshot(),
+        })
+        return stats
+
+
+class SourceManager:
+    """Picks the fastest healthy source, hedging slow primaries"""
+
+    def __init__(self, sources, hedge_delay=2.0, min_hedge_delay=0.25, min_samples=20, max_workers=16):
+        self.sources = sources
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='price-source')
+
+    def hedge_after(self, source):
+        """Seconds to wait on ``source`` before hedging: its p95, once we have enough samples"""
+        if source.latency.total < self.min_samples:
+            return self.hedge_delay
+        return max(self.min_hedge_delay, source.latency.percentile(95))
+
+    def fetch(self, symbol, since=None):
+        """Return ``(data, source_name)`` from the first source that answers, or ``(None, None)``"""
+        queue = [s for s in self.sources if s.available]
+        pending = {}
+        last_launch = [None, None]  # source, started
+
+        def launch():
+            # Ask each breaker only when its source would actually be called (a half-open trial is one call)
+            while queue:
+                source = queue.pop(0)
+                if not source.breaker.allow():
+                    continue
+                started = time.monotonic()
+                future = self._executor.submit(source.call, symbol, since)
+                pending[future] = (source, started)
+                last_launch[:] = [source, started]
+                return True
+            return False
+
+        if not launch():
+            logger.warning(f"No healthy data source for {symbol}")
+            return None, None
+        while pending:
+            now = time.monotonic()
+            wake_at = min(started + source.deadline for source, started in pending.values())
+            hedge_at = None
+            if queue:
+                hedge_at = last_launch[1] + self.hedge_after(last_launch[0])
+                wake_at = min(wake_at, hedge_at)
+
+            done, _ = wait(list(pending), timeout=max(0, wake_at - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                source, _ = pending.pop(future)
+                data = future.result()
+                if data is not None:
+                    source.count('wins')
+                    return data, source.name
+                if queue:
+                    launch()
+
+            now = time.monotonic()
+            for future, (source, started) in list(pending.items()):
+                if now - started >= source.deadline:
+                    # Stop waiting; the call records itself as late if it ever finishes
+                    del pending[future]
+                    source.count('timeouts')
+                    logger.warning(f"{source.name} missed its {source.deadline}s deadline for {symbol}")
+                    if queue:
+                        launch()
+            if queue and hedge_at is not None and now >= hedge_at and pending:
+                hedged = last_launch[0]
+                if launch():
+                    hedged.count('hedged')
+
+        return None, None
+
+    def stats(self):
+        """Per-source counters, breaker state and latency histograms"""
+        return {source.name: source.stats() for source in self.sources}
+
+
+def _fetch_bdshare(symbol, since):
+    return get_stock_data_bdshare(symbol, start=since)
+
+
+def _fetch_stocksurfer(symbol, since):
+    days = (local_now().date() - since).days + 1 if since else HISTORY_DAYS
+    return get_stock_data_stocksurfer(symbol, days=days)
+
+
+def _breaker():
+    return CircuitBreaker(
+        failure_threshold=getattr(settings, 'DATA_SOURCE_BREAKER_FAILURES', 5),
+        cooldown=getattr(settings, 'DATA_SOURCE_BREAKER_COOLDOWN', 60),
+    )
+
+
+source_manager = SourceManager(
+    [
+        DataSource('bdshare', _fetch_bdshare, available=BD_SHARE_AVAILABLE,
+                   deadline=getattr(settings, 'DATA_SOURCE_DEADLINE', 10.0), breaker=_breaker()),
+        DataSource('stocksurferbd', _fetch_stocksurfer, available=STOCK_SURFER_AVAILABLE,
+                   deadline=getattr(settings, 'DATA_SOURCE_DEADLINE', 10.0), breaker=_breaker()),
+    ],
+    hedge_delay=getattr(settings, 'DATA_SOURCE_HEDGE_DELAY', 2.0),
+)
@@ -0,0 +1,365 @@
+"""
+In-process pub/sub for live quotes, streamed to browsers as Server-Sent Events.
+
+``QuoteHub`` keeps the latest quote per symbol and fans updates out to
+subscriptions. Each subscription holds at most one pending quote per symbol:
+a client that reads slower than quotes arrive gets the newest value rather
+than a growing backlog (conflation), and one that has not drained its
+pending quotes for ``max_stall`` seconds is dropped. Idle connections cost a
+small dict and a suspended coroutine, so one ASGI worker can hold thousands.
+
+Quotes come from two places:
+
+* ``publish`` / ``publish_bars``, called by the data layer in this process
+  (from any thread),
+* a pump task that, while anyone is subscribed, watches the price cache's
+  disk tier for entries written by other processes (web workers, the
+  ingestion worker) and publishes the ones that changed; ``watch`` runs the
+  same scan from a background thread while ``/api/quotes/`` is being polled.
+
+The hub also keeps an immutable ``QuoteSnapshot`` of every symbol's quote,
+swapped in whole on each publish, so ``/api/quotes/`` reads it without
+locks, fetches or queries. A symbol's version is the microsecond time its
+data was stored in the price cache, so every process on the host gives the
+same quote the same version and a ``since`` from one worker can be answered
+by another (or by a restarted one). A worker may learn of a cache write up
+to a scan interval late, so ``since`` also returns what changed in the
+``overlap`` seconds before it; clients see a few quotes twice, never miss one.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .cache import price_cache
+from .quotes import quote_from_bars, quote_version, same_quote
+from .universe import universe_symbols
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(event, data, event_id=None):
+    """One Server-Sent Events frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """One client's symbol filter and its conflated pending quotes"""
+
+    def __init__(self, symbols, loop):
+        self.symbols = frozenset(symbols) if symbols else None  # None: every symbol
+        self.loop = loop
+        self.closed = False
+        self.delivered = 0
+        self.conflated = 0
+        self._pending = OrderedDict()
+        self._pending_since = None
+        self._event = asyncio.Event()
+
+    def wants(self, symbol):
+        return self.symbols is None or symbol in self.symbols
+
+    def _offer(self, quote, now):
+        """Queue a quote, replacing any unread one for the same symbol (caller holds the hub lock)"""
+        symbol = quote['symbol']
+        if symbol in self._pending:
+            self.conflated += 1
+            self._pending.move_to_end(symbol)
+        self._pending[symbol] = quote
+        if self._pending_since is None:
+            self._pending_since = now
+
+    def _take(self):
+        """Pending quotes in arrival order (caller holds the hub lock)"""
+        batch = list(self._pending.values())
+        self._pending.clear()
+        self._pending_since = None
+        self.delivered += len(batch)
+        return batch
+
+    def _stalled_for(self, now):
+        return now - self._pending_since if self._pending_since is not None else 0.0
+
+
+class QuoteSnapshot:
+    """Every known quote at one version; never mutated once published"""
+
+    FIELDS = ('price', 'change', 'volume', 'date')
+
+    def __init__(self, version=0, quotes=None, versions=None, overlap=0):
+        self.version = version
+        self.quotes = quotes or {}
+        self.versions = versions or {}  # symbol -> version of its quote
+        self.overlap = overlap  # microseconds before ``since`` that are sent again
+        self._full_body = None
+        self._digest = None
+
+    def columns(self, since=None):
+        """Columnar payload of the quotes changed after ``since`` less the overlap (all when None)"""
+        symbols = sorted(
+            symbol for symbol, version in self.versions.items()
+            if since is None or version > since - self.overlap
+        )
+        payload = {'version': self.version, 'since': since, 'symbols': symbols}
+        for field in self.FIELDS:
+            payload[field] = [self.quotes[symbol][field] for symbol in symbols]
+        return payload
+
+    def full_body(self):
+        """Encoded payload of every quote, built once per snapshot"""
+        if self._full_body is None:
+            self._full_body = json.dumps(self.columns(), separators=(',', ':')).encode()
+        return self._full_body
+
+    def digest(self):
+        """Content hash of the snapshot, equal in every process holding the same quotes"""
+        if self._digest is None:
+            self._digest = hashlib.blake2b(self.full_body(), digest_size=12).hexdigest()
+        return self._digest
+
+
+class QuoteHub:
+    """Latest quotes plus fan-out to subscriptions; safe to publish from any thread"""
+
+    def __init__(self, max_stall=60, poll_interval=2.0, watch_idle=300):
+        self.max_stall = max_stall
+        self.poll_interval = poll_interval
+        self.watch_idle = watch_idle
+        # Two scan intervals: how late another worker's cache write can reach this one
+        self.overlap = round(2 * poll_interval * 1_000_000)
+        self._latest = {}
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._pump_task = None
+        self._disk_versions = {}
+        self._scan_lock = threading.Lock()
+        self._last_scan = None
+        self._watcher = None
+        self._watch_lock = threading.Lock()
+        self._last_watch = None
+        self._snapshot = QuoteSnapshot()
+        self._counters = {'published': 0, 'unchanged': 0, 'dropped_slow': 0, 'subscribed': 0}
+
+    # -- publishing ------------------------------------------------------
+
+    def publish(self, quotes):
+        """Record quotes and queue the changed ones for every interested subscription"""
+        now = time.monotonic()
+        wake = {}
+        changed = []
+        with self._lock:
+            for quote in quotes:
+                if quote is None:
+                    continue
+                if same_quote(self._latest.get(quote['symbol']), quote):
+                    self._counters['unchanged'] += 1
+                    continue
+                self._latest[quote['symbol']] = quote
+                self._counters['published'] += 1
+                changed.append(quote['symbol'])
+                for subscription in self._subscriptions:
+                    if not subscription.wants(quote['symbol']):
+                        continue
+                    if subscription._stalled_for(now) > self.max_stall:
+                        self._drop(subscription)
+                    else:
+                        subscription._offer(quote, now)
+                        wake.setdefault(subscription.loop, []).append(subscription)
+            for subscription in [s for s in self._subscriptions if s.closed]:
+                self._subscriptions.discard(subscription)
+                wake.setdefault(subscription.loop, []).append(subscription)
+            if changed:
+                self._advance_snapshot(changed)
+        self._wake({loop: set(subscriptions) for loop, subscriptions in wake.items()})
+
+    def publish_bars(self, symbol, df, stored_at=None):
+        """Publish the quote for a history just stored in the price cache at ``stored_at``"""
+        self.publish([quote_from_bars(symbol, df, stored_at)])
+
+    def latest(self, symbols=None):
+        """Current quotes for ``symbols`` (every known symbol when None)"""
+        with self._lock:
+            if symbols is None:
+                return list(self._latest.values())
+            return [self._latest[s] for s in symbols if s in self._latest]
+
+    def _advance_snapshot(self, changed):
+        """Swap in a new snapshot with the ``changed`` symbols at their quotes' versions (caller holds the lock)"""
+        previous = self._snapshot
+        versions = dict(previous.versions)
+        for symbol in changed:
+            versions[symbol] = quote_version(self._latest[symbol])
+        version = max(previous.version, *(versions[symbol] for symbol in changed))
+        self._snapshot = QuoteSnapshot(version, dict(self._latest), versions, self.overlap)
+
+    def current(self):
+        """The latest snapshot (a plain attribute read; snapshots are immutable)"""
+        return self._snapshot
+
+    def watch(self):
+        """
+        Keep the snapshot up to date with other processes' cache writes from a
+        background thread, so readers of ``current`` never scan. Cheap to call
+        on every request: it only starts the thread when none is running (the
+        first start in a process scans inline so it has quotes to serve). The
+        thread stops ``watch_idle`` seconds after the last call.
+        """
+        self._last_watch = time.monotonic()
+        watcher = self._watcher
+        if watcher is not None and watcher.is_alive():
+            return
+        with self._watch_lock:
+            if self._watcher is not None and self._watcher.is_alive():
+                return
+            if self._last_scan is None:
+                self._scan_and_publish()
+            self._watcher = threading.Thread(target=self._watch_loop, name='quote-hub-watch', daemon=True)
+            self._watcher.start()
+
+    def stop_watching(self):
+        """Let the watch thread exit after its current scan"""
+        self._last_watch = None
+
+    def _watch_loop(self):
+        while True:
+            last = self._last_watch
+            if last is None or time.monotonic() - last > self.watch_idle:
+                return
+            time.sleep(max(self.poll_interval, 0.05))
+            self._scan_and_publish()
+
+    def _scan_and_publish(self):
+        try:
+            self.publish(self._locked_scan(universe_symbols()))
+        except Exception as e:
+            logger.error(f"Quote snapshot scan failed: {str(e)}")
+
+    def _drop(self, subscription):
+        subscription.closed = True
+        self._counters['dropped_slow'] += 1
+        logger.info(f"Dropping quote stream that has not read for {self.max_stall}s")
+
+    def _wake(self, by_loop):
+        """Set the subscriptions' events on their own loops, one callback per loop"""
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        for loop, subscriptions in by_loop.items():
+            if loop is current:
+                _set_events(subscriptions)
+            elif not loop.is_closed():
+                loop.call_soon_threadsafe(_set_events, subscriptions)
+
+    # -- subscribing -----------------------------------------------------
+
+    def subscribe(self, symbols=None):
+        """New subscription on the running loop; starts the cross-process pump if needed"""
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(symbols, loop)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            self._counters['subscribed'] += 1
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = loop.create_task(self._pump())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.closed = True
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def snapshot(self, subscription):
+        """Current quotes for a subscription, superseding anything it has pending"""
+        with self._lock:
+            subscription._take()
+            if subscription.symbols is None:
+                return list(self._latest.values())
+            return [self._latest[s] for s in subscription.symbols if s in self._latest]
+
+    async def next_batch(self, subscription, timeout):
+        """
+        Wait up to ``timeout`` seconds for quotes. Returns the pending quotes,
+        [] on timeout (time for a heartbeat) or None once the subscription
+        was closed.
+        """
+        if not subscription._pending and not subscription.closed:
+            try:
+                await asyncio.wait_for(subscription._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        subscription._event.clear()
+        with self._lock:
+            if subscription.closed:
+                return None
+            return subscription._take()
+
+    # -- cross-process feed ----------------------------------------------
+
+    async def _pump(self):
+        """Publish price cache entries other processes wrote, while anyone is listening"""
+        while True:
+            with self._lock:
+                if not self._subscriptions:
+                    return
+                symbols = set(universe_symbols())
+                for subscription in self._subscriptions:
+                    symbols |= subscription.symbols or set()
+            try:
+                quotes = await asyncio.to_thread(self._locked_scan, sorted(symbols))
+                self.publish(quotes)
+            except Exception as e:
+                logger.error(f"Quote pump scan failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    def _locked_scan(self, symbols):
+        with self._scan_lock:
+            self._last_scan = time.monotonic()
+            return self._scan(symbols)
+
+    def _scan(self, symbols):
+        """Quotes for symbols whose cache file changed since the last scan"""
+        quotes = []
+        for symbol in symbols:
+            version = price_cache.disk_version(symbol)
+            if version is None or self._disk_versions.get(symbol) == version:
+                continue
+            self._disk_versions[symbol] = version
+            entry = price_cache.peek(symbol)
+            if entry is not None:
+                quotes.append(quote_from_bars(symbol, entry.data, entry.stored_at))
+        return quotes
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'subscriptions': len(self._subscriptions),
+                'symbols': len(self._latest),
+                'pending': sum(len(s._pending) for s in self._subscriptions),
+                'conflated': sum(s.conflated for s in self._subscriptions),
+                'snapshot_version': self._snapshot.version,
+            })
+        return stats
+
+
+def _set_events(subscriptions):
+    for subscription in subscriptions:
+        subscription._event.set()
+
+
+quote_hub = QuoteHub(
+    max_stall=getattr(settings, 'QUOTE_STREAM_MAX_STALL', 60),
+    poll_interval=getattr(settings, 'QUOTE_STREAM_POLL_INTERVAL', 2.0),
+    watch_idle=getattr(settings, 'QUOTE_WATCH_IDLE', 300),
+)
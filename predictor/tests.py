@@ -0,0 +1,1833 @@
+import asyncio
+import csv
+import gzip
+import http.server
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import accounts, forecasting, views
+from .accounts import account_snapshot, account_version
+from .archive import ORDER_FIELDS, archive_orders, order_count
+from .export import EXPORT_COLUMNS, blocks, encode_rows, export_stream
+from .equity import SNAPSHOT_FIELDS, backfill_equity, snapshot_equity, trading_days
+from .backtest import (
+    expanding_volatility, merge_scores, run_backtest, score_forecasts, summarize, trailing_windows, walk_forward,
+)
+from .barstore import BarStore, frame_to_columns
+from .cache import CacheEntry, LRUMemo, PriceCache
+from .charts import line_series, lttb, ohlc_series
+from .clients import REQUESTS_AVAILABLE, ClientRegistry
+from .forecasting import ForecastModel, available_models, forecast_symbols, get_model, register_model
+from .indicator_state import EMA, IndicatorState, RollingSMA, RunningVariance
+from .indicators import EMA_WINDOWS, SMA_WINDOWS, IndicatorEngine
+from .ingest import Ingester, RateLimiter, StubSource, ingest_status, stub_data_source
+from .models import (
+    STARTING_BALANCE, ArchivedStockOrder, EquitySnapshot, Portfolio, PredictionGeneration, PredictionSnapshot, StockOrder,
+    TradingAccount,
+)
+from .orders import ORDER_QUERY_BUDGET, OrderRejected, execute_order, execute_orders, order_history
+from .singleflight import SingleFlight, fcntl
+from .sources import CircuitBreaker, DataSource, SourceManager
+from .streaming import QuoteHub
+
+
+def stub_bars(symbol, seed=0):
+    """The stub source's history for a symbol"""
+    return StubSource(latency=0, seed=seed).bars(symbol)
+
+
+class IsolatedDataMixin:
+    """Swaps the price cache, bar store, quote hub and fetch coalescing for throwaway ones"""
+
+    def setUp(self):
+        super().setUp()
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir, True)
+        self.price_cache = PriceCache(max_bytes=8 * 1024 * 1024, cache_dir=os.path.join(self.data_dir, 'prices'))
+        self.bar_store = BarStore(os.path.join(self.data_dir, 'bars'))
+        self.quote_hub = QuoteHub(poll_interval=0)
+        self.addCleanup(self.quote_hub.stop_watching)
+        self.stock_fetches = SingleFlight(lock_dir=os.path.join(self.data_dir, 'locks'), lock_timeout=0.1)
+        for module, name, value in (
+            ('predictor.views', 'price_cache', self.price_cache),
+            ('predictor.equity', 'price_cache', self.price_cache),
+            ('predictor.streaming', 'price_cache', self.price_cache),
+            ('predictor.views', 'bar_store', self.bar_store),
+            ('predictor.equity', 'bar_store', self.bar_store),
+            ('predictor.views', 'quote_hub', self.quote_hub),
+            ('predictor.views', 'stock_fetches', self.stock_fetches),
+        ):
+            patcher = mock.patch(f"{module}.{name}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class IndicatorStateTests(SimpleTestCase):
+    """Bar-by-bar indicator state against the pandas calculations it replaces"""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        steps = rng.normal(0.0005, 0.02, 300)
+        self.prices = pd.Series(
+            100 * np.exp(np.cumsum(steps)),
+            index=pd.bdate_range('2024-01-01', periods=300),
+        )
+
+    def replay(self, checkpoint_at):
+        """Feed the series bar by bar, restoring from a JSON checkpoint midway"""
+        state = IndicatorState()
+        history = {'sma': {w: [] for w in SMA_WINDOWS}, 'ema': {s: [] for s in EMA_WINDOWS}, 'std': []}
+        for i, (bar_date, price) in enumerate(self.prices.items()):
+            if i == checkpoint_at:
+                state = IndicatorState.from_dict(json.loads(json.dumps(state.to_dict())))
+            state.update(price, bar_date)
+            for window, sma in state.sma.items():
+                history['sma'][window].append(sma.value)
+            for span, ema in state.ema.items():
+                history['ema'][span].append(ema.value)
+            history['std'].append(state.returns.std)
+        return state, history
+
+    def test_matches_pandas_across_checkpoint(self):
+        state, history = self.replay(checkpoint_at=137)
+
+        for window in SMA_WINDOWS:
+            expected = self.prices.rolling(window).mean().to_numpy()
+            self.assertTrue(np.allclose(history['sma'][window], expected, equal_nan=True), window)
+        for span in EMA_WINDOWS:
+            expected = self.prices.ewm(span=span, adjust=False).mean().to_numpy()
+            self.assertTrue(np.allclose(history['ema'][span], expected, equal_nan=True), span)
+        returns = self.prices.pct_change()
+        expected_std = [returns.iloc[:i + 1].std() for i in range(len(returns))]
+        self.assertTrue(np.allclose(history['std'], expected_std, equal_nan=True))
+
+        self.assertEqual(state.n_rows, len(self.prices))
+        self.assertEqual(state.n_prices, len(self.prices))
+        self.assertEqual(state.last_price, self.prices.iloc[-1])
+        self.assertEqual(state.last_date, self.prices.index[-1])
+
+    def test_checkpoint_does_not_change_result(self):
+        uninterrupted, _ = self.replay(checkpoint_at=None)
+        restored, _ = self.replay(checkpoint_at=150)
+        self.assertEqual(restored.to_dict(), uninterrupted.to_dict())
+
+    def test_extend_skips_bars_already_applied(self):
+        state = IndicatorState.from_prices(self.prices.iloc[:200])
+        state = IndicatorState.from_dict(state.to_dict()).extend(self.prices)
+        full = IndicatorState.from_prices(self.prices)
+        self.assertEqual(state.n_rows, full.n_rows)
+        self.assertTrue(np.isclose(state.volatility, full.volatility))
+        for window in SMA_WINDOWS:
+            self.assertTrue(np.isclose(state.sma[window].value, full.sma[window].value))
+
+    def assertSamePrediction(self, from_state, from_frame):
+        self.assertEqual(from_state.keys(), from_frame.keys())
+        for key in ('current_price', 'volatility'):
+            self.assertAlmostEqual(from_state[key], from_frame[key], places=9)
+        for horizon, value in from_frame['predictions'].items():
+            self.assertAlmostEqual(from_state['predictions'][horizon], value, places=6)
+        self.assertEqual((from_state['confidence'], from_state['trend']), (from_frame['confidence'], from_frame['trend']))
+
+    def test_prediction_from_state_matches_dataframe(self):
+        frame = pd.DataFrame({'close': self.prices})
+        frame.iloc[[40, 41, 200], 0] = np.nan  # gaps count as rows but not as prices
+        for rows in (10, 45, len(frame)):
+            with self.subTest(rows=rows):
+                bars = frame.iloc[:rows]
+                state = IndicatorState.from_dict(IndicatorState.from_prices(bars['close']).to_dict())
+                self.assertSamePrediction(
+                    views.predict_price_from_state(state, rng=np.random.default_rng(3)),
+                    views.predict_price_simple_moving_average(bars, rng=np.random.default_rng(3)),
+                )
+                # The DataFrame entry point hands a state straight through
+                self.assertSamePrediction(
+                    views.predict_price_simple_moving_average(state, rng=np.random.default_rng(3)),
+                    views.predict_price_simple_moving_average(bars, rng=np.random.default_rng(3)),
+                )
+
+    def test_short_history_predicts_nothing_either_way(self):
+        bars = self.prices.iloc[:9].to_frame('close')
+        self.assertIsNone(views.predict_price_from_state(IndicatorState.from_prices(bars['close'])))
+        self.assertIsNone(views.predict_price_simple_moving_average(bars))
+
+    def test_components_round_trip(self):
+        sma, ema, var = RollingSMA(5), EMA(10), RunningVariance()
+        for price in self.prices.iloc[:12]:
+            sma.update(price)
+            ema.update(price)
+            var.update(price)
+        sma = RollingSMA.from_dict(sma.to_dict())
+        ema = EMA.from_dict(ema.to_dict())
+        var = RunningVariance.from_dict(var.to_dict())
+        for price in self.prices.iloc[12:40]:
+            sma.update(price)
+            ema.update(price)
+            var.update(price)
+        head = self.prices.iloc[:40]
+        self.assertTrue(np.isclose(sma.value, head.iloc[-5:].mean()))
+        self.assertTrue(np.isclose(ema.value, head.ewm(span=10, adjust=False).mean().iloc[-1]))
+        self.assertTrue(np.isclose(var.std, head.std()))
+
+
+def account_state(user):
+    account = TradingAccount.objects.get(user=user)
+    holdings = dict(Portfolio.objects.filter(user=user).values_list('symbol', 'quantity'))
+    return account.balance, account.ledger_version, holdings, StockOrder.objects.filter(user=user).count()
+
+
+class ExecuteOrderTests(TestCase):
+    """Query budget and rollback of single orders"""
+
+    # Inside a test case the order's transaction is a savepoint: SAVEPOINT and RELEASE come on top
+    SAVEPOINT_QUERIES = 2
+
+    def setUp(self):
+        self.user = User.objects.create_user('trader', password='secret')
+        TradingAccount.get_or_create_account(self.user)
+        execute_order(self.user, 'GP', 'BUY', 10, Decimal('300.00'))
+
+    def test_buy_within_budget(self):
+        with self.assertNumQueries(ORDER_QUERY_BUDGET + self.SAVEPOINT_QUERIES):
+            order, balance, _ = execute_order(self.user, 'GP', 'BUY', 5, Decimal('310.00'))
+        self.assertEqual(order.total_amount, Decimal('1550.00'))
+        self.assertEqual(balance, STARTING_BALANCE - Decimal('3000.00') - Decimal('1550.00'))
+        holding = Portfolio.objects.get(user=self.user, symbol='GP')
+        self.assertEqual((holding.quantity, holding.avg_price), (15, Decimal('303.33')))
+
+    def test_sell_within_budget(self):
+        with self.assertNumQueries(ORDER_QUERY_BUDGET + self.SAVEPOINT_QUERIES):
+            _, balance, _ = execute_order(self.user, 'GP', 'SELL', 4, Decimal('320.00'))
+        self.assertEqual(balance, STARTING_BALANCE - Decimal('3000.00') + Decimal('1280.00'))
+        self.assertEqual(Portfolio.objects.get(user=self.user, symbol='GP').quantity, 6)
+
+    def test_insufficient_balance_changes_nothing(self):
+        before = account_state(self.user)
+        # The refused debit and the account read, plus the savepoint being rolled back
+        with self.assertNumQueries(2 + self.SAVEPOINT_QUERIES + 1):
+            with self.assertRaisesMessage(OrderRejected, 'Insufficient balance'):
+                execute_order(self.user, 'BRACBANK', 'BUY', 1000, Decimal('500.00'))
+        self.assertEqual(account_state(self.user), before)
+
+    def test_rejected_sell_rolls_back_credit(self):
+        # The credit runs before the holding check, so only the rollback keeps the balance intact
+        before = account_state(self.user)
+        with self.assertRaisesMessage(OrderRejected, 'Insufficient shares to sell'):
+            execute_order(self.user, 'GP', 'SELL', 11, Decimal('300.00'))
+        self.assertEqual(account_state(self.user), before)
+
+
+class ExecuteOrdersTests(TestCase):
+    """A basket costs the same handful of queries whatever its size"""
+
+    # SAVEPOINT; ledger bump, balance read, holdings read; orders insert, emptied holdings delete,
+    # changed holdings update, new holdings insert, balance update; RELEASE
+    FILLED_BASKET_QUERIES = 10
+    # SAVEPOINT; ledger bump, balance read, holdings read; ROLLBACK TO SAVEPOINT; RELEASE
+    REJECTED_BASKET_QUERIES = 6
+
+    def setUp(self):
+        self.user = User.objects.create_user('basket', password='secret')
+        TradingAccount.get_or_create_account(self.user)
+        execute_order(self.user, 'GP', 'BUY', 10, Decimal('300.00'))
+        execute_order(self.user, 'ACI', 'BUY', 10, Decimal('200.00'))
+
+    def basket(self, size):
+        """Sell out of ACI, then alternate buying more GP and new BRACBANK"""
+        orders = [{'symbol': 'ACI', 'type': 'SELL', 'quantity': 10, 'price': '210.00'}]
+        for i in range(size - 1):
+            orders.append({'symbol': ('GP', 'BRACBANK')[i % 2], 'type': 'BUY', 'quantity': 1, 'price': '50.00'})
+        return orders
+
+    def filled_queries(self, size):
+        """FILLED_BASKET_QUERIES, plus extra order inserts where the backend caps a statement's parameters (SQLite)"""
+        fields = [f for f in StockOrder._meta.concrete_fields if not f.primary_key]
+        batch = connection.ops.bulk_batch_size(fields, [None] * size)
+        return self.FILLED_BASKET_QUERIES - 1 + -(-size // batch)
+
+    def assert_basket_filled(self, size, mode):
+        with self.assertNumQueries(self.filled_queries(size)):
+            results, balance, _, applied = execute_orders(self.user, self.basket(size), mode=mode)
+        self.assertTrue(applied)
+        self.assertEqual([r['status'] for r in results], ['filled'] * size)
+        bought = size - 1
+        self.assertEqual(balance, STARTING_BALANCE - Decimal('5000.00') + Decimal('2100.00') - 50 * bought)
+        holdings = dict(Portfolio.objects.filter(user=self.user).values_list('symbol', 'quantity'))
+        self.assertEqual(holdings, {'GP': 10 + (bought + 1) // 2, 'BRACBANK': bought // 2})
+        self.assertEqual(StockOrder.objects.filter(user=self.user).count(), 2 + size)
+
+    def test_small_basket_all(self):
+        self.assert_basket_filled(5, 'all')
+
+    def test_small_basket_best_effort(self):
+        self.assert_basket_filled(5, 'best_effort')
+
+    def test_large_basket_all(self):
+        self.assert_basket_filled(400, 'all')
+
+    def test_large_basket_best_effort(self):
+        self.assert_basket_filled(400, 'best_effort')
+
+    def test_rejected_all_basket_rolls_back(self):
+        before = account_state(self.user)
+        orders = self.basket(300) + [{'symbol': 'RENATA', 'type': 'SELL', 'quantity': 1, 'price': '10.00'}]
+        with self.assertNumQueries(self.REJECTED_BASKET_QUERIES):
+            results, balance, version, applied = execute_orders(self.user, orders, mode='all')
+        self.assertFalse(applied)
+        self.assertEqual(results[-1]['status'], 'rejected')
+        self.assertEqual({r['status'] for r in results[:-1]}, {'skipped'})
+        self.assertEqual((balance, version), before[:2])
+        self.assertEqual(account_state(self.user), before)
+
+    def test_best_effort_fills_around_rejections(self):
+        orders = self.basket(300) + [{'symbol': 'RENATA', 'type': 'SELL', 'quantity': 1, 'price': '10.00'}]
+        with self.assertNumQueries(self.filled_queries(300)):
+            results, _, _, applied = execute_orders(self.user, orders, mode='best_effort')
+        self.assertTrue(applied)
+        self.assertEqual(results[-1], {'index': 300, 'status': 'rejected', 'error': "You don't own this stock"})
+        self.assertEqual(StockOrder.objects.filter(user=self.user).count(), 2 + 300)
+
+
+class ConcurrentOrderTests(TransactionTestCase):
+    """Orders racing from several threads must leave the ledger consistent"""
+
+    THREADS = 12
+    ORDERS_PER_THREAD = 30
+
+    def test_concurrent_orders_reconcile(self):
+        user = User.objects.create_user('racer', password='secret')
+        TradingAccount.get_or_create_account(user)
+        # One Counter per thread, merged after join: no shared counter updated concurrently
+        per_thread = [Counter() for _ in range(self.THREADS)]
+        errors = []
+        start = threading.Barrier(self.THREADS)
+
+        def trade(worker):
+            outcomes = per_thread[worker]
+            try:
+                start.wait()
+                for i in range(self.ORDERS_PER_THREAD):
+                    symbol = ('GP', 'ACI', 'SQURPHARMA')[(worker + i) % 3]
+                    order_type = 'SELL' if i % 3 == 2 else 'BUY'
+                    try:
+                        execute_order(user, symbol, order_type, 3 + worker % 8, Decimal('500.00') + i)
+                        outcomes['filled'] += 1
+                    except OrderRejected:
+                        outcomes['rejected'] += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=trade, args=(worker,)) for worker in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        outcomes = sum(per_thread, Counter())
+
+        self.assertEqual(errors, [])
+        self.assertEqual(outcomes['filled'] + outcomes['rejected'], self.THREADS * self.ORDERS_PER_THREAD)
+        self.assertGreater(outcomes['rejected'], 0)  # the account runs out of money along the way
+        orders = StockOrder.objects.filter(user=user)
+        self.assertEqual(orders.count(), outcomes['filled'])
+
+        totals = dict(orders.values_list('order_type').annotate(total=Sum('total_amount')))
+        account = TradingAccount.objects.get(user=user)
+        self.assertEqual(account.balance, STARTING_BALANCE - totals.get('BUY', 0) + totals.get('SELL', 0))
+        self.assertGreaterEqual(account.balance, 0)
+        self.assertEqual(account.ledger_version, outcomes['filled'])
+
+        held = Counter()
+        for symbol, order_type, quantity in orders.values_list('symbol', 'order_type', 'quantity'):
+            held[symbol] += quantity if order_type == 'BUY' else -quantity
+        holdings = dict(Portfolio.objects.filter(user=user).values_list('symbol', 'quantity'))
+        self.assertEqual(holdings, {symbol: quantity for symbol, quantity in held.items() if quantity})
+
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'}}
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class AccountSnapshotTests(TestCase):
+    """The cached version pointer must never fall behind a committed trade"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', password='secret')
+        TradingAccount.get_or_create_account(self.user)
+
+    def trade(self, quantity=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            _, _, version = execute_order(self.user, 'GP', 'BUY', quantity, Decimal('10.00'))
+        return version
+
+    def test_snapshot_after_trade_is_served_from_cache(self):
+        account_snapshot(self.user)
+        version = self.trade()
+        with self.assertNumQueries(0):
+            snapshot = account_snapshot(self.user)
+        self.assertEqual(snapshot['ledger_version'], version)
+        self.assertEqual(snapshot['balance'], float(STARTING_BALANCE - Decimal('10.00')))
+
+    def test_reader_that_raced_a_commit_cannot_regress_pointer(self):
+        real_build = accounts.build_account_snapshot
+        committed = []
+
+        def build_then_trade(user):
+            snapshot = real_build(user)
+            if not committed:
+                # The reader has read the old ledger; the trade and its commit hook run before it caches
+                committed.append(None)
+                committed[0] = self.trade()
+            return snapshot
+
+        with mock.patch.object(accounts, 'build_account_snapshot', side_effect=build_then_trade):
+            stale = account_snapshot(self.user)
+        self.assertLess(stale['ledger_version'], committed[0])
+
+        self.assertEqual(account_version(self.user), committed[0])
+        self.assertEqual(account_snapshot(self.user)['ledger_version'], committed[0])
+
+    def test_old_pointer_added_before_the_hook_is_caught_up(self):
+        old = account_version(self.user)
+        cache.delete(accounts._version_key(self.user.pk))
+        with self.captureOnCommitCallbacks() as callbacks:
+            execute_order(self.user, 'GP', 'BUY', 1, Decimal('10.00'))
+        cache.add(accounts._version_key(self.user.pk), old)  # a reader that read the database earlier
+        callbacks[0]()
+        self.assertEqual(account_version(self.user), old + 1)
+
+    def test_commit_hooks_out_of_order(self):
+        with self.captureOnCommitCallbacks() as first:
+            execute_order(self.user, 'GP', 'BUY', 1, Decimal('10.00'))
+        with self.captureOnCommitCallbacks() as second:
+            execute_order(self.user, 'GP', 'BUY', 2, Decimal('10.00'))
+        second[0]()
+        first[0]()
+        snapshot = account_snapshot(self.user)
+        self.assertEqual(snapshot['ledger_version'], 2)
+        self.assertEqual(snapshot['portfolio'][0]['quantity'], 3)
+
+    def test_pointer_behind_stored_snapshots_catches_up(self):
+        self.trade()
+        latest = self.trade()
+        cache.set(accounts._version_key(self.user.pk), latest - 1)  # two hooks raced, the older wrote last
+        self.assertEqual(account_version(self.user), latest)
+        self.assertEqual(cache.get(accounts._version_key(self.user.pk)), latest)
+
+
+@skipUnless(fcntl, 'cross-process locks need fcntl')
+class StockFetchLockTests(IsolatedDataMixin, SimpleTestCase):
+    """Giving up on another worker's fetch lock"""
+
+    def hold_lock(self, symbol):
+        handle = open(os.path.join(self.stock_fetches.lock_dir, f"{symbol}.lock"), 'a')
+        self.addCleanup(handle.close)
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+
+    def test_cold_symbol_fetches_without_the_lock(self):
+        self.hold_lock('GP')
+        with mock.patch.object(views, 'fetch_stock_data', return_value=(stub_bars('GP'), 'stub')) as fetch:
+            data, source = views.get_stock_data('GP')
+        fetch.assert_called_once()
+        self.assertEqual(source, 'stub')
+        self.assertEqual(len(data), len(stub_bars('GP')))
+        self.assertEqual(self.stock_fetches.stats()['lock_timeouts'], 1)
+        self.assertIsNotNone(self.price_cache.get('GP'))
+
+    def test_stored_symbol_is_served_while_locked(self):
+        self.price_cache.ttl = lambda: -1  # store an already expired entry
+        self.price_cache.set('GP', stub_bars('GP'), 'stub')
+        self.hold_lock('GP')
+        with mock.patch.object(views, 'fetch_stock_data') as fetch:
+            data, source = views.get_stock_data('GP')
+        fetch.assert_not_called()
+        self.assertEqual((len(data), source), (len(stub_bars('GP')), 'stub'))
+
+
+def fake_fetch(answer, delay=0.0, calls=None):
+    """A DataSource fetch function that answers ``answer`` after ``delay`` seconds"""
+    def fetch(symbol, since):
+        if calls is not None:
+            calls.append(symbol)
+        time.sleep(delay)
+        return answer
+    return fetch
+
+
+class SourceManagerTests(SimpleTestCase):
+    """Hedging, deadlines and circuit breaking across upstream sources"""
+
+    def manager(self, *sources, hedge_delay=0.05):
+        manager = SourceManager(list(sources), hedge_delay=hedge_delay, min_hedge_delay=0.01)
+        self.addCleanup(manager._executor.shutdown, wait=True)
+        return manager
+
+    def test_slow_primary_is_hedged(self):
+        primary = DataSource('primary', fake_fetch('slow', delay=0.5))
+        backup = DataSource('backup', fake_fetch('fast'))
+        started = time.monotonic()
+        self.assertEqual(self.manager(primary, backup).fetch('GP'), ('fast', 'backup'))
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(primary.stats()['hedged'], 1)
+        self.assertEqual(backup.stats()['wins'], 1)
+
+    def test_no_hedge_when_primary_answers_in_time(self):
+        calls = []
+        primary = DataSource('primary', fake_fetch('data', delay=0.01))
+        backup = DataSource('backup', fake_fetch('other', calls=calls))
+        self.assertEqual(self.manager(primary, backup, hedge_delay=1.0).fetch('GP'), ('data', 'primary'))
+        self.assertEqual(calls, [])
+
+    def test_first_usable_answer_wins(self):
+        # The primary answers first but with nothing; the backup's answer is used
+        primary = DataSource('primary', fake_fetch(None))
+        backup = DataSource('backup', fake_fetch('data', delay=0.02))
+        self.assertEqual(self.manager(primary, backup, hedge_delay=1.0).fetch('GP'), ('data', 'backup'))
+        self.assertEqual(primary.stats()['failures'], 1)
+
+    def test_call_past_deadline_times_out_and_counts_late(self):
+        source = DataSource('slow', fake_fetch('data', delay=0.2), deadline=0.05)
+        self.assertEqual(self.manager(source).fetch('GP'), (None, None))
+        self.assertEqual(source.stats()['timeouts'], 1)
+        time.sleep(0.25)  # the abandoned call finishes and records itself
+        self.assertEqual(source.stats()['late'], 1)
+        self.assertEqual(source.breaker.failures, 1)
+
+    def test_breaker_opens_then_half_opens(self):
+        breaker = CircuitBreaker(failure_threshold=3, cooldown=0.1)
+        for _ in range(2):
+            breaker.record_failure()
+        self.assertEqual((breaker.state, breaker.allow()), ('closed', True))
+        breaker.record_failure()
+        self.assertEqual((breaker.state, breaker.allow()), ('open', False))
+
+        time.sleep(0.12)
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # one trial at a time
+        breaker.record_failure()
+        self.assertEqual((breaker.state, breaker.allow()), ('open', False))
+
+        time.sleep(0.12)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual((breaker.state, breaker.allow(), breaker.allow()), ('closed', True, True))
+
+    def test_half_open_admits_one_concurrent_caller(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+        breaker.record_failure()
+        time.sleep(0.07)
+        admitted = []
+        start = threading.Barrier(8)
+
+        def call():
+            start.wait()
+            admitted.append(breaker.allow())
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(admitted.count(True), 1)
+
+    def test_open_source_is_skipped(self):
+        calls = []
+        broken = DataSource('broken', fake_fetch('stale', calls=calls), breaker=CircuitBreaker(1, cooldown=60))
+        broken.breaker.record_failure()
+        backup = DataSource('backup', fake_fetch('data'))
+        self.assertEqual(self.manager(broken, backup).fetch('GP'), ('data', 'backup'))
+        self.assertEqual(calls, [])
+
+
+class IngesterTests(IsolatedDataMixin, SimpleTestCase):
+    """One ingestion cycle against the local stub source"""
+
+    def ingester(self, symbols, retries=2, **stub):
+        self.status_file = os.path.join(self.data_dir, 'ingest.json')
+        return Ingester(
+            symbols, [stub_data_source(latency=0, **stub)],
+            lambda symbol, fetch: views.update_stock_data(symbol, fetch=fetch, serve_stale=False),
+            concurrency=2, retries=retries, backoff=0, status_file=self.status_file,
+        )
+
+    def test_cycle_fills_price_cache(self):
+        ingester = self.ingester(['GP', 'ACI'])
+        asyncio.run(ingester.run(once=True))
+        self.assertEqual((ingester.last_cycle['succeeded'], ingester.last_cycle['failed']), (2, 0))
+        for symbol in ('GP', 'ACI'):
+            data, source = self.price_cache.get(symbol)
+            self.assertEqual(source, 'stub')
+            pd.testing.assert_frame_equal(data, stub_bars(symbol), check_freq=False)
+            self.assertEqual(ingester.status[symbol].attempts, 1)
+
+    def test_failure_is_retried(self):
+        # With seed 9 the stub's first call fails and its second succeeds
+        ingester = self.ingester(['GP'], failure_rate=0.5, seed=9)
+        asyncio.run(ingester.run(once=True))
+        status = ingester.status['GP']
+        self.assertEqual((status.attempts, status.failures, status.last_error), (2, 1, None))
+        self.assertIsNotNone(self.price_cache.get('GP'))
+
+    def test_persistent_failure_is_recorded(self):
+        ingester = self.ingester(['GP'], retries=2, failure_rate=1.0)
+        asyncio.run(ingester.run(once=True))
+        self.assertEqual(ingester.last_cycle['failed'], 1)
+        self.assertIsNone(self.price_cache.get('GP'))
+        written = ingest_status(self.status_file)['symbols']['GP']
+        self.assertEqual((written['attempts'], written['failures']), (3, 3))
+        self.assertEqual(written['last_error'], 'no source returned data')
+        self.assertIsNone(written['lag_s'])
+
+    def test_lag_is_reported_per_symbol(self):
+        ingester = self.ingester(['GP', 'ACI', 'NOPE'], retries=0)
+        update = ingester.update
+        # NOPE is listed but upstream never has it
+        ingester.update = lambda symbol, fetch: (None, None) if symbol == 'NOPE' else update(symbol, fetch)
+        asyncio.run(ingester.run(once=True))
+        finished = ingester.status['GP'].last_success
+
+        lags = ingester.lags(now=finished + 5)
+        self.assertAlmostEqual(lags['GP'], 5, delta=1)
+        self.assertIsNone(lags['NOPE'])
+
+        status = ingest_status(self.status_file, now=finished + 30)
+        self.assertAlmostEqual(status['symbols']['ACI']['lag_s'], 30, delta=1)
+        self.assertAlmostEqual(status['max_lag_s'], 30, delta=1)
+        self.assertEqual(status['never_ingested'], 1)
+
+
+class RateLimiterTests(SimpleTestCase):
+    def test_calls_are_spaced_out(self):
+        limiter = RateLimiter(rate=20, burst=1)
+        started = time.monotonic()
+        waits = [limiter.acquire() for _ in range(5)]
+        elapsed = time.monotonic() - started
+        self.assertEqual(waits[0], 0.0)
+        self.assertGreaterEqual(elapsed, 4 / 20 * 0.9)
+        self.assertTrue(all(wait > 0 for wait in waits[1:]))
+
+    def test_burst_is_free(self):
+        limiter = RateLimiter(rate=1, burst=3)
+        started = time.monotonic()
+        for _ in range(3):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - started, 0.1)
+
+
+class OrderHistoryTests(TestCase):
+    """Keyset paging over (timestamp, id) with four orders sharing each timestamp"""
+
+    DAYS = 6
+
+    def setUp(self):
+        self.user = User.objects.create_user('history', password='pw')
+        self.client.force_login(self.user)
+        self.start = timezone.now() - timedelta(days=10, hours=1)
+        for i in range(4 * self.DAYS):
+            order = StockOrder.objects.create(
+                user=self.user, symbol='GP' if i % 2 else 'ACI', order_type='SELL' if i % 3 == 0 else 'BUY',
+                quantity=1, price=Decimal('10'), total_amount=Decimal('10'),
+            )
+            # Ids are spread over the days so id order is not time order
+            StockOrder.objects.filter(id=order.id).update(timestamp=self.start + timedelta(days=i % self.DAYS))
+
+    def expected(self, orders):
+        return [order.id for order in sorted(orders, key=lambda order: (order.timestamp, order.id), reverse=True)]
+
+    def walk(self, **params):
+        ids, cursor, pages = [], None, 0
+        while True:
+            query = dict(params, **({'cursor': cursor} if cursor else {}))
+            response = self.client.get('/api/orders/', query)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            ids.extend(order['id'] for order in body['orders'])
+            cursor, pages = body['next_cursor'], pages + 1
+            if cursor is None:
+                return ids, pages
+
+    def test_every_page_walked_without_duplicates_or_gaps(self):
+        for limit in (1, 3, 4, 5, 24):
+            with self.subTest(limit=limit):
+                ids, pages = self.walk(limit=limit)
+                self.assertEqual(ids, self.expected(StockOrder.objects.all()))
+                self.assertEqual(len(set(ids)), len(ids))
+                self.assertEqual(pages, -(-len(ids) // limit))
+
+    def test_filters(self):
+        orders = list(StockOrder.objects.all())
+
+        def day(offset):
+            return timezone.localdate(self.start + timedelta(days=offset)).isoformat()
+
+        cases = [
+            ({'symbol': 'gp'}, [o for o in orders if o.symbol == 'GP']),
+            ({'type': 'sell'}, [o for o in orders if o.order_type == 'SELL']),
+            ({'from': day(2)}, [o for o in orders if o.timestamp >= self.start + timedelta(days=2)]),
+            ({'to': day(2)}, [o for o in orders if o.timestamp <= self.start + timedelta(days=2)]),
+            ({'symbol': 'ACI', 'type': 'BUY', 'from': day(1), 'to': day(3)},
+             [o for o in orders if o.symbol == 'ACI' and o.order_type == 'BUY'
+              and self.start + timedelta(days=1) <= o.timestamp <= self.start + timedelta(days=3)]),
+        ]
+        for params, matching in cases:
+            with self.subTest(**params):
+                self.assertTrue(matching)
+                ids, _ = self.walk(limit=3, **params)
+                self.assertEqual(ids, self.expected(matching))
+
+    def test_archived_orders_merge_in_time_order(self):
+        everything = self.expected(StockOrder.objects.all())
+        self.assertEqual(archive_orders(days=7.5), 12)
+        self.assertEqual(ArchivedStockOrder.objects.count(), 12)
+
+        live, _ = self.walk(limit=5)
+        self.assertEqual(live, self.expected(StockOrder.objects.all()))
+        merged, _ = self.walk(limit=5, archived=1)
+        self.assertEqual(merged, everything)
+
+    def test_malformed_cursor_is_rejected(self):
+        for cursor in ('garbage', 'bm90LWEtY3Vyc29y', '!!!'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/orders/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('cursor', response.json()['error'])
+
+    def test_deep_page_costs_the_same_as_the_first(self):
+        for include_archived in (False, True):
+            with self.subTest(include_archived=include_archived):
+                with CaptureQueriesContext(connection) as first:
+                    _, cursor = order_history(self.user, limit=2, include_archived=include_archived)
+                for _ in range(9):
+                    _, cursor = order_history(self.user, cursor=cursor, limit=2, include_archived=include_archived)
+                with CaptureQueriesContext(connection) as deep:
+                    page, _ = order_history(self.user, cursor=cursor, limit=2, include_archived=include_archived)
+                self.assertEqual(len(page), 2)
+                self.assertEqual(len(deep), len(first))
+                self.assertEqual(len(first), 2 if include_archived else 1)
+
+
+class PredictionMemoTests(SimpleTestCase):
+    def setUp(self):
+        self.memo = LRUMemo(max_entries=16)
+        patcher = mock.patch.object(views, 'prediction_memo', self.memo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bars = stub_bars('GP')
+
+    def test_repeat_calls_hit_the_memo_and_agree(self):
+        first = views.predict_symbol('GP', self.bars)
+        with mock.patch.object(views, 'predict_price_simple_moving_average') as predict:
+            second = views.predict_symbol('GP', self.bars.copy())
+        predict.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual(self.memo.stats()['hits'], 1)
+
+    def test_same_bars_give_the_same_numbers_without_the_memo(self):
+        first = views.predict_symbol('GP', self.bars)
+        self.memo._entries.clear()
+        self.assertEqual(views.predict_symbol('GP', self.bars), first)
+        self.assertEqual(self.memo.stats()['hits'], 0)
+
+    def test_changed_bars_change_the_prediction(self):
+        first = views.predict_symbol('GP', self.bars)
+        moved = self.bars.copy()
+        moved.iloc[-1, moved.columns.get_loc('close')] *= 1.05
+        second = views.predict_symbol('GP', moved)
+        self.assertNotEqual(first['current_price'], second['current_price'])
+        self.assertNotEqual(first['predictions'], second['predictions'])
+        self.assertEqual(self.memo.stats()['misses'], 2)
+        self.assertEqual(self.memo.stats()['entries'], 2)
+
+    def test_batch_matches_single_symbol_and_shares_the_memo(self):
+        frames = {symbol: stub_bars(symbol) for symbol in ('GP', 'ACI', 'BATBC')}
+        batch = views.predict_symbols(frames)
+        self.memo._entries.clear()
+        for symbol, df in frames.items():
+            single = views.predict_symbol(symbol, df)
+            self.assertEqual(single['confidence'], batch[symbol]['confidence'])
+            for horizon, value in single['predictions'].items():
+                self.assertAlmostEqual(value, batch[symbol]['predictions'][horizon], places=6)
+
+        hits = self.memo.stats()['hits']
+        self.assertEqual(views.predict_symbols(frames).keys(), frames.keys())
+        self.assertEqual(self.memo.stats()['hits'], hits + len(frames))
+
+
+class _KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    """Answers every GET with the client's port, over HTTP/1.1 keep-alive"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = str(self.client_address[1]).encode()
+        self.server.client_ports.append(self.client_address[1])
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@skipUnless(REQUESTS_AVAILABLE, 'requests is not installed')
+class UpstreamClientPoolingTests(SimpleTestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+        self.server.client_ports = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/quote"
+        self.registry = ClientRegistry(pool_maxsize=2, default_timeout=5)
+        self.addCleanup(self.registry.close)
+
+    def test_sequential_calls_share_one_connection(self):
+        session = self.registry.session('dse')
+        for _ in range(10):
+            self.assertEqual(session.get(self.url).status_code, 200)
+        self.assertIs(self.registry.session('dse'), session)
+        self.assertEqual(len(set(self.server.client_ports)), 1)
+        stats = self.registry.stats()['dse']
+        self.assertEqual((stats['requests'], stats['connections_opened']), (10, 1))
+        self.assertEqual(stats['connection_reuse_rate'], 0.9)
+
+    def test_threads_reuse_at_most_pool_maxsize_connections(self):
+        session = self.registry.session('dse')
+        statuses = []
+
+        def worker():
+            for _ in range(10):
+                statuses.append(session.get(self.url).status_code)
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [200] * 60)
+        self.assertLessEqual(len(set(self.server.client_ports)), 2)
+        self.assertLessEqual(self.registry.stats()['dse']['connections_opened'], 2)
+
+    def test_bound_library_goes_through_the_pool(self):
+        import requests
+        library = type(sys)('fake_dse_lib')
+        library.requests = requests
+        sys.modules['fake_dse_lib'] = library
+        self.addCleanup(sys.modules.pop, 'fake_dse_lib')
+
+        self.assertEqual(self.registry.bind_library('fake_dse_lib'), 1)
+        for _ in range(5):
+            library.requests.get(self.url)
+        self.assertIs(library.requests.HTTPError, requests.HTTPError)
+        self.assertEqual(len(set(self.server.client_ports)), 1)
+        self.assertEqual(self.registry.stats()['fake_dse_lib']['requests'], 5)
+
+    def test_library_clients_are_built_once_per_thread(self):
+        built = [self.registry.instance('lib', object) for _ in range(3)]
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.registry.instance('lib', object)))
+        thread.start()
+        thread.join()
+        self.assertTrue(all(client is built[0] for client in built))
+        self.assertIsNot(other[0], built[0])
+        self.assertEqual(self.registry.stats()['instances_created'], {'lib': 2})
+
+
+class BarStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.store = BarStore(self.root)
+        self.bars = stub_bars('GP')
+
+    def assertStored(self, symbol, expected):
+        stored = self.store.frame(symbol)
+        self.assertTrue(stored.index.equals(expected.index))
+        for column in ('open', 'high', 'low', 'close'):
+            np.testing.assert_allclose(stored[column].to_numpy(), expected[column].to_numpy())
+        np.testing.assert_array_equal(stored['volume'].to_numpy(), expected['volume'].to_numpy())
+
+    def test_write_and_read_round_trip(self):
+        self.store.write('GP', self.bars)
+        self.assertStored('GP', self.bars)
+        self.assertEqual(self.store.length('GP'), len(self.bars))
+        self.assertEqual(self.store.last_date('GP'), self.bars.index[-1].date())
+        self.assertEqual(self.store.symbols(), ['GP'])
+
+        start, end = self.bars.index[10], self.bars.index[20]
+        window = self.store.read('GP', start=start, end=end)
+        self.assertEqual(len(window['date']), 11)
+        self.assertTrue(self.store.frame('GP', start=start, end=end).index.equals(self.bars.index[10:21]))
+        self.assertIsNone(self.store.read('NOPE'))
+
+    def test_append_adds_only_newer_bars(self):
+        self.assertEqual(self.store.append('GP', self.bars.iloc[:20]), 20)
+        self.assertEqual(self.store.append('GP', self.bars.iloc[15:]), len(self.bars) - 20)
+        self.assertEqual(self.store.append('GP', self.bars), 0)
+        self.assertStored('GP', self.bars)
+
+    def test_revised_bar_rewrites_history(self):
+        self.store.append('GP', self.bars)
+        revised = self.bars.copy()
+        revised.iloc[25, revised.columns.get_loc('close')] += 1
+        self.assertEqual(self.store.append('GP', revised.iloc[15:35]), -1)
+        self.assertStored('GP', revised)
+
+    def test_older_bars_are_merged_in(self):
+        self.store.append('GP', self.bars.iloc[20:])
+        self.assertEqual(self.store.append('GP', self.bars.iloc[:25]), -1)
+        self.assertStored('GP', self.bars)
+        self.assertEqual(self.store.length('GP'), len(self.bars))
+
+    def test_undated_bars_are_rejected(self):
+        undated = self.bars.reset_index(drop=True)
+        with self.assertRaises(ValueError):
+            frame_to_columns(undated)
+        with self.assertRaises(ValueError):
+            frame_to_columns(undated.assign(date=''))
+        with self.assertRaises(ValueError):
+            self.store.append('GP', undated)
+        self.assertIsNone(self.store.read('GP'))
+        # A 'date' column is as good as a date index
+        columns = frame_to_columns(self.bars.reset_index())
+        self.assertEqual(len(columns['date']), len(self.bars))
+
+    def test_import_bars_command(self):
+        csv_dir = os.path.join(self.root, 'csv')
+        os.makedirs(csv_dir)
+        self.bars.iloc[20:].to_csv(os.path.join(csv_dir, 'gp.csv'))
+        self.bars.reset_index(drop=True).to_csv(os.path.join(csv_dir, 'bad.csv'), index=False)
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch('predictor.management.commands.import_bars.bar_store', self.store):
+            call_command('import_bars', csv_dir, stdout=out, stderr=err)
+            self.assertIn('BAD: skipped bad.csv', err.getvalue())
+            self.assertIn('Imported 1 of 2 files', out.getvalue())
+            self.assertStored('GP', self.bars.iloc[20:])
+
+            # A longer export of the same symbol reaches back before the stored bars
+            self.bars.to_csv(os.path.join(csv_dir, 'gp.csv'))
+            call_command('import_bars', csv_dir, stdout=out, stderr=err)
+        self.assertIn('GP: rewrote stored history', out.getvalue())
+        self.assertStored('GP', self.bars)
+
+
+class ConditionalGetTests(IsolatedDataMixin, TestCase):
+    """304s come from the views' own validators; there is no ConditionalGetMiddleware"""
+
+    def assertRevalidates(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        repeat = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat.content, b'')
+        self.assertEqual(repeat['ETag'], etag)
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+        return etag
+
+    def test_middleware_is_not_installed(self):
+        self.assertNotIn('django.middleware.http.ConditionalGetMiddleware', settings.MIDDLEWARE)
+
+    def test_stock_list(self):
+        self.assertRevalidates('/api/stocks/')
+
+    def test_prediction_from_the_cache_skips_the_model(self):
+        self.price_cache.set('GP', stub_bars('GP'), 'stub')
+        etag = self.client.get('/api/predict/', {'symbol': 'GP'})['ETag']
+        with mock.patch.object(views, 'predict_symbol') as predict:
+            response = self.client.get('/api/predict/', {'symbol': 'GP'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        predict.assert_not_called()
+
+    def test_prediction_versioned_after_the_fetch(self):
+        # A cold cache gives the decorator no ETag; the response's own one is checked instead
+        with mock.patch.object(views, 'get_stock_data', return_value=(stub_bars('GP'), 'stub')):
+            self.assertRevalidates('/api/predict/', symbol='GP')
+
+    def test_quotes(self):
+        self.price_cache.set('GP', stub_bars('GP'), 'stub')
+        etag = self.assertRevalidates('/api/quotes/')
+        since = self.client.get('/api/quotes/').json()['version']
+        self.assertRevalidates('/api/quotes/', since=since)
+
+        bars = stub_bars('ACI')
+        self.quote_hub.publish_bars('ACI', bars, self.price_cache.set('ACI', bars, 'stub'))
+        response = self.client.get('/api/quotes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class QuoteSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir, True)
+        self.price_cache = PriceCache(max_bytes=8 * 1024 * 1024, cache_dir=self.data_dir)
+        patcher = mock.patch('predictor.streaming.price_cache', self.price_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def hub(self, **options):
+        hub = QuoteHub(**options)
+        self.addCleanup(hub.stop_watching)
+        patcher = mock.patch.object(views, 'quote_hub', hub)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return hub
+
+    def publish(self, hub, symbol, stored_at, seed=0):
+        hub.publish_bars(symbol, stub_bars(symbol, seed=seed), stored_at)
+
+    def test_etag_reads_the_snapshot_without_scanning(self):
+        hub = self.hub(poll_interval=60)
+        request = RequestFactory().get('/api/quotes/')
+        with mock.patch.object(hub, '_scan', wraps=hub._scan) as scan:
+            etags = {views.quotes_etag(request) for _ in range(20)}
+        # Only the first call in the process scans, inline; the watch thread sleeps for a poll interval
+        self.assertEqual(scan.call_count, 1)
+        self.assertEqual(len(etags), 1)
+
+        self.publish(hub, 'GP', time.time())
+        self.assertNotIn(views.quotes_etag(request), etags)
+
+    def test_watch_thread_picks_up_other_processes_writes(self):
+        hub = self.hub(poll_interval=0.05)
+        hub.watch()
+        self.assertEqual(hub.current().quotes, {})
+
+        # Another worker writes the shared disk tier
+        PriceCache(max_bytes=1024 * 1024, cache_dir=self.data_dir).set('GP', stub_bars('GP'), 'stub')
+        deadline = time.monotonic() + 5
+        while 'GP' not in hub.current().quotes and time.monotonic() < deadline:
+            hub.watch()
+            time.sleep(0.02)
+        self.assertIn('GP', hub.current().quotes)
+
+    def test_watch_thread_stops_when_idle(self):
+        hub = self.hub(poll_interval=0.01, watch_idle=0.05)
+        hub.watch()
+        watcher = hub._watcher
+        watcher.join(timeout=5)
+        self.assertFalse(watcher.is_alive())
+        hub.watch()
+        self.assertIsNot(hub._watcher, watcher)
+
+    def test_since_returns_only_changed_symbols(self):
+        hub = self.hub(poll_interval=0, watch_idle=0)
+        self.publish(hub, 'GP', 1000.0)
+        self.publish(hub, 'ACI', 1000.5)
+        since = hub.current().version
+        self.publish(hub, 'BATBC', 1001.0)
+        self.publish(hub, 'GP', 1002.0, seed=1)
+
+        response = self.client.get('/api/quotes/', {'since': since})
+        body = response.json()
+        self.assertEqual(body['symbols'], ['BATBC', 'GP'])
+        self.assertEqual(body['version'], 1002 * 1_000_000)
+        self.assertEqual(self.client.get('/api/quotes/', {'since': body['version']}).json()['symbols'], [])
+        self.assertEqual(len(self.client.get('/api/quotes/').json()['symbols']), 3)
+
+    def test_version_never_goes_down(self):
+        hub = self.hub(poll_interval=0, watch_idle=0)
+        versions = []
+        for seed, stored_at in enumerate((1005.0, 1001.0, 1007.0, 1003.0, 1007.0, 1002.0)):
+            self.publish(hub, 'GP' if seed % 2 else 'ACI', stored_at, seed=seed)
+            versions.append(hub.current().version)
+        self.assertEqual(versions, sorted(versions))
+        self.assertEqual(versions[-1], 1007 * 1_000_000)
+
+
+class MetricsAccessTests(TestCase):
+    def test_only_staff_see_metrics(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.client.force_login(User.objects.create_user('trader'))
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('price_cache', response.json())
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token_grants_access(self):
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer guess').status_code, 403)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_no_token_configured(self):
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer None').status_code, 403)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+
+def dhaka(*args):
+    """Aware datetime in the project time zone (Asia/Dhaka)"""
+    return timezone.make_aware(datetime(*args))
+
+
+class PriceCacheTests(SimpleTestCase):
+    def cache(self, **options):
+        return PriceCache(**dict({'max_bytes': 8 * 1024 * 1024, 'intraday_ttl': 300, 'after_close_ttl': 12 * 3600}, **options))
+
+    def test_ttl_follows_the_session(self):
+        cache = self.cache()
+        cases = [
+            (dhaka(2025, 1, 5, 11, 0), 300),           # Sunday, trading
+            (dhaka(2025, 1, 5, 14, 29), 300),          # a minute before the close
+            (dhaka(2025, 1, 5, 23, 0), 11 * 3600),     # overnight: until Monday's open
+            (dhaka(2025, 1, 5, 15, 0), 12 * 3600),     # 19h to the open, capped
+            (dhaka(2025, 1, 6, 9, 58), 300),           # two minutes before the open: never below intraday
+            (dhaka(2025, 1, 9, 15, 0), 12 * 3600),     # Thursday close, weekend ahead
+            (dhaka(2025, 1, 10, 11, 0), 12 * 3600),    # Friday, no session
+        ]
+        for now, expected in cases:
+            with self.subTest(now=now), mock.patch('predictor.market_hours.local_now', return_value=now):
+                self.assertEqual(cache.ttl(), expected)
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = self.cache(intraday_ttl=0.05)
+        with mock.patch('predictor.market_hours.local_now', return_value=dhaka(2025, 1, 5, 11, 0)):
+            stored_at = cache.set('GP', stub_bars('GP'), 'stub')
+        self.assertAlmostEqual(cache.peek('GP').expires_at - stored_at, 0.05)
+        self.assertIsNotNone(cache.get('GP'))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('GP'))
+        self.assertIsNone(cache.version('GP'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_eviction_is_bounded_by_bytes(self):
+        frames = {symbol: stub_bars(symbol) for symbol in ('GP', 'ACI', 'BATBC')}
+        size = max(CacheEntry(df, 'stub', 0, 0).nbytes for df in frames.values())
+        cache = self.cache(max_bytes=int(size * 2.5))
+
+        cache.set('GP', frames['GP'], 'stub')
+        cache.set('ACI', frames['ACI'], 'stub')
+        cache.get('GP')  # ACI is now least recently used
+        cache.set('BATBC', frames['BATBC'], 'stub')
+
+        self.assertIsNone(cache.get('ACI'))
+        self.assertIsNotNone(cache.get('GP'))
+        self.assertIsNotNone(cache.get('BATBC'))
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['evictions']), (2, 1))
+        self.assertLessEqual(stats['bytes'], stats['max_bytes'])
+
+    def test_oversized_history_lives_on_disk_only(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = self.cache(max_bytes=1024, cache_dir=cache_dir)
+            cache.set('GP', stub_bars('GP'), 'stub')
+            self.assertEqual(cache.stats()['entries'], 0)
+            data, source = cache.get('GP')
+            self.assertEqual((len(data), source), (len(stub_bars('GP')), 'stub'))
+            self.assertEqual(cache.stats()['disk_hits'], 1)
+
+
+class DeltaRefreshTests(IsolatedDataMixin, SimpleTestCase):
+    """Refreshing a stored history downloads only the bars after the anchor"""
+
+    def setUp(self):
+        super().setUp()
+        self.upstream = stub_bars('GP')
+        self.calls = []
+
+    def fetch(self, symbol, since=None):
+        self.calls.append(since)
+        if since is None:
+            return self.upstream.copy(), 'stub'
+        return self.upstream[self.upstream.index >= pd.Timestamp(since)].copy(), 'stub'
+
+    def assertSameBars(self, data, expected):
+        self.assertTrue(data.index.equals(expected.index))
+        np.testing.assert_allclose(data['close'].to_numpy(), expected['close'].to_numpy())
+
+    def test_missing_bars_are_fetched_as_a_delta(self):
+        stored = self.upstream.iloc[:-3]
+        data, source = views.refresh_stock_data('GP', stored, fetch=self.fetch)
+        self.assertEqual(self.calls, [stored.index[-1].date()])
+        self.assertEqual(source, 'stub')
+        self.assertSameBars(data, self.upstream)
+
+    def test_revised_anchor_refetches_the_whole_window(self):
+        stored = self.upstream.iloc[:-3].copy()
+        stored.iloc[-1, stored.columns.get_loc('close')] *= 1.1
+        data, _ = views.refresh_stock_data('GP', stored, fetch=self.fetch)
+        self.assertEqual(self.calls, [stored.index[-1].date(), None])
+        self.assertSameBars(data, self.upstream)
+
+    def test_anchor_missing_upstream_refetches_the_whole_window(self):
+        stored = self.upstream.iloc[:-3]
+        anchor = stored.index[-1]
+        full = self.upstream
+        self.upstream = full.drop(anchor)
+        data, _ = views.refresh_stock_data('GP', stored, fetch=self.fetch)
+        self.assertEqual(self.calls, [anchor.date(), None])
+        self.assertSameBars(data, self.upstream)
+
+    def test_failed_upstream_keeps_the_stored_bars(self):
+        stored = self.upstream.iloc[:-3]
+        data, source = views.refresh_stock_data('GP', stored, fetch=lambda symbol, since=None: (None, None),
+                                                stale_source='cache')
+        self.assertIs(data, stored)
+        self.assertEqual(source, 'cache')
+
+    def test_update_stock_data_refreshes_the_cached_history(self):
+        self.price_cache.set('GP', self.upstream.iloc[:-3], 'stub')
+        data, _ = views.update_stock_data('GP', fetch=self.fetch)
+        self.assertEqual(len(self.calls), 1)
+        self.assertIsNotNone(self.calls[0])
+        self.assertSameBars(data, self.upstream)
+        self.assertSameBars(self.price_cache.peek('GP').data, self.upstream)
+        self.assertIn('GP', self.quote_hub.current().quotes)
+
+
+class IndicatorEngineTests(SimpleTestCase):
+    """The vectorized engine against the per-symbol pandas code it replaces"""
+
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        dates = pd.bdate_range('2024-01-01', periods=80)
+
+        def walk(n):
+            return pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.02, n))))
+
+        gappy = walk(80).set_axis(dates)
+        gappy.iloc[[3, 4, 30, 55]] = np.nan
+        self.closes = {
+            'FULL': walk(80).set_axis(dates),
+            'GAPPY': gappy,
+            'LATE': walk(45).set_axis(dates[-45:]),   # listed later, shorter history
+            'SHORT': walk(7).set_axis(dates[-7:]),    # too short for the model
+        }
+
+    def test_indicators_match_pandas_per_symbol(self):
+        engine = IndicatorEngine.from_series(self.closes)
+        for symbol, closes in self.closes.items():
+            prices = closes.dropna()
+            with self.subTest(symbol=symbol):
+                for window in SMA_WINDOWS:
+                    np.testing.assert_allclose(
+                        engine.series(symbol, engine.sma[window]).reindex(prices.index).to_numpy(),
+                        prices.rolling(window).mean().to_numpy())
+                for span in EMA_WINDOWS:
+                    np.testing.assert_allclose(
+                        engine.series(symbol, engine.ema[span]).reindex(prices.index).to_numpy(),
+                        prices.ewm(span=span, adjust=False).mean().to_numpy())
+                expected_std = prices.pct_change().std()
+                lookup = engine.lookup(symbol)
+                np.testing.assert_allclose(lookup['volatility'], expected_std)
+                self.assertEqual(lookup['close'], prices.iloc[-1])
+                self.assertEqual(lookup['n_bars'], len(prices))
+
+    def test_batch_predictions_match_single_symbol(self):
+        frames = {symbol: closes.to_frame('close') for symbol, closes in self.closes.items()}
+        batch = views.predict_prices_batch(frames, rngs={s: np.random.default_rng(i) for i, s in enumerate(frames)})
+        single_rngs = {s: np.random.default_rng(i) for i, s in enumerate(frames)}
+        for symbol, df in frames.items():
+            single = views.predict_price_simple_moving_average(df, rng=single_rngs[symbol])
+            with self.subTest(symbol=symbol):
+                if single is None:
+                    self.assertIsNone(batch[symbol])
+                    continue
+                self.assertEqual((batch[symbol]['confidence'], batch[symbol]['trend']),
+                                 (single['confidence'], single['trend']))
+                for key in ('current_price', 'volatility'):
+                    self.assertAlmostEqual(batch[symbol][key], single[key], places=9)
+                for horizon, value in single['predictions'].items():
+                    self.assertAlmostEqual(batch[symbol]['predictions'][horizon], value, places=6)
+        self.assertIsNone(batch['SHORT'])
+
+
+class PredictionSnapshotTests(IsolatedDataMixin, TestCase):
+    """predict_stock serves the newest snapshot and computes live only what it lacks"""
+
+    def snapshot(self, *symbols, keep=3):
+        def fetch_many(symbols, max_workers=None):
+            return {s: stub_bars(s) for s in symbols}, {s: 'stub' for s in symbols}, {}
+
+        with mock.patch('predictor.management.commands.snapshot_predictions.fetch_many', fetch_many):
+            call_command('snapshot_predictions', '--symbols', *symbols, '--keep', str(keep),
+                         stdout=io.StringIO(), stderr=io.StringIO())
+        return PredictionGeneration.objects.latest('id')
+
+    def predict(self, symbol):
+        with mock.patch.object(views, 'get_stock_data', return_value=(stub_bars(symbol), 'stub')) as fetch:
+            response = self.client.get('/api/predict/', {'symbol': symbol})
+        self.assertEqual(response.status_code, 200)
+        return response.json(), fetch.call_count
+
+    def test_snapshot_symbols_are_served_without_fetching(self):
+        generation = self.snapshot('GP', 'ACI')
+        self.assertEqual(generation.symbol_count, 2)
+        body, fetches = self.predict('GP')
+        self.assertEqual(fetches, 0)
+        self.assertEqual(body['snapshot_generation'], generation.id)
+        self.assertEqual(body['symbol'], 'GP')
+        self.assertIn('predictions', body)
+
+    def test_symbols_missing_from_the_snapshot_are_computed_live(self):
+        self.snapshot('GP')
+        body, fetches = self.predict('BATBC')
+        self.assertEqual(fetches, 1)
+        self.assertNotIn('snapshot_generation', body)
+        self.assertEqual(body['source'], 'stub')
+
+    def test_newest_completed_generation_wins(self):
+        self.snapshot('GP')
+        newer = self.snapshot('GP')
+        PredictionGeneration.objects.create()  # still running: not served
+        self.assertEqual(self.predict('GP')[0]['snapshot_generation'], newer.id)
+
+    def test_stale_snapshot_is_ignored(self):
+        generation = self.snapshot('GP')
+        PredictionGeneration.objects.filter(id=generation.id).update(
+            completed_at=timezone.now() - timedelta(seconds=settings.PREDICTION_SNAPSHOT_MAX_AGE + 60))
+        body, fetches = self.predict('GP')
+        self.assertEqual(fetches, 1)
+        self.assertNotIn('snapshot_generation', body)
+
+    def test_old_generations_are_pruned(self):
+        for _ in range(4):
+            self.snapshot('GP', keep=2)
+        self.assertEqual(PredictionGeneration.objects.count(), 2)
+        self.assertEqual(PredictionSnapshot.objects.count(), 2)
+
+
+class ForecastModelTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(forecasting, 'fitted_params', LRUMemo(max_entries=64))
+        self.fitted_params = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_registry(self):
+        self.assertEqual(available_models(), ['ar', 'holt', 'linear', 'sma'])
+        self.assertEqual(get_model('linear', lookback=5).lookback, 5)
+        with self.assertRaises(KeyError):
+            get_model('prophet')
+
+    def test_registered_model_is_served(self):
+        @register_model
+        class LastPriceModel(ForecastModel):
+            name = 'last'
+
+            def fit(self, closes):
+                return {'latest': forecasting.latest_prices(closes)}
+
+            def predict(self, params, horizons):
+                return np.repeat(params['latest'][:, None], len(horizons), axis=1)
+
+        self.addCleanup(forecasting._registry.pop, 'last')
+        self.assertIn('last', available_models())
+        closes = stub_bars('GP')['close']
+        result = forecast_symbols(get_model('last'), {'GP': closes})['GP']
+        self.assertEqual(result['model'], 'last')
+        self.assertEqual(set(result['predictions'].values()), {closes.iloc[-1]})
+
+        response = self.client.get('/api/predict/', {'symbol': 'GP', 'model': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('last', response.json()['models'])
+
+    def test_linear_trend_extends_a_straight_line(self):
+        closes = pd.Series(100 + 2.0 * np.arange(30))
+        result = forecast_symbols(get_model('linear'), {'LINE': closes})['LINE']
+        last = closes.iloc[-1]
+        self.assertEqual(result['trend'], 'up')
+        for label, days in forecasting.HORIZONS.items():
+            self.assertAlmostEqual(result['predictions'][label], last + 2 * days, places=6)
+
+    def test_flat_history_forecasts_flat(self):
+        closes = {'FLAT': pd.Series(np.full(40, 50.0))}
+        for name in available_models():
+            with self.subTest(model=name):
+                result = forecast_symbols(get_model(name), closes)['FLAT']
+                for value in result['predictions'].values():
+                    self.assertAlmostEqual(value, 50.0, places=6)
+
+    def test_short_history_has_no_forecast(self):
+        results = forecast_symbols(get_model('holt'), {'NEW': pd.Series([10.0] * 9), 'GP': stub_bars('GP')['close']})
+        self.assertIsNone(results['NEW'])
+        self.assertIsNotNone(results['GP'])
+
+    def test_batch_matches_one_symbol_at_a_time(self):
+        closes = {symbol: stub_bars(symbol)['close'] for symbol in ('GP', 'ACI')}
+        closes['LATE'] = closes['GP'].iloc[-15:] * 1.5  # shorter history, NaN-padded in the batch
+        for name in available_models():
+            with self.subTest(model=name):
+                batch = forecast_symbols(get_model(name), closes)
+                self.fitted_params._entries.clear()
+                for symbol, series in closes.items():
+                    alone = forecast_symbols(get_model(name), {symbol: series})[symbol]
+                    for label, value in alone['predictions'].items():
+                        self.assertAlmostEqual(batch[symbol]['predictions'][label], value, places=6)
+
+    def test_fitted_parameters_are_reused(self):
+        model = get_model('ar')
+        closes = {symbol: stub_bars(symbol)['close'] for symbol in ('GP', 'ACI')}
+        first = forecast_symbols(model, closes)
+        with mock.patch.object(model, 'fit', wraps=model.fit) as fit:
+            self.assertEqual(forecast_symbols(model, closes), first)
+            fit.assert_not_called()
+
+            changed = dict(closes, ACI=closes['ACI'] * 1.01)
+            forecast_symbols(model, changed)
+        self.assertEqual(fit.call_count, 1)
+        self.assertEqual(fit.call_args[0][0].shape[0], 1)  # only ACI was refitted
+
+
+class BacktestTests(SimpleTestCase):
+    def test_scores_of_a_hand_checked_series(self):
+        closes = np.array([10.0, 11.0, 10.0, 12.0])
+        steps = np.array([0, 1])
+        # Tomorrow's forecasts: 11 from 10 (right, exact) and 11 from 11 (flat, actual fell to 10)
+        forecasts = np.array([[11.0, 0, 0], [11.0, 0, 0]])
+        scores = score_forecasts(closes, steps, forecasts, np.array([65, 85]))
+        self.assertEqual((scores['week']['n'], scores['month']['n']), (0, 0))
+
+        tomorrow = summarize(scores)['tomorrow']
+        self.assertEqual(tomorrow['n'], 2)
+        self.assertAlmostEqual(tomorrow['mae'], 0.5)
+        self.assertAlmostEqual(tomorrow['mape'], (0 / 11 + 1 / 10) / 2)
+        self.assertAlmostEqual(tomorrow['hit_rate'], 0.5)
+        self.assertEqual(
+            [(row['confidence'], row['n'], row['hit_rate']) for row in tomorrow['calibration']],
+            [('60-69', 1, 1.0), ('80-89', 1, 0.0)],
+        )
+        self.assertAlmostEqual(tomorrow['calibration_error'], (abs(1 - 0.65) + abs(0 - 0.85)) / 2)
+        self.assertIsNone(summarize(scores)['week']['mae'])
+
+    def test_straight_line_is_forecast_exactly(self):
+        closes = 100 + 2.0 * np.arange(60)
+        steps, forecasts, _ = walk_forward(closes, model_name='linear', lookback=20)
+        self.assertEqual(steps[0], 9)
+        summary = summarize(score_forecasts(closes, steps, forecasts, np.full(len(steps), 80)))
+        for label, days in forecasting.HORIZONS.items():
+            self.assertEqual(summary[label]['n'], len(closes) - 9 - days)
+            self.assertAlmostEqual(summary[label]['mae'], 0, places=6)
+            self.assertEqual(summary[label]['hit_rate'], 1.0)
+
+    def test_walk_forward_sees_only_the_past(self):
+        closes = stub_bars('GP')['close'].to_numpy()
+        steps, forecasts, confidence = walk_forward(closes, model_name='holt', lookback=30)
+        model = get_model('holt')
+        for position, step in enumerate(steps[::7]):
+            index = position * 7
+            window = closes[max(0, step + 1 - 30):step + 1][None, :]
+            expected = model.predict(model.fit(window), list(forecasting.HORIZONS.values()))[0]
+            np.testing.assert_allclose(forecasts[index], np.maximum(expected, 0))
+        self.assertEqual(len(confidence), len(steps))
+
+    def test_windows_and_volatility(self):
+        closes = np.array([1.0, 2.0, 4.0, 3.0, 6.0])
+        windows = trailing_windows(closes, 3)
+        np.testing.assert_array_equal(windows[0], [np.nan, np.nan, 1.0])
+        np.testing.assert_array_equal(windows[4], [4.0, 3.0, 6.0])
+        expected = pd.Series(closes).pct_change().expanding().std().to_numpy()
+        np.testing.assert_allclose(expanding_volatility(closes), expected, equal_nan=True)
+
+    def test_per_symbol_scores_add_up(self):
+        series = {symbol: stub_bars(symbol)['close'].to_numpy() for symbol in ('GP', 'ACI')}
+        per_symbol, total = run_backtest(series, model_name='sma', workers=1, lookback=20)
+        merged = None
+        for scores, _, _ in per_symbol.values():
+            merged = merge_scores(merged, scores)
+        self.assertEqual(merged, total)
+        self.assertEqual(total['tomorrow']['n'], sum(scores['tomorrow']['n'] for scores, _, _ in per_symbol.values()))
+
+
+class DownsamplingTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        dates = pd.bdate_range('2020-01-01', periods=1500)
+        self.prices = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates)))), index=dates)
+
+    def test_lttb_keeps_endpoints_and_the_requested_count(self):
+        y = self.prices.to_numpy()
+        for threshold in (3, 10, 120, 999):
+            with self.subTest(threshold=threshold):
+                kept = lttb(np.arange(len(y)), y, threshold)
+                self.assertEqual(len(kept), threshold)
+                self.assertEqual((kept[0], kept[-1]), (0, len(y) - 1))
+                self.assertTrue(np.all(np.diff(kept) > 0))
+
+    def test_lttb_keeps_a_spike(self):
+        y = np.ones(500)
+        y[321] = 50
+        self.assertIn(321, lttb(np.arange(500), y, 20))
+
+    def test_short_series_are_not_thinned(self):
+        for threshold in (2, 50, 60):
+            np.testing.assert_array_equal(lttb(np.arange(50), np.ones(50), threshold), np.arange(50))
+
+    def test_line_series(self):
+        series = line_series(self.prices, 120)
+        self.assertEqual(len(series['data']), 120)
+        self.assertEqual(len(series['labels']), 120)
+        self.assertEqual(series['data'][0], round(self.prices.iloc[0], 2))
+        self.assertEqual(series['data'][-1], round(self.prices.iloc[-1], 2))
+        self.assertTrue(series['labels'][-1].endswith(str(self.prices.index[-1].year)))
+
+    def test_ohlc_series_picks_the_finest_interval_that_fits(self):
+        bars = pd.DataFrame({'close': self.prices, 'open': self.prices, 'high': self.prices * 1.01,
+                             'low': self.prices * 0.99})
+        for max_points, interval in ((2000, 'day'), (400, 'week'), (100, 'month'), (30, 'quarter')):
+            with self.subTest(interval=interval):
+                series = ohlc_series(bars, max_points)
+                self.assertEqual(series['interval'], interval)
+                self.assertLessEqual(len(series['data']), max_points)
+                self.assertEqual(series['ohlc']['close'][-1], round(self.prices.iloc[-1], 2))
+
+        # DSE weeks end on Thursday: Wed 1 - Thu 2 Jan, Fri 3 - Thu 9 Jan, Fri 10 - Tue 14 Jan
+        weekly = ohlc_series(bars.iloc[:10], 3)
+        self.assertEqual(weekly['interval'], 'week')
+        self.assertEqual(weekly['labels'], ['Jan 02', 'Jan 09', 'Jan 14'])
+        self.assertEqual(weekly['ohlc']['high'][1], round(bars['high'].iloc[2:7].max(), 2))
+        self.assertEqual(weekly['ohlc']['open'][1], round(bars['open'].iloc[2], 2))
+
+
+class ChartOptionTests(IsolatedDataMixin, TestCase):
+    def test_chart_options(self):
+        self.assertEqual(views.chart_options({}), ('1M', None, 'line'))
+        self.assertEqual(views.chart_options({'range': '1y', 'chart': 'ohlc', 'points': '200'}), ('1Y', 200, 'ohlc'))
+        self.assertEqual(views.chart_options({'points': '3'})[1], 10)
+        self.assertEqual(views.chart_options({'points': '100000'})[1], 1000)
+        self.assertEqual(views.chart_options({'points': ''})[1], None)
+
+    def test_invalid_options_are_rejected(self):
+        cases = [
+            ({'range': '2W'}, 'Unknown range: 2W'),
+            ({'chart': 'bar'}, 'Unknown chart style: bar'),
+            ({'points': 'many'}, 'points must be an integer between 10 and 1000'),
+            ({'points': '1.5'}, 'points must be an integer'),
+        ]
+        for params, message in cases:
+            with self.subTest(**params):
+                with self.assertRaisesMessage(ValueError, message):
+                    views.chart_options(params)
+                response = self.client.get('/api/predict/', dict(params, symbol='GP'))
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, response.json()['error'])
+
+    def test_long_range_comes_from_the_bar_store(self):
+        dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=700)
+        closes = 100 + np.arange(len(dates), dtype=float)
+        self.bar_store.write('GP', pd.DataFrame({'close': closes}, index=dates))
+        recent = pd.DataFrame({'close': closes[-30:]}, index=dates[-30:])
+
+        with mock.patch.object(views, 'get_stock_data', return_value=(recent, 'stub')):
+            response = self.client.get('/api/predict/', {'symbol': 'GP', 'range': 'max', 'points': '50'})
+        chart = response.json()['historical_data']
+        self.assertEqual(chart['range'], 'max')
+        self.assertEqual(len(chart['data']), 50)
+        self.assertEqual((chart['data'][0], chart['data'][-1]), (closes[0], closes[-1]))
+
+        with mock.patch.object(views, 'get_stock_data', return_value=(recent, 'stub')):
+            chart = self.client.get('/api/predict/', {'symbol': 'GP', 'range': '1Y', 'chart': 'ohlc'}).json()
+        history = chart['historical_data']
+        # A year of daily bars is over the default 120 points; weekly candles fit
+        self.assertEqual(history['interval'], 'week')
+        self.assertIn(len(history['data']), (52, 53, 54))
+        self.assertEqual(history['ohlc']['close'][-1], closes[-1])
+
+
+class QuoteStreamTests(IsolatedDataMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('predictor.streaming.price_cache', self.price_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bars = {seed: stub_bars('GP', seed=seed) for seed in range(5)}
+
+    def test_wsgi_gets_501(self):
+        response = self.client.get('/api/quotes/stream/')
+        self.assertEqual(response.status_code, 501)
+        self.assertIn('/api/quotes/', response.json()['error'])
+
+    def test_asgi_streams_events(self):
+        self.quote_hub.publish_bars('GP', self.bars[0], 1000.0)
+
+        async def first_events():
+            response = await AsyncClient().get('/api/quotes/stream/', {'symbols': 'gp'})
+            chunks = []
+            async for chunk in response.streaming_content:
+                chunks.append(chunk.decode())
+                if len(chunks) == 2:
+                    break
+            return response, chunks
+
+        response, chunks = asyncio.run(first_events())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(chunks[0], 'retry: 3000\n\n')
+        self.assertTrue(chunks[1].startswith('event: quotes\n'))
+        self.assertEqual(json.loads(chunks[1].split('data: ', 1)[1])[0]['symbol'], 'GP')
+
+    def test_too_many_symbols(self):
+        symbols = ','.join(f"S{i}" for i in range(101))
+        response = asyncio.run(AsyncClient().get('/api/quotes/stream/', {'symbols': symbols}))
+        self.assertEqual(response.status_code, 400)
+
+    def test_slow_client_gets_only_the_newest_quote(self):
+        async def scenario():
+            subscription = self.quote_hub.subscribe(['GP'])
+            for seed in range(5):
+                self.quote_hub.publish_bars('GP', self.bars[seed], 1000.0 + seed)
+            self.quote_hub.publish_bars('ACI', stub_bars('ACI'), 1010.0)  # not subscribed
+            batch = await self.quote_hub.next_batch(subscription, timeout=1)
+            self.quote_hub.unsubscribe(subscription)
+            return subscription, batch
+
+        subscription, batch = asyncio.run(scenario())
+        self.assertEqual([quote['symbol'] for quote in batch], ['GP'])
+        self.assertEqual(batch[0]['updated'], 1004.0)
+        self.assertEqual(subscription.conflated, 4)
+
+    def test_stalled_client_is_dropped(self):
+        hub = QuoteHub(max_stall=0.01, poll_interval=0)
+
+        async def scenario():
+            subscription = hub.subscribe(['GP'])
+            hub.publish_bars('GP', self.bars[0], 1000.0)
+            await asyncio.sleep(0.05)
+            hub.publish_bars('GP', self.bars[1], 1001.0)
+            return await hub.next_batch(subscription, timeout=1)
+
+        self.assertIsNone(asyncio.run(scenario()))
+        self.assertEqual(hub.stats()['dropped_slow'], 1)
+
+    def test_publish_from_another_thread_wakes_the_stream(self):
+        async def scenario():
+            subscription = self.quote_hub.subscribe(None)
+            publisher = threading.Timer(0.05, self.quote_hub.publish_bars, ('GP', self.bars[0], 1000.0))
+            publisher.start()
+            batch = await self.quote_hub.next_batch(subscription, timeout=5)
+            self.quote_hub.unsubscribe(subscription)
+            return batch
+
+        started = time.monotonic()
+        batch = asyncio.run(scenario())
+        self.assertEqual([quote['symbol'] for quote in batch], ['GP'])
+        self.assertLess(time.monotonic() - started, 2)
+
+
+class EquitySnapshotTests(IsolatedDataMixin, TestCase):
+    """The daily snapshot from live holdings agrees with a replay of the orders"""
+
+    def setUp(self):
+        super().setUp()
+        today = timezone.localdate()
+        self.days = trading_days(today - timedelta(days=20), today)
+        index = pd.DatetimeIndex([pd.Timestamp(day) for day in self.days])
+        self.closes = {'GP': 310 + np.arange(len(index), dtype=float), 'ACI': 190 - np.arange(len(index), dtype=float)}
+        for symbol, closes in self.closes.items():
+            self.bar_store.write(symbol, pd.DataFrame({'close': closes}, index=index))
+
+        self.trader = User.objects.create_user('trader')
+        self.idle = User.objects.create_user('idle')
+        for user in (self.trader, self.idle):
+            TradingAccount.get_or_create_account(user)
+        for day, (symbol, order_type, quantity, price) in zip(self.days[-6::2], (
+                ('GP', 'BUY', 10, '300'), ('ACI', 'BUY', 5, '200'), ('GP', 'SELL', 4, '320'))):
+            order, _, _ = execute_order(self.trader, symbol, order_type, quantity, Decimal(price))
+            placed = timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=11))
+            StockOrder.objects.filter(id=order.id).update(timestamp=placed)
+        execute_order(self.trader, 'NOBARS', 'BUY', 2, Decimal('50'))
+        StockOrder.objects.filter(symbol='NOBARS').update(
+            timestamp=timezone.make_aware(datetime.combine(self.days[-2], datetime.min.time()).replace(hour=12)))
+
+    def rows(self, user, day):
+        return EquitySnapshot.objects.filter(user=user, date=day).values(*SNAPSHOT_FIELDS).get()
+
+    def test_snapshot_values_holdings_at_the_close(self):
+        day = self.days[-1]
+        self.assertEqual(snapshot_equity(day), 2)
+        row = self.rows(self.trader, day)
+        cash = STARTING_BALANCE - 3000 - 1000 + 1280 - 100
+        value = Decimal(str(6 * self.closes['GP'][-1] + 5 * self.closes['ACI'][-1])) + 100  # NOBARS at cost
+        self.assertEqual(row['cash'], cash)
+        self.assertEqual(row['cost_basis'], Decimal('2900.00'))
+        self.assertEqual(row['holdings_value'], value)
+        self.assertEqual(row['equity'], cash + value)
+        self.assertEqual(row['realized_pnl'], Decimal('80.00'))
+        self.assertEqual(row['unrealized_pnl'], value - Decimal('2900'))
+        self.assertEqual(self.rows(self.idle, day)['equity'], STARTING_BALANCE)
+
+    def test_backfill_matches_the_snapshot(self):
+        day = self.days[-1]
+        snapshot_equity(day)
+        snapshot = self.rows(self.trader, day)
+
+        written = backfill_equity(end=day)
+        self.assertEqual(written[self.trader.pk], 6)  # first order through ``day``
+        self.assertEqual(written[self.idle.pk], 0)
+        self.assertEqual(self.rows(self.trader, day), snapshot)
+        self.assertFalse(EquitySnapshot.objects.filter(user=self.trader, date__lt=self.days[-6]).exists())
+
+        # Between orders: only the first buy, valued at that day's GP close
+        between = self.rows(self.trader, self.days[-5])
+        self.assertEqual(between['holdings_value'], Decimal(str(10 * self.closes['GP'][-5])))
+
+    def test_backfill_replays_archived_orders(self):
+        backfill_equity(end=self.days[-1])
+        before = list(EquitySnapshot.objects.filter(user=self.trader).order_by('date').values(*SNAPSHOT_FIELDS))
+        archive_orders(days=0)
+        self.assertEqual(StockOrder.objects.filter(user=self.trader).count(), 0)
+        EquitySnapshot.objects.all().delete()
+        backfill_equity(end=self.days[-1])
+        after = list(EquitySnapshot.objects.filter(user=self.trader).order_by('date').values(*SNAPSHOT_FIELDS))
+        self.assertEqual(after, before)
+
+
+class ArchiveOrdersTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('archivist')
+        now = timezone.now()
+        for i in range(30):
+            order = StockOrder.objects.create(
+                user=self.user, symbol=('GP', 'ACI', 'BATBC')[i % 3], order_type='BUY', quantity=i + 1,
+                price=Decimal('10.50'), total_amount=Decimal('10.50') * (i + 1),
+            )
+            # The first 20 are a year and a half old
+            age = timedelta(days=550 - i) if i < 20 else timedelta(days=30 - i)
+            StockOrder.objects.filter(id=order.id).update(timestamp=now - age)
+        self.rows = {row['id']: row for row in StockOrder.objects.values(*ORDER_FIELDS)}
+        self.old_ids = sorted(StockOrder.objects.filter(timestamp__lt=now - timedelta(days=365)).values_list('id', flat=True))
+
+    def test_archived_rows_keep_their_ids_and_fields(self):
+        self.assertEqual(archive_orders(days=365, batch_size=7), 20)
+        archived = {row['id']: row for row in ArchivedStockOrder.objects.values(*ORDER_FIELDS)}
+        self.assertEqual(sorted(archived), self.old_ids)
+        for order_id, row in archived.items():
+            self.assertEqual(row, self.rows[order_id])
+        self.assertEqual(StockOrder.objects.count(), 10)
+        self.assertFalse(StockOrder.objects.filter(id__in=self.old_ids).exists())
+        self.assertEqual(order_count(self.user), 30)
+
+    def test_batches_can_be_capped_and_resumed(self):
+        self.assertEqual(archive_orders(days=365, batch_size=5, max_batches=2), 10)
+        self.assertEqual(ArchivedStockOrder.objects.count(), 10)
+        self.assertEqual(archive_orders(days=365, batch_size=5), 10)
+        self.assertEqual(archive_orders(days=365, batch_size=5), 0)
+
+    def test_rerun_after_an_interrupted_batch(self):
+        # The archive copy was written but the hot row survived
+        ArchivedStockOrder.objects.create(**self.rows[self.old_ids[0]])
+        self.assertEqual(archive_orders(days=365), 20)
+        self.assertEqual(ArchivedStockOrder.objects.count(), 20)
+        self.assertEqual(StockOrder.objects.count(), 10)
+
+    def test_history_still_shows_archived_orders(self):
+        archive_orders(days=365)
+        self.client.force_login(self.user)
+        live = self.client.get('/api/orders/', {'limit': 100}).json()['orders']
+        everything = self.client.get('/api/orders/', {'limit': 100, 'archived': 1}).json()['orders']
+        self.assertEqual(len(live), 10)
+        self.assertEqual(sorted(order['id'] for order in everything), sorted(self.rows))
+        self.assertEqual([order['id'] for order in everything[:10]], [order['id'] for order in live])
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('archive_orders', '--days', '365', '--dry-run', stdout=out)
+        self.assertIn('20 orders due', out.getvalue())
+        self.assertEqual(ArchivedStockOrder.objects.count(), 0)
+        call_command('archive_orders', '--days', '365', '--batch-size', '6', stdout=out)
+        self.assertIn('Archived 20 orders', out.getvalue())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.other = User.objects.create_user('other')
+        self.staff = User.objects.create_user('auditor', is_staff=True)
+        for user in (self.owner, self.other):
+            TradingAccount.get_or_create_account(user)
+        for i in range(25):
+            execute_order(self.owner, ('GP', 'ACI')[i % 2], 'BUY', 1, Decimal('10'))
+        execute_order(self.other, 'BATBC', 'BUY', 3, Decimal('20'))
+        # Some of the owner's orders are in the archive; exports include them
+        StockOrder.objects.filter(user=self.owner, id__lte=StockOrder.objects.order_by('id')[9].id).update(
+            timestamp=timezone.now() - timedelta(days=400))
+        archive_orders(days=365)
+        self.owner_ids = sorted(
+            list(StockOrder.objects.filter(user=self.owner).values_list('id', flat=True))
+            + list(ArchivedStockOrder.objects.filter(user=self.owner).values_list('id', flat=True)))
+
+    def export(self, as_user=None, **params):
+        self.client.force_login(as_user or self.owner)
+        return self.client.get('/api/export/', params)
+
+    def test_csv_streams_every_order(self):
+        response = self.export(format='csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('owner-orders.csv', response['Content-Disposition'])
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(tuple(rows[0]), EXPORT_COLUMNS['orders'])
+        self.assertEqual(sorted(int(row[0]) for row in rows[1:]), self.owner_ids)
+        self.assertEqual(ArchivedStockOrder.objects.filter(user=self.owner).count(), 10)
+
+    def test_jsonl_and_gzip(self):
+        plain = b''.join(self.export(format='jsonl').streaming_content)
+        records = [json.loads(line) for line in plain.decode().splitlines()]
+        self.assertEqual(sorted(record['id'] for record in records), self.owner_ids)
+        self.assertEqual(records[0]['price'], '10.00')
+        stamps = [record['timestamp'] for record in records]
+        self.assertEqual(stamps, sorted(stamps))
+
+        response = self.export(format='jsonl', gzip=1)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+    def test_rows_are_read_lazily_and_sent_in_blocks(self):
+        with self.assertNumQueries(0):
+            stream = export_stream('orders', 'csv', user_id=self.owner.pk)
+        self.assertGreater(len(b''.join(stream).splitlines()), 25)
+
+        lines = encode_rows(('n',), ((i,) for i in range(1000)), 'csv')
+        chunks = list(blocks(lines, size=512))
+        self.assertGreater(len(chunks), 5)
+        self.assertTrue(all(len(chunk) >= 512 for chunk in chunks[:-1]))
+        self.assertEqual(b''.join(chunks).decode().split(), ['n'] + [str(i) for i in range(1000)])
+
+    def test_holdings(self):
+        rows = b''.join(self.export(dataset='holdings', format='csv').streaming_content).decode().splitlines()
+        self.assertEqual([row.split(',')[1] for row in rows[1:]], ['ACI', 'GP'])
+
+    def test_other_accounts_are_staff_only(self):
+        self.assertEqual(self.export(user='other').status_code, 403)
+        self.assertEqual(self.export(user=self.owner.username).status_code, 200)
+
+        response = self.export(self.staff, user='other', format='jsonl')
+        self.assertEqual(response.status_code, 200)
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([record['symbol'] for record in records], ['BATBC'])
+        self.assertEqual(self.export(self.staff, user='nobody').status_code, 404)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get('/api/export/').status_code, 401)
+        self.assertEqual(self.export(format='xlsx').status_code, 400)
+        self.assertEqual(self.export(dataset='passwords').status_code, 400)
@@ -0,0 +1,22 @@
+"""
+The symbol universe served by the app and walked by the batch commands.
+"""
+
+# Common Bangladeshi stock symbols
+BANGLADESHI_STOCKS = [
+    {'symbol': 'GP', 'name': 'Grameenphone Ltd'},
+    {'symbol': 'SQUARE', 'name': 'Square Pharmaceuticals Ltd'},
+    {'symbol': 'BEXIMCO', 'name': 'Beximco Pharmaceuticals Ltd'},
+    {'symbol': 'RENATA', 'name': 'Renata Limited'},
+    {'symbol': 'ACI', 'name': 'ACI Limited'},
+    {'symbol': 'BRACBANK', 'name': 'BRAC Bank Limited'},
+    {'symbol': 'EBL', 'name': 'Eastern Bank Limited'},
+    {'symbol': 'DUTCHBANGLA', 'name': 'Dutch-Bangla Bank Limited'},
+    {'symbol': 'BANKASIA', 'name': 'Bank Asia Limited'},
+    {'symbol': 'IFIC', 'name': 'IFIC Bank Limited'},
+]
+
+
+def universe_symbols():
+    """Ticker symbols of every listed stock"""
+    return [stock['symbol'] for stock in BANGLADESHI_STOCKS]
@@ -3,8 +3,16 @@ from . import views
 
 urlpatterns = [
     path('predict/', views.predict_stock, name='predict_stock'),
+    path('predict/batch/', views.predict_stock_batch, name='predict_stock_batch'),
     path('stocks/', views.get_stock_list, name='get_stock_list'),
     path('contact/', views.contact_form, name='contact_form'),
     path('trading-data/', views.trading_data, name='trading_data'),
+    path('orders/', views.order_history_view, name='order_history'),
+    path('export/', views.export_data, name='export_data'),
+    path('equity/', views.equity_history, name='equity_history'),
+    path('orders/bulk/', views.bulk_orders, name='bulk_orders'),
+    path('quotes/', views.quotes, name='quotes'),
+    path('quotes/stream/', views.quote_stream, name='quote_stream'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
 
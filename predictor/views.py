@@ -1,121 +1,215 @@
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
+from django.views.decorators.cache import cache_control
+from django.core.handlers.asgi import ASGIRequest
 from django.core.mail import send_mail
 from django.conf import settings
+from django.utils.dateparse import parse_date
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib import messages
-from .models import UserProfile
+from django.db import DatabaseError
+from .models import UserProfile, PredictionSnapshot
+from .cache import price_cache, LRUMemo
+from .barstore import bar_store
+from .bars import has_bar_dates, last_bar_date, series_digest, data_version, anchor_bar_date, is_revised, merge_bars
+from .market_hours import last_market_close, local_now
+from .singleflight import SingleFlight
+from .sources import HISTORY_DAYS, source_manager
+from .clients import upstream_clients
+from .indicators import IndicatorEngine
+from .indicator_state import IndicatorState
+from .universe import BANGLADESHI_STOCKS
+from .ingest import ingest_status
+from .accounts import account_snapshot, account_version
+from .equity import SNAPSHOT_FIELDS, equity_curve
+from .export import export_content_type, export_filename, export_stream
+from .orders import (
+    HISTORY_MAX_PAGE_SIZE, HISTORY_PAGE_SIZE, ORDER_TYPES, OrderRejected,
+    execute_order, execute_orders, order_dict, order_history, parse_order,
+)
+from .streaming import quote_hub, sse_event
+from .forecasting import available_models, confidence_score, forecast_symbols, get_model
+from .conditional import cache_private, cache_public, conditional_response, make_etag, market_data_max_age
+from .charts import CHART_RANGES, CHART_STYLES, DEFAULT_CHART_RANGE, line_series, normalize_range, ohlc_series, range_start
 import json
+import hashlib
+import hmac
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from decimal import Decimal
+from datetime import timedelta
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Try to import bdshare and stocksurferbd
-try:
-    import bdshare as bd
-    BD_SHARE_AVAILABLE = True
-except ImportError:
-    BD_SHARE_AVAILABLE = False
-    logger.warning("bdshare library not available. Install it using: pip install bdshare")
+# Name of the moving-average predictor in the forecasting model registry
+DEFAULT_MODEL = 'sma'
 
-try:
-    from stocksurferbd import StockSurferBD
-    STOCK_SURFER_AVAILABLE = True
-except ImportError:
-    STOCK_SURFER_AVAILABLE = False
-    logger.warning("stocksurferbd library not available. Install it using: pip install stocksurferbd")
+# Bump when the prediction math changes so memoized results and seeds roll over
+PREDICTION_MODEL_VERSION = 'sma-1'
 
+prediction_memo = LRUMemo(max_entries=getattr(settings, 'PREDICTION_MEMO_SIZE', 4096))
 
-def get_stock_data_bdshare(symbol):
-    """Fetch stock data using bdshare library"""
-    try:
-        if not BD_SHARE_AVAILABLE:
-            return None
-
-        # Get today's data
-        today = datetime.now()
-        end_date = today.strftime('%Y-%m-%d')
-        start_date = (today - timedelta(days=60)).strftime('%Y-%m-%d')
-
-        # Fetch historical data - bdshare API: get_hist_data(start, end, code)
-        df = bd.get_hist_data(start=start_date, end=end_date, code=symbol)
-
-        if df is not None and not df.empty:
-            # Convert price columns to numeric to avoid type errors
-            price_columns = ['open', 'high', 'low', 'close', 'volume']
-            for col in price_columns:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-            return df
-        return None
-    except Exception as e:
-        logger.error(f"Error fetching data from bdshare: {str(e)}")
-        return None
+# Waiting on another worker's fetch is bounded by the same deadline as the fetch itself
+stock_fetches = SingleFlight(
+    lock_dir=getattr(settings, 'PRICE_FETCH_LOCK_DIR', None),
+    lock_timeout=getattr(settings, 'DATA_SOURCE_DEADLINE', 10.0),
+)
 
+_fetch_counts = Counter()
+_fetch_counts_lock = threading.Lock()
 
-def get_stock_data_stocksurfer(symbol):
-    """Fetch stock data using stocksurferbd library"""
-    try:
-        if not STOCK_SURFER_AVAILABLE:
-            return None
-
-        # Use StockSurferBD class from stocksurferbd
-        stock_data = StockSurferBD()
-        # Get historical data (last 60 days)
-        data = stock_data.get_hist_data(symbol, days=60)
-
-        if data is not None and not data.empty:
-            # Convert price columns to numeric to avoid type errors
-            price_columns = ['open', 'high', 'low', 'close', 'volume']
-            for col in price_columns:
-                if col in data.columns:
-                    data[col] = pd.to_numeric(data[col], errors='coerce')
-            return data
-        return None
-    except Exception as e:
-        logger.error(f"Error fetching data from stocksurferbd: {str(e)}")
-        return None
+
+def _count_fetch(**increments):
+    with _fetch_counts_lock:
+        _fetch_counts.update(increments)
+
+
+def fetch_stats():
+    """Full vs delta download counters"""
+    with _fetch_counts_lock:
+        return dict(_fetch_counts)
 
 
 def get_stock_data(symbol):
-    """Try to get stock data from available sources"""
-    # Try bdshare first
-    data = get_stock_data_bdshare(symbol)
+    """Get stock data from the price cache, falling back to the upstream sources"""
+    cached = price_cache.get(symbol)
+    if cached is not None:
+        return cached
+
+    # Concurrent misses for the same symbol share a single upstream fetch
+    (data, source), shared = stock_fetches.do(
+        symbol, lambda: _load_stock_data(symbol), fallback=lambda: _stored_stock_data(symbol),
+    )
+    if shared and data is not None:
+        data = data.copy()
+    return data, source
+
+
+def _load_stock_data(symbol):
+    """Refresh a symbol's history from upstream and store it in the cache"""
+    # Another worker may have filled the shared cache while we waited for the lock.
+    # peek, not get: the miss that brought us here is already counted.
+    entry = price_cache.peek(symbol)
+    if entry is not None and entry.is_fresh():
+        return entry.data, entry.source
+
+    return update_stock_data(symbol)
+
+
+def _stored_stock_data(symbol):
+    """
+    Whatever the cache holds for a symbol, expired or not, while another
+    worker is still fetching it; with nothing stored, fetch without the lock.
+    """
+    entry = price_cache.peek(symbol)
+    if entry is None:
+        return _load_stock_data(symbol)
+    if not entry.is_fresh():
+        _count_fetch(stale_served=1)
+    return entry.data, entry.source
+
+
+def update_stock_data(symbol, fetch=None, serve_stale=True):
+    """
+    Bring a symbol's stored history up to date (a delta when possible) and
+    write it to the price cache and bar store. ``fetch`` replaces
+    fetch_stock_data, e.g. with the ingestion worker's rate-limited sources.
+    If upstream fails the stored bars are returned, or (None, None) without
+    ``serve_stale``.
+    """
+    stale = price_cache.peek(symbol)
+    if stale is not None:
+        data, source = refresh_stock_data(symbol, stale.data, fetch=fetch, stale_source=stale.source)
+        if data is stale.data:
+            # Upstream failed: serve the old bars but leave the entry expired so the next request retries
+            return (data, source) if serve_stale else (None, None)
+    else:
+        data, source = fetch_full_stock_data(symbol, fetch=fetch)
     if data is not None:
-        return data, 'bdshare'
-    
-    # Try stocksurferbd
-    data = get_stock_data_stocksurfer(symbol)
+        stored_at = price_cache.set(symbol, data, source)
+        archive_bars(symbol, data)
+        quote_hub.publish_bars(symbol, data, stored_at)
+    return data, source
+
+
+def archive_bars(symbol, data):
+    """
+    Append downloaded bars to the on-disk bar store, which keeps the full
+    history. Only completed sessions are archived: the bar of a session still
+    trading changes on every refresh and would otherwise count as a revision
+    that rewrites the whole stored history.
+    """
+    if not has_bar_dates(data):
+        return
+    completed = data[data.index.normalize() <= pd.Timestamp(last_market_close().date())]
+    if completed.empty:
+        return
+    try:
+        bar_store.append(symbol, completed)
+    except Exception as e:
+        logger.warning(f"Could not archive bars for {symbol}: {str(e)}")
+
+
+def fetch_full_stock_data(symbol, fetch=None):
+    """Download the whole history window for a symbol"""
+    data, source = (fetch or fetch_stock_data)(symbol)
     if data is not None:
-        return data, 'stocksurferbd'
-    
-    # Return None if both fail
-    return None, None
+        _count_fetch(full=1, bars_downloaded=len(data))
+    return data, source
 
 
-def calculate_sma(data, window):
-    """Calculate Simple Moving Average"""
-    return data.rolling(window=window).mean()
+def refresh_stock_data(symbol, existing, fetch=None, stale_source=None):
+    """
+    Bring a stored history up to date by downloading only the missing bars.
 
+    The delta starts at the last bar of a finished session (the anchor) so the
+    overlap can be compared with what we stored. If the anchor is missing or
+    its prices changed upstream, the whole window is downloaded again. When
+    upstream returns nothing, ``existing`` itself is returned (with
+    ``stale_source``) rather than nothing.
+    """
+    today = local_now().date()
+    window_start = today - timedelta(days=HISTORY_DAYS)
+    anchor = anchor_bar_date(existing, today)
+    if anchor is None or anchor < window_start:
+        return _or_stale(symbol, fetch_full_stock_data(symbol, fetch=fetch), existing, stale_source)
 
-def calculate_ema(data, window):
-    """Calculate Exponential Moving Average"""
-    return data.ewm(span=window, adjust=False).mean()
+    delta, source = (fetch or fetch_stock_data)(symbol, since=anchor)
+    if delta is None:
+        return _or_stale(symbol, (None, None), existing, stale_source)
+    if not has_bar_dates(delta) or is_revised(existing, delta, anchor):
+        logger.info(f"Gap or revision in {symbol} history at {anchor}; downloading full window")
+        _count_fetch(revisions=1)
+        return _or_stale(symbol, fetch_full_stock_data(symbol, fetch=fetch), existing, stale_source)
 
+    _count_fetch(delta=1, bars_downloaded=len(delta))
+    kept = existing[existing.index <= pd.Timestamp(anchor)]
+    return merge_bars(kept, delta, keep_since=window_start), source
 
-def predict_price_simple_moving_average(df, days_ahead=30):
-    """Simple prediction using moving averages"""
-    if df is None or df.empty or len(df) < 10:
-        return None
 
-    # Use closing price and ensure it's numeric
+def _or_stale(symbol, result, existing, stale_source):
+    """``result`` unless upstream came back empty, in which case the stored bars"""
+    if result[0] is not None:
+        return result
+    logger.warning(f"Upstream refresh of {symbol} failed; serving stored bars")
+    _count_fetch(stale_served=1)
+    return existing, stale_source
+
+
+def fetch_stock_data(symbol, since=None):
+    """Get stock data from the fastest healthy source, optionally only bars from ``since`` on"""
+    return source_manager.fetch(symbol, since=since)
+
+
+def get_close_prices(df):
+    """Closing prices of a history as a numeric Series without NaNs"""
     if 'close' in df.columns:
         prices = pd.to_numeric(df['close'], errors='coerce')
     elif 'Close' in df.columns:
@@ -124,9 +218,33 @@ def predict_price_simple_moving_average(df, days_ahead=30):
         prices = pd.to_numeric(df['price'], errors='coerce')
     else:
         prices = pd.to_numeric(df.iloc[:, -1], errors='coerce')  # Use last column as price
+    return prices.dropna()
+
+
+def calculate_sma(data, window):
+    """Calculate Simple Moving Average"""
+    return data.rolling(window=window).mean()
+
+
+def calculate_ema(data, window):
+    """Calculate Exponential Moving Average"""
+    return data.ewm(span=window, adjust=False).mean()
+
 
-    # Drop any NaN values that might have been introduced
-    prices = prices.dropna()
+def predict_price_simple_moving_average(df, days_ahead=30, rng=None):
+    """
+    Simple prediction using moving averages (``df`` may also be an IndicatorState).
+
+    Pass a seeded ``rng`` (numpy Generator) to make the noise reproducible.
+    """
+    if isinstance(df, IndicatorState):
+        return predict_price_from_state(df, rng=rng)
+
+    if df is None or df.empty or len(df) < 10:
+        return None
+
+    # Use closing price, dropping any NaN values that might have been introduced
+    prices = get_close_prices(df)
     if len(prices) < 10:
         return None
     
@@ -148,26 +266,42 @@ def predict_price_simple_moving_average(df, days_ahead=30):
     returns = prices.pct_change().dropna()
     volatility = returns.std() if len(returns) > 0 else 0.02
     
+    return _moving_average_forecast(latest_price, trend, volatility, len(df), rng=rng)
+
+
+def predict_price_from_state(state, rng=None):
+    """Same prediction as predict_price_simple_moving_average, from streaming indicator state"""
+    if state.n_rows < 10 or state.n_prices < 10:
+        return None
+
+    latest_price = state.last_price
+    smas = [state.sma[window].value for window in (5, 10, 20)]
+    smas = [latest_price if np.isnan(sma) else sma for sma in smas]
+    trend = sum(smas) / 3 - latest_price
+    return _moving_average_forecast(latest_price, trend, state.volatility, state.n_rows, rng=rng)
+
+
+def _moving_average_forecast(latest_price, trend, volatility, n_rows, rng=None):
+    """Forecasts, confidence and trend from the latest price, SMA trend and volatility"""
+    normal = rng.normal if rng is not None else np.random.normal
+
     # Predict future prices
     predictions = {}
     
     # Tomorrow (1 day)
-    tomorrow_pred = latest_price + trend * 0.1 + np.random.normal(0, volatility * latest_price * 0.5)
+    tomorrow_pred = latest_price + trend * 0.1 + normal(0, volatility * latest_price * 0.5)
     predictions['tomorrow'] = max(0, float(tomorrow_pred))
     
     # Next week (7 days)
-    week_pred = latest_price + trend * 0.7 + np.random.normal(0, volatility * latest_price * 1.5)
+    week_pred = latest_price + trend * 0.7 + normal(0, volatility * latest_price * 1.5)
     predictions['week'] = max(0, float(week_pred))
     
     # Next month (30 days)
-    month_pred = latest_price + trend * 3 + np.random.normal(0, volatility * latest_price * 3)
+    month_pred = latest_price + trend * 3 + normal(0, volatility * latest_price * 3)
     predictions['month'] = max(0, float(month_pred))
     
     # Calculate confidence based on data quality and volatility
-    data_quality = min(100, len(df) * 2)  # More data = higher quality
-    volatility_factor = max(0, 100 - (volatility * 1000))
-    confidence = int((data_quality + volatility_factor) / 2)
-    confidence = max(60, min(95, confidence))  # Clamp between 60-95%
+    confidence = int(confidence_score(n_rows, volatility))
     
     return {
         'predictions': predictions,
@@ -178,58 +312,371 @@ def predict_price_simple_moving_average(df, days_ahead=30):
     }
 
 
-def generate_historical_chart_data(df, current_price):
-    """Generate historical data for chart"""
-    if df is None or df.empty:
-        return {'labels': [], 'data': []}
+def predict_prices_batch(frames, rngs=None):
+    """
+    Run predict_price_simple_moving_average over many histories at once.
 
-    # Get price column and convert to numeric
-    if 'close' in df.columns:
-        prices = pd.to_numeric(df['close'], errors='coerce')
-    elif 'Close' in df.columns:
-        prices = pd.to_numeric(df['Close'], errors='coerce')
-    elif 'price' in df.columns:
-        prices = pd.to_numeric(df['price'], errors='coerce')
+    ``frames`` maps symbol -> DataFrame. Moving averages and volatility come
+    from one IndicatorEngine pass over all symbols, and the noise draws are
+    vectorized too. With ``rngs`` (symbol -> seeded Generator) each symbol
+    gets the same draws the single-symbol function would make. Returns
+    symbol -> result dict (same shape as the single-symbol function) or None
+    when a history is too short.
+    """
+    results = {}
+    closes, row_counts = {}, {}
+    for symbol, df in frames.items():
+        results[symbol] = None
+        if df is None or df.empty or len(df) < 10:
+            continue
+        prices = get_close_prices(df)
+        if len(prices) < 10:
+            continue
+        closes[symbol] = prices
+        row_counts[symbol] = len(df)
+
+    if not closes:
+        return results
+
+    engine = IndicatorEngine.from_series(closes)
+    latest_price = engine.latest_close
+
+    # Fall back to the latest price where a history is shorter than the window
+    smas = [np.where(np.isnan(engine.latest(engine.sma[w])), latest_price, engine.latest(engine.sma[w]))
+            for w in (5, 10, 20)]
+    trend = (smas[0] + smas[1] + smas[2]) / 3 - latest_price
+    volatility = engine.volatility
+
+    if rngs is not None:
+        # Generator.normal(0, s) is s * standard_normal(), drawn in the same order
+        z = np.array([rngs[symbol].standard_normal(3) for symbol in engine.symbols])
+        noise = [z[:, k] * volatility * latest_price * scale for k, scale in enumerate((0.5, 1.5, 3))]
     else:
-        prices = pd.to_numeric(df.iloc[:, -1], errors='coerce')
+        noise = [np.random.normal(0, volatility * latest_price * scale) for scale in (0.5, 1.5, 3)]
+
+    tomorrow = latest_price + trend * 0.1 + noise[0]
+    week = latest_price + trend * 0.7 + noise[1]
+    month = latest_price + trend * 3 + noise[2]
+
+    confidence = confidence_score([row_counts[symbol] for symbol in engine.symbols], volatility)
+
+    for i, symbol in enumerate(engine.symbols):
+        results[symbol] = {
+            'predictions': {
+                'tomorrow': max(0, float(tomorrow[i])),
+                'week': max(0, float(week[i])),
+                'month': max(0, float(month[i])),
+            },
+            'current_price': float(latest_price[i]),
+            'confidence': int(confidence[i]),
+            'volatility': float(volatility[i]),
+            'trend': 'up' if trend[i] > 0 else 'down'
+        }
+    return results
+
+
+def prediction_rng(symbol, df):
+    """Noise generator seeded from (symbol, last bar date, model version)"""
+    seed_text = f"{symbol}|{last_bar_date(df) or len(df)}|{PREDICTION_MODEL_VERSION}"
+    seed = int.from_bytes(hashlib.blake2b(seed_text.encode(), digest_size=8).digest(), 'big')
+    return np.random.default_rng(seed)
+
+
+def prediction_key(symbol, df):
+    """Content hash of the inputs a prediction depends on"""
+    return f"{symbol}|{PREDICTION_MODEL_VERSION}|{len(df)}|{series_digest(get_close_prices(df))}"
 
-    # Drop NaN values
-    prices = prices.dropna()
 
-    # Get last 30 days
-    prices = prices.tail(30)
+def _deterministic_predictions():
+    return getattr(settings, 'PREDICTION_DETERMINISTIC', True)
 
+
+def predict_symbol(symbol, df):
+    """
+    Prediction for one symbol's history.
+
+    In deterministic mode the noise is seeded per symbol and trading day and
+    results are memoized by a content hash of the input, so repeat requests
+    skip the computation and return the same numbers.
+    """
+    if not _deterministic_predictions() or df is None or df.empty:
+        return predict_price_simple_moving_average(df)
+
+    key = prediction_key(symbol, df)
+    result = prediction_memo.get(key)
+    if result is None:
+        result = predict_price_simple_moving_average(df, rng=prediction_rng(symbol, df))
+        if result is not None:
+            prediction_memo.set(key, result)
+    return result
+
+
+def predict_symbols(frames):
+    """Batch counterpart of predict_symbol: memo hits are reused, misses run in one pass"""
+    if not _deterministic_predictions():
+        return predict_prices_batch(frames)
+
+    results, misses, keys = {}, {}, {}
+    for symbol, df in frames.items():
+        if df is None or df.empty:
+            results[symbol] = None
+            continue
+        key = prediction_key(symbol, df)
+        result = prediction_memo.get(key)
+        if result is not None:
+            results[symbol] = result
+        else:
+            misses[symbol] = df
+            keys[symbol] = key
+
+    if misses:
+        rngs = {symbol: prediction_rng(symbol, df) for symbol, df in misses.items()}
+        for symbol, result in predict_prices_batch(misses, rngs=rngs).items():
+            results[symbol] = result
+            if result is not None:
+                prediction_memo.set(keys[symbol], result)
+    return results
+
+
+def resolve_model_name(requested):
+    """Model requested by the client, or the deployment default"""
+    return (requested or getattr(settings, 'FORECAST_MODEL', DEFAULT_MODEL)).strip().lower()
+
+
+def predict_with_model(model_name, frames):
+    """
+    Batch predictions with a named model.
+
+    'sma' is the moving-average predictor above (seeded noise, memoized);
+    any other name is looked up in the forecasting model registry.
+    """
+    if model_name == DEFAULT_MODEL:
+        return predict_symbols(frames)
+    closes = {symbol: get_close_prices(df) for symbol, df in frames.items()}
+    row_counts = {symbol: len(df) for symbol, df in frames.items()}
+    return forecast_symbols(get_model(model_name), closes, row_counts)
+
+
+def generate_historical_chart_data(df, current_price, chart_range=DEFAULT_CHART_RANGE, max_points=None, style='line'):
+    """Chart series for the last ``chart_range`` of bars, downsampled to ``max_points``"""
+    if df is None or df.empty:
+        return {'labels': [], 'data': []}
+
+    max_points = max_points or getattr(settings, 'CHART_MAX_POINTS', 120)
+    if has_bar_dates(df):
+        start = range_start(df.index[-1], chart_range)
+        if start is not None:
+            df = df[df.index > start]
+    elif chart_range == DEFAULT_CHART_RANGE:
+        df = df.tail(30)  # No bar dates to count back from
+
+    prices = get_close_prices(df)
     if len(prices) == 0:
         return {'labels': [], 'data': []}
 
-    # Generate labels
-    labels = []
-    for i in range(len(prices)):
-        date = datetime.now() - timedelta(days=len(prices) - i - 1)
-        labels.append(date.strftime('%b %d'))
+    if style == 'ohlc' and has_bar_dates(df):
+        series = ohlc_series(df.loc[prices.index].assign(close=prices), max_points)
+    else:
+        series = line_series(prices, max_points)
+    series['range'] = chart_range
+    return series
+
+
+def chart_history(symbol, df, chart_range):
+    """
+    Bars to chart for ``chart_range``: the fetched window, extended from the
+    bar store when the range reaches further back than the window does.
+    """
+    if not has_bar_dates(df):
+        return df
+    start = range_start(df.index[-1], chart_range)
+    if start is not None and df.index[0] <= start:
+        return df
+    try:
+        archived = bar_store.frame(symbol, start=start)
+    except Exception as e:
+        logger.warning(f"Could not read archived bars for {symbol}: {str(e)}")
+        return df
+    if archived is None or archived.empty:
+        return df
+    return merge_bars(archived, df)
+
+
+def chart_options(params):
+    """``(range, points, style)`` from request parameters; raises ValueError on bad values"""
+    chart_range = normalize_range(params.get('range'))
+    if chart_range is None:
+        raise ValueError(f"Unknown range: {params.get('range')}. Use one of {', '.join(CHART_RANGES)}")
+    style = params.get('chart') or 'line'
+    if style not in CHART_STYLES:
+        raise ValueError(f"Unknown chart style: {style}. Use one of {', '.join(CHART_STYLES)}")
+    points = params.get('points')
+    if points not in (None, ''):
+        limit = getattr(settings, 'CHART_MAX_POINTS_LIMIT', 1000)
+        try:
+            points = int(points)
+        except (TypeError, ValueError):
+            raise ValueError(f"points must be an integer between 10 and {limit}") from None
+        points = max(10, min(points, limit))
+    else:
+        points = None
+    return chart_range, points, style
+
+
+def fetch_many(symbols, max_workers=None):
+    """
+    Fetch histories for many symbols on a bounded thread pool.
+
+    The cache and single-flight layer still apply to every symbol. Returns
+    ``(frames, sources, errors)`` keyed by symbol.
+    """
+    frames, sources, errors = {}, {}, {}
+    if not symbols:
+        return frames, sources, errors
+    max_workers = min(max_workers or getattr(settings, 'BATCH_PREDICT_MAX_WORKERS', 8), len(symbols))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(get_stock_data, symbol): symbol for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                df, source = future.result()
+            except Exception as e:
+                logger.error(f"Error fetching {symbol}: {str(e)}")
+                errors[symbol] = f'An error occurred: {str(e)}'
+                continue
+            if df is None:
+                errors[symbol] = 'Stock data not available'
+            else:
+                frames[symbol] = df
+                sources[symbol] = source
+    return frames, sources, errors
+
+
+def prediction_payload(symbol, df, prediction_result, source, chart=None):
+    """JSON body for one symbol's prediction; ``chart`` is ``(range, points, style)``"""
+    chart_range, points, style = chart or (DEFAULT_CHART_RANGE, None, 'line')
+    # Generate historical chart data
+    historical_data = generate_historical_chart_data(
+        chart_history(symbol, df, chart_range), prediction_result['current_price'],
+        chart_range=chart_range, max_points=points, style=style,
+    )
 
     return {
-        'labels': labels,
-        'data': [float(p) for p in prices.values]
+        'symbol': symbol,
+        'current_price': prediction_result['current_price'],
+        'predictions': {
+            'tomorrow': round(prediction_result['predictions']['tomorrow'], 2),
+            'week': round(prediction_result['predictions']['week'], 2),
+            'month': round(prediction_result['predictions']['month'], 2)
+        },
+        'confidence': prediction_result['confidence'],
+        'trend': prediction_result['trend'],
+        'volatility': prediction_result['volatility'],
+        'historical_data': historical_data,
+        'source': source,
+        'model': prediction_result.get('model', DEFAULT_MODEL)
     }
 
 
+def latest_prediction_snapshot(symbol, generation_only=False):
+    """Newest precomputed payload (or just its generation id) for a symbol, or None if missing or too old"""
+    max_age = timedelta(seconds=getattr(settings, 'PREDICTION_SNAPSHOT_MAX_AGE', 36 * 60 * 60))
+    try:
+        if generation_only:
+            return PredictionSnapshot.latest_generation_for(symbol, max_age=max_age)
+        return PredictionSnapshot.latest_for(symbol, max_age=max_age)
+    except DatabaseError as e:
+        logger.warning(f"Prediction snapshot lookup failed for {symbol}: {str(e)}")
+        return None
+
+
+def prediction_etag_for(symbol, model_name, chart, version):
+    """ETag of a prediction response for one version of its input data"""
+    model_version = PREDICTION_MODEL_VERSION if model_name == DEFAULT_MODEL else get_model(model_name).version
+    return make_etag('predict', symbol, model_name, model_version, *chart, version)
+
+
+def snapshot_version(symbol, generation, chart):
+    """Data version of a snapshot response; other chart ranges also depend on the bar store"""
+    if chart == (DEFAULT_CHART_RANGE, None, 'line'):
+        return f"snapshot:{generation}"
+    return f"snapshot:{generation}:{bar_store.length(symbol)}"
+
+
+def prediction_etag(request):
+    """
+    ETag of a GET prediction from versions known before any fetching: the
+    newest snapshot generation, else a fresh in-memory cache entry. None
+    when the version is only known after fetching.
+    """
+    if request.method != 'GET':
+        return None
+    symbol = request.GET.get('symbol', '').upper().strip()
+    model_name = resolve_model_name(request.GET.get('model'))
+    if not symbol or model_name not in available_models():
+        return None
+    try:
+        chart = chart_options(request.GET)
+    except ValueError:
+        return None
+
+    if model_name == DEFAULT_MODEL:
+        generation = latest_prediction_snapshot(symbol, generation_only=True)
+        if generation is not None:
+            return prediction_etag_for(symbol, model_name, chart, snapshot_version(symbol, generation, chart))
+    version = price_cache.version(symbol)
+    if version is None:
+        return None
+    return prediction_etag_for(symbol, model_name, chart, version)
+
+
 @csrf_exempt
 @require_http_methods(["POST", "GET"])
+@condition(etag_func=prediction_etag)
 def predict_stock(request):
     """API endpoint for stock prediction"""
     try:
         if request.method == 'POST':
             data = json.loads(request.body)
-            symbol = data.get('symbol', '').upper().strip()
         else:
-            symbol = request.GET.get('symbol', '').upper().strip()
+            data = request.GET
+        symbol = data.get('symbol', '').upper().strip()
+        model_name = resolve_model_name(data.get('model'))
         
         if not symbol:
             return JsonResponse({
                 'error': 'Stock symbol is required'
             }, status=400)
+
+        try:
+            chart = chart_options(data)
+        except ValueError as e:
+            return JsonResponse({
+                'error': str(e)
+            }, status=400)
+
+        if model_name not in available_models():
+            return JsonResponse({
+                'error': f'Unknown model: {model_name}',
+                'models': available_models()
+            }, status=400)
         
+        # Serve the precomputed forecast when the scheduled snapshot has one
+        snapshot = latest_prediction_snapshot(symbol) if model_name == DEFAULT_MODEL else None
+        if snapshot is not None:
+            if chart != (DEFAULT_CHART_RANGE, None, 'line'):
+                # Snapshots hold the default chart; other ranges come from the bar store
+                last = bar_store.last_date(symbol)
+                archived = bar_store.frame(symbol, start=range_start(last, chart[0])) if last else None
+                snapshot['historical_data'] = generate_historical_chart_data(
+                    archived, snapshot['current_price'], chart_range=chart[0], max_points=chart[1], style=chart[2],
+                )
+            response = JsonResponse(snapshot)
+            if request.method == 'GET':
+                version = snapshot_version(symbol, snapshot['snapshot_generation'], chart)
+                cache_public(response, prediction_etag_for(symbol, model_name, chart, version), market_data_max_age())
+            return conditional_response(request, response)
+
         # Fetch stock data
         df, source = get_stock_data(symbol)
         
@@ -243,7 +690,7 @@ def predict_stock(request):
                 'month': current_price * (1 + np.random.normal(0, 0.1))
             }
             
-            return JsonResponse({
+            response = JsonResponse({
                 'symbol': symbol,
                 'current_price': round(current_price, 2),
                 'predictions': {
@@ -257,60 +704,212 @@ def predict_stock(request):
                 'source': 'mock',
                 'message': 'Using mock data. Please install bdshare or stocksurferbd for real data.'
             })
+            response['Cache-Control'] = 'no-store'
+            return response
         
         # Generate prediction
-        prediction_result = predict_price_simple_moving_average(df)
+        if model_name == DEFAULT_MODEL:
+            prediction_result = predict_symbol(symbol, df)
+        else:
+            prediction_result = predict_with_model(model_name, {symbol: df})[symbol]
         
         if prediction_result is None:
             return JsonResponse({
                 'error': 'Unable to generate prediction. Insufficient data.'
             }, status=400)
         
-        # Generate historical chart data
-        historical_data = generate_historical_chart_data(df, prediction_result['current_price'])
+        response = JsonResponse(prediction_payload(symbol, df, prediction_result, source, chart=chart))
+        if request.method == 'GET':
+            etag = prediction_etag_for(symbol, model_name, chart, data_version(df))
+            cache_public(response, etag, market_data_max_age())
+        return conditional_response(request, response)
         
+    except Exception as e:
+        logger.error(f"Error in predict_stock: {str(e)}")
         return JsonResponse({
-            'symbol': symbol,
-            'current_price': prediction_result['current_price'],
-            'predictions': {
-                'tomorrow': round(prediction_result['predictions']['tomorrow'], 2),
-                'week': round(prediction_result['predictions']['week'], 2),
-                'month': round(prediction_result['predictions']['month'], 2)
-            },
-            'confidence': prediction_result['confidence'],
-            'trend': prediction_result['trend'],
-            'volatility': prediction_result['volatility'],
-            'historical_data': historical_data,
-            'source': source
+            'error': f'An error occurred: {str(e)}'
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST", "GET"])
+def predict_stock_batch(request):
+    """API endpoint for predicting many symbols in one request"""
+    try:
+        if request.method == 'POST':
+            data = json.loads(request.body)
+            symbols = data.get('symbols', [])
+            model_name = resolve_model_name(data.get('model'))
+        else:
+            symbols = request.GET.get('symbols', '').split(',')
+            model_name = resolve_model_name(request.GET.get('model'))
+
+        if not isinstance(symbols, list):
+            return JsonResponse({'error': 'symbols must be a list'}, status=400)
+
+        if model_name not in available_models():
+            return JsonResponse({
+                'error': f'Unknown model: {model_name}',
+                'models': available_models()
+            }, status=400)
+
+        # Normalize and de-duplicate, keeping the caller's order
+        symbols = list(dict.fromkeys(str(s).upper().strip() for s in symbols if str(s).strip()))
+        if not symbols:
+            return JsonResponse({'error': 'At least one stock symbol is required'}, status=400)
+
+        max_symbols = getattr(settings, 'BATCH_PREDICT_MAX_SYMBOLS', 100)
+        if len(symbols) > max_symbols:
+            return JsonResponse({
+                'error': f'At most {max_symbols} symbols can be requested at once'
+            }, status=400)
+
+        frames, sources, errors = fetch_many(symbols)
+
+        # One vectorized pass over every fetched history
+        predictions = predict_with_model(model_name, frames)
+
+        results = {}
+        for symbol in symbols:
+            if symbol in errors:
+                continue
+            prediction_result = predictions.get(symbol)
+            if prediction_result is None:
+                errors[symbol] = 'Unable to generate prediction. Insufficient data.'
+                continue
+            results[symbol] = prediction_payload(symbol, frames[symbol], prediction_result, sources[symbol])
+
+        return JsonResponse({
+            'results': results,
+            'errors': errors,
+            'total': len(symbols)
         })
-        
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
     except Exception as e:
-        logger.error(f"Error in predict_stock: {str(e)}")
+        logger.error(f"Error in predict_stock_batch: {str(e)}")
         return JsonResponse({
             'error': f'An error occurred: {str(e)}'
         }, status=500)
 
 
+# The stock list only changes with a deploy
+STOCK_LIST_ETAG = make_etag('stocks', json.dumps(BANGLADESHI_STOCKS, sort_keys=True))
+
+
 @require_http_methods(["GET"])
+@condition(etag_func=lambda request: STOCK_LIST_ETAG)
+@cache_control(public=True, max_age=24 * 60 * 60)
 def get_stock_list(request):
     """Get list of available Bangladeshi stocks"""
-    # Common Bangladeshi stock symbols
-    bangladeshi_stocks = [
-        {'symbol': 'GP', 'name': 'Grameenphone Ltd'},
-        {'symbol': 'SQUARE', 'name': 'Square Pharmaceuticals Ltd'},
-        {'symbol': 'BEXIMCO', 'name': 'Beximco Pharmaceuticals Ltd'},
-        {'symbol': 'RENATA', 'name': 'Renata Limited'},
-        {'symbol': 'ACI', 'name': 'ACI Limited'},
-        {'symbol': 'BRACBANK', 'name': 'BRAC Bank Limited'},
-        {'symbol': 'EBL', 'name': 'Eastern Bank Limited'},
-        {'symbol': 'DUTCHBANGLA', 'name': 'Dutch-Bangla Bank Limited'},
-        {'symbol': 'BANKASIA', 'name': 'Bank Asia Limited'},
-        {'symbol': 'IFIC', 'name': 'IFIC Bank Limited'},
-    ]
-    
     return JsonResponse({
-        'stocks': bangladeshi_stocks,
-        'total': len(bangladeshi_stocks)
+        'stocks': BANGLADESHI_STOCKS,
+        'total': len(BANGLADESHI_STOCKS)
+    })
+
+
+def quote_since(request):
+    """The ``since`` version a quotes request asks for (None for everything); ValueError if malformed"""
+    since = request.GET.get('since')
+    return int(since) if since not in (None, '') else None
+
+
+def quotes_etag(request):
+    """ETag from the in-memory snapshot; the hub's watch thread keeps it current"""
+    try:
+        since = quote_since(request)
+    except ValueError:
+        return None
+    quote_hub.watch()
+    return make_etag('quotes', quote_hub.current().digest(), since)
+
+
+@require_http_methods(["GET"])
+@condition(etag_func=quotes_etag)
+def quotes(request):
+    """
+    Latest quote of every symbol as parallel columns; ``?since=<version>``
+    returns only the symbols that changed after that version
+    """
+    try:
+        since = quote_since(request)
+    except ValueError:
+        return JsonResponse({'error': 'since must be an integer version'}, status=400)
+
+    snapshot = quote_hub.current()
+    if since is None:
+        response = HttpResponse(snapshot.full_body(), content_type='application/json')
+    else:
+        response = JsonResponse(snapshot.columns(since))
+    response['ETag'] = make_etag('quotes', snapshot.digest(), since)
+    response['Cache-Control'] = 'no-cache'
+    return conditional_response(request, response)
+
+
+@require_http_methods(["GET"])
+async def quote_stream(request):
+    """
+    Server-Sent Events stream of live quotes for ``?symbols=GP,BRAC``
+    (every symbol when omitted). Needs an ASGI server: under WSGI each open
+    stream would pin a worker thread, so clients get 501 and poll instead.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'The quote stream needs an ASGI server; poll /api/quotes/ instead'}, status=501)
+    max_symbols = getattr(settings, 'QUOTE_STREAM_MAX_SYMBOLS', 100)
+    symbols = [s.strip().upper() for s in request.GET.get('symbols', '').split(',') if s.strip()]
+    if len(symbols) > max_symbols:
+        return JsonResponse({'error': f'At most {max_symbols} symbols per stream'}, status=400)
+
+    heartbeat = getattr(settings, 'QUOTE_STREAM_HEARTBEAT', 15)
+
+    async def events():
+        # Subscribe on first iteration so a client gone before streaming starts leaves nothing behind
+        subscription = quote_hub.subscribe(symbols or None)
+        try:
+            yield 'retry: 3000\n\n'
+            yield sse_event('quotes', quote_hub.snapshot(subscription))
+            while True:
+                batch = await quote_hub.next_batch(subscription, timeout=heartbeat)
+                if batch is None:
+                    return
+                if batch:
+                    yield sse_event('quotes', batch)
+                else:
+                    yield sse_event('heartbeat', {'time': round(time.time(), 3)})
+        finally:
+            quote_hub.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Let nginx pass frames straight through
+    return response
+
+
+def metrics_allowed(request):
+    """Staff users, or a request carrying the METRICS_TOKEN bearer token"""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode())
+
+
+@require_http_methods(["GET"])
+def metrics(request):
+    """Operational counters for the data layer (staff or METRICS_TOKEN only)"""
+    if not metrics_allowed(request):
+        return JsonResponse({'error': 'Staff access or a metrics token is required'}, status=403)
+    return JsonResponse({
+        'price_cache': price_cache.stats(),
+        'fetches': fetch_stats(),
+        'single_flight': stock_fetches.stats(),
+        'sources': source_manager.stats(),
+        'http_clients': upstream_clients.stats(),
+        'prediction_memo': prediction_memo.stats(),
+        'ingest': ingest_status(),
+        'quote_stream': quote_hub.stats(),
     })
 
 
@@ -684,120 +1283,190 @@ def trading_view(request):
     return render(request, 'trading.html')
 
 
+def trading_data_etag(request):
+    """ETag of a user's trading data from their ledger version (a cache read for active traders)"""
+    if request.method != 'GET' or not request.user.is_authenticated:
+        return None
+    version = account_version(request.user)
+    if version is None:
+        return None
+    return make_etag('ledger', request.user.pk, version)
+
+
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
+@condition(etag_func=trading_data_etag)
 def trading_data(request):
     """Get or update trading data (balance, portfolio, orders)"""
     if not request.user.is_authenticated:
         return JsonResponse({'error': 'Authentication required'}, status=401)
     
-    from .models import TradingAccount, StockOrder, Portfolio
-    
     if request.method == 'GET':
         try:
-            # Get user's trading data
-            account = TradingAccount.get_or_create_account(request.user)
-            orders = StockOrder.objects.filter(user=request.user).order_by('-timestamp')[:10]  # Last 10 orders
-            portfolio_items = Portfolio.objects.filter(user=request.user).order_by('-updated_at')[:10]  # Last 10 portfolio items
-            
-            # Log for debugging
-            logger.info(f"Loading trading data for user {request.user.username}: {orders.count()} orders, {portfolio_items.count()} portfolio items")
-            
-            orders_list = [{
-                'id': order.id,
-                'symbol': order.symbol,
-                'type': order.order_type,
-                'quantity': order.quantity,
-                'price': float(order.price),
-                'total': float(order.total_amount),
-                'timestamp': order.timestamp.isoformat()
-            } for order in orders]
-            
-            return JsonResponse({
+            # Served from the cached account snapshot (see accounts.py)
+            snapshot = account_snapshot(request.user)
+            response = JsonResponse({
                 'success': True,
-                'balance': float(account.balance),
-                'orders': orders_list,
-                'portfolio': [{
-                    'symbol': item.symbol,
-                    'quantity': item.quantity,
-                    'avg_price': float(item.avg_price)
-                } for item in portfolio_items]
+                'balance': snapshot['balance'],
+                'orders': snapshot['orders'],
+                'portfolio': snapshot['portfolio'],
             })
+            etag = make_etag('ledger', request.user.pk, snapshot['ledger_version'])
+            return conditional_response(request, cache_private(response, etag))
         except Exception as e:
             logger.error(f"Error in trading_data GET: {str(e)}", exc_info=True)
             return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
     
     elif request.method == 'POST':
-        # Save new order and update balance/portfolio
+        # Fill the order atomically (see orders.py)
         try:
-            data = json.loads(request.body)
-            symbol = data.get('symbol', '').upper()
-            order_type = data.get('type', '').upper()  # BUY or SELL
-            quantity = int(data.get('quantity', 0))
-            price = Decimal(str(data.get('price', 0)))
-            total = quantity * price
-            
-            if not symbol or order_type not in ['BUY', 'SELL'] or quantity <= 0 or price <= 0:
-                return JsonResponse({'error': 'Invalid order data'}, status=400)
-            
-            account = TradingAccount.get_or_create_account(request.user)
-            
-            if order_type == 'BUY':
-                if total > account.balance:
-                    return JsonResponse({'error': 'Insufficient balance'}, status=400)
-                account.balance -= Decimal(str(total))
-                
-                # Update or create portfolio
-                portfolio_item, created = Portfolio.objects.get_or_create(
-                    user=request.user,
-                    symbol=symbol,
-                    defaults={'quantity': quantity, 'avg_price': Decimal(str(price))}
-                )
-                if not created:
-                    # Calculate new average price
-                    old_total = portfolio_item.quantity * portfolio_item.avg_price
-                    new_total = old_total + total
-                    portfolio_item.quantity += quantity
-                    portfolio_item.avg_price = Decimal(str(new_total / portfolio_item.quantity))
-                    portfolio_item.save()
-            else:  # SELL
-                try:
-                    portfolio_item = Portfolio.objects.get(user=request.user, symbol=symbol)
-                    if portfolio_item.quantity < quantity:
-                        return JsonResponse({'error': 'Insufficient shares to sell'}, status=400)
-                    
-                    account.balance += Decimal(str(total))
-                    portfolio_item.quantity -= quantity
-                    if portfolio_item.quantity <= 0:
-                        portfolio_item.delete()
-                    else:
-                        portfolio_item.save()
-                except Portfolio.DoesNotExist:
-                    return JsonResponse({'error': 'You don\'t own this stock'}, status=400)
-            
-            account.save()
-            
-            # Create order record
-            order = StockOrder.objects.create(
-                user=request.user,
-                symbol=symbol,
-                order_type=order_type,
-                quantity=quantity,
-                price=Decimal(str(price)),
-                total_amount=Decimal(str(total))
-            )
-            
+            symbol, order_type, quantity, price = parse_order(json.loads(request.body))
+            order, balance, _ = execute_order(request.user, symbol, order_type, quantity, price)
             return JsonResponse({
                 'success': True,
-                'balance': float(account.balance),
+                'balance': float(balance),
                 'order_id': order.id
             })
-            
+        except OrderRejected as e:
+            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
             logger.error(f"Error processing trade: {str(e)}")
             return JsonResponse({'error': str(e)}, status=500)
 
 
+@require_http_methods(["GET"])
+def order_history_view(request):
+    """
+    A user's orders newest first, ``limit`` per page; pass ``next_cursor`` back
+    as ``cursor`` for the next page. Optional ``symbol``, ``type`` (BUY/SELL)
+    and ``from``/``to`` (YYYY-MM-DD) filters; ``archived=1`` includes archived orders.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    params = request.GET
+    order_type = params.get('type', '').upper() or None
+    if order_type and order_type not in ORDER_TYPES:
+        return JsonResponse({'error': f"type must be one of {', '.join(ORDER_TYPES)}"}, status=400)
+    try:
+        limit = int(params.get('limit', HISTORY_PAGE_SIZE))
+        if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {HISTORY_MAX_PAGE_SIZE}')
+        orders, next_cursor = order_history(
+            request.user,
+            cursor=params.get('cursor'),
+            limit=limit,
+            symbol=params.get('symbol'),
+            order_type=order_type,
+            start=params.get('from'),
+            end=params.get('to'),
+            include_archived=params.get('archived', '').lower() in ('1', 'true', 'yes'),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'orders': [order_dict(order) for order in orders],
+        'next_cursor': next_cursor,
+    })
+
+
+@require_http_methods(["GET"])
+def equity_history(request):
+    """A user's daily equity curve as parallel columns, optionally limited to ``from``/``to`` (YYYY-MM-DD)"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    bounds = {}
+    for param in ('from', 'to'):
+        value = request.GET.get(param)
+        if value:
+            bounds[param] = parse_date(value)
+            if bounds[param] is None:
+                return JsonResponse({'error': f'Invalid {param} date {value!r}'}, status=400)
+
+    rows = list(equity_curve(request.user, start=bounds.get('from'), end=bounds.get('to')))
+    curve = {'dates': [row[0].isoformat() for row in rows]}
+    for i, field in enumerate(SNAPSHOT_FIELDS, start=1):
+        curve[field] = [float(row[i]) for row in rows]
+    return JsonResponse(curve)
+
+
+@require_http_methods(["GET"])
+def export_data(request):
+    """
+    Stream the user's ``dataset`` (orders or holdings) as ``format`` csv or
+    jsonl; ``gzip=1`` compresses on the fly. Staff may export another
+    account with ``user=<username>``.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    user = request.user
+    username = request.GET.get('user')
+    if username and username != user.username:
+        if not user.is_staff:
+            return JsonResponse({'error': 'Only staff can export other accounts'}, status=403)
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            return JsonResponse({'error': f'Unknown user {username!r}'}, status=404)
+
+    dataset = request.GET.get('dataset', 'orders')
+    fmt = request.GET.get('format', 'csv')
+    compress = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
+    try:
+        stream = export_stream(dataset, fmt, user_id=user.pk, compress=compress)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    response = StreamingHttpResponse(stream, content_type=export_content_type(fmt, compress))
+    filename = export_filename(dataset, fmt, compress, label=user.username)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def bulk_orders(request):
+    """
+    Fill a basket of orders in one transaction: ``{"orders": [...], "mode": "all"}``
+    (``all`` rejects the whole basket if any order fails, ``best_effort`` fills what it can)
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    orders = data.get('orders') if isinstance(data, dict) else None
+    if not isinstance(orders, list) or not orders:
+        return JsonResponse({'error': 'orders must be a non-empty list'}, status=400)
+    max_orders = getattr(settings, 'BULK_ORDER_MAX', 500)
+    if len(orders) > max_orders:
+        return JsonResponse({'error': f'At most {max_orders} orders per request'}, status=400)
+
+    mode = data.get('mode', 'all')
+    try:
+        results, balance, _, applied = execute_orders(request.user, orders, mode=mode)
+    except OrderRejected as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"Error processing order basket: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+    filled = sum(1 for result in results if result['status'] == 'filled')
+    return JsonResponse({
+        'success': applied,
+        'mode': mode,
+        'balance': float(balance),
+        'filled': filled,
+        'rejected': len(results) - filled,
+        'results': results,
+    }, status=200 if applied else 400)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def contact_form(request):
@@ -44,13 +44,9 @@ const popularStocks = {
 // Fetch prediction from Django API
 async function fetchPrediction(symbol) {
     try {
-        const response = await fetch(`${API_BASE_URL}/predict/`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ symbol: symbol })
-        });
+        // GET so the browser can revalidate with If-None-Match and reuse cached predictions
+        const params = new URLSearchParams({ symbol: symbol });
+        const response = await fetch(`${API_BASE_URL}/predict/?${params}`);
 
         if (!response.ok) {
             const errorData = await response.json();
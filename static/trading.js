@@ -59,13 +59,16 @@ document.addEventListener('DOMContentLoaded', async () => {
     renderStockList();
     setupEventListeners();
     updateMarketIndices();
-    setInterval(updateStockPrices, 5000); // Update prices every 5 seconds
     
     // Set default balance first (in case API is slow)
     userBalanceEl.textContent = `৳${userBalance.toFixed(2)}`;
     
     // Load user's trading data from backend
     await loadTradingData();
+
+    // Then the live quotes, so the balance and holdings show without waiting on them
+    await loadQuotes();
+    connectQuoteStream();
 });
 
 // Render Stock List
@@ -417,15 +420,77 @@ function renderOrderHistory() {
     console.log('Order history rendered, items:', orderHistoryEl.children.length);
 }
 
-// Update Stock Prices (Simulate real-time updates)
-function updateStockPrices() {
-    bangladeshiStocks.forEach(stock => {
-        const change = (Math.random() - 0.5) * 0.5; // Random change between -0.25% to +0.25%
-        stock.price = Math.max(1, stock.price * (1 + change / 100));
-        stock.change = (Math.random() - 0.5) * 2;
-        stock.volume += Math.floor(Math.random() * 10000);
+// Version of the last quote snapshot applied
+let quotesVersion = null;
+let quotePollTimer = null;
+
+// Latest quotes for every symbol (only the changed ones after the first load)
+async function loadQuotes() {
+    try {
+        const query = quotesVersion !== null ? `?since=${quotesVersion}` : '';
+        const response = await fetch(`${API_BASE_URL}/quotes/${query}`);
+        if (!response.ok) return;
+        const snapshot = await response.json();
+        quotesVersion = snapshot.version;
+        applyQuotes(snapshot.symbols.map((symbol, i) => ({
+            symbol,
+            price: snapshot.price[i],
+            change: snapshot.change[i],
+            volume: snapshot.volume[i],
+        })));
+    } catch (error) {
+        console.warn('Could not load quotes:', error);
+    }
+}
+
+// Poll for changed quotes while the stream is unavailable
+function startQuotePolling() {
+    if (quotePollTimer === null) {
+        quotePollTimer = setInterval(loadQuotes, 5000);
+    }
+}
+
+function stopQuotePolling() {
+    if (quotePollTimer !== null) {
+        clearInterval(quotePollTimer);
+        quotePollTimer = null;
+    }
+}
+
+// Live quotes over Server-Sent Events, falling back to polling when the stream fails
+function connectQuoteStream() {
+    if (!window.EventSource) {
+        startQuotePolling();
+        return;
+    }
+    const symbols = bangladeshiStocks.map(s => s.symbol).join(',');
+    const source = new EventSource(`${API_BASE_URL}/quotes/stream/?symbols=${encodeURIComponent(symbols)}`);
+    source.addEventListener('open', stopQuotePolling);
+    source.addEventListener('quotes', (event) => applyQuotes(JSON.parse(event.data)));
+    source.onerror = () => {
+        // The browser retries dropped connections itself but gives up on error responses (e.g. 501)
+        console.warn(source.readyState === EventSource.CLOSED
+            ? 'Quote stream unavailable, polling instead'
+            : 'Quote stream interrupted, polling until it reconnects...');
+        startQuotePolling();
+    };
+}
+
+// Apply streamed quotes to the watch list
+function applyQuotes(quotes) {
+    if (!quotes.length) return;
+    quotes.forEach(quote => {
+        const stock = bangladeshiStocks.find(s => s.symbol === quote.symbol);
+        if (stock) {
+            stock.price = quote.price;
+            stock.change = quote.change;
+            stock.volume = quote.volume;
+        }
     });
+    refreshPriceViews();
+}
 
+function refreshPriceViews() {
     if (selectedStock) {
         const updated = bangladeshiStocks.find(s => s.symbol === selectedStock.symbol);
         if (updated) {
@@ -4,6 +4,7 @@ Django settings for stockpredictor project.
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 import dj_database_url
 
@@ -111,6 +112,11 @@ DATABASES = {
     )
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # A file, not the shared in-memory default: the concurrent order tests need SQLite's
+    # database locking (which waits) rather than shared-cache table locks (which fail at once)
+    DATABASES['default']['TEST'] = {'NAME': os.path.join(tempfile.gettempdir(), 'stockpredictor_test.sqlite3')}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -198,6 +204,115 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Django cache, shared by every worker process (per-user account snapshots).
+# Redis when REDIS_URL is set, otherwise files under cache/django.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('DJANGO_CACHE_DIR', str(BASE_DIR / 'cache' / 'django')),
+        }
+    }
+
+# Seconds an account snapshot may be served from the cache; order writes supersede it sooner
+ACCOUNT_SNAPSHOT_TIMEOUT = 300
+
+# Price history cache
+# In-process LRU capped at PRICE_CACHE_MAX_BYTES, persisted per symbol in PRICE_CACHE_DIR.
+# Entries live PRICE_CACHE_INTRADAY_TTL seconds while DSE is trading, and up to
+# PRICE_CACHE_AFTER_CLOSE_TTL seconds (or the next open) after the close.
+PRICE_CACHE_MAX_BYTES = int(os.environ.get('PRICE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+PRICE_CACHE_DIR = os.environ.get('PRICE_CACHE_DIR', str(BASE_DIR / 'cache' / 'prices'))
+PRICE_CACHE_INTRADAY_TTL = 300
+PRICE_CACHE_AFTER_CLOSE_TTL = 12 * 60 * 60
+
+# Concurrent fetches for one symbol are always coalesced within a worker. Set a
+# directory here to also serialize them across workers with per-symbol lock files.
+PRICE_FETCH_LOCK_DIR = os.environ.get('PRICE_FETCH_LOCK_DIR', str(BASE_DIR / 'cache' / 'locks'))
+
+# Columnar, memory-mapped archive of every bar downloaded, shared by all workers
+# through the page cache (also the default input of `manage.py backtest`)
+BAR_STORE_DIR = os.environ.get('BAR_STORE_DIR', str(BASE_DIR / 'cache' / 'bars'))
+
+# Ingestion worker (`manage.py ingest_prices`): refresh interval while DSE is open,
+# symbols in flight, per-source requests per second and where to report ingestion lag
+INGEST_INTERVAL = 60
+INGEST_CONCURRENCY = 8
+INGEST_RATE_LIMITS = {'bdshare': 2.0, 'stocksurferbd': 2.0}
+INGEST_STATUS_FILE = os.environ.get('INGEST_STATUS_FILE', str(BASE_DIR / 'cache' / 'ingest_status.json'))
+
+# Upstream data sources (bdshare first, then stocksurferbd)
+# Each request gets DATA_SOURCE_DEADLINE seconds. If the primary has not answered by its
+# p95 latency (DATA_SOURCE_HEDGE_DELAY until enough samples exist), the next source is
+# tried in parallel. A source failing DATA_SOURCE_BREAKER_FAILURES times in a row is
+# skipped for DATA_SOURCE_BREAKER_COOLDOWN seconds.
+DATA_SOURCE_DEADLINE = 10.0
+DATA_SOURCE_HEDGE_DELAY = 2.0
+DATA_SOURCE_BREAKER_FAILURES = 5
+DATA_SOURCE_BREAKER_COOLDOWN = 60
+
+# Pooled HTTP connections to the upstream sites (keep-alive, capped per host).
+# UPSTREAM_HTTP_TRANSPORT may name a callable returning a requests adapter, e.g. a stub for tests.
+UPSTREAM_HTTP_POOL_CONNECTIONS = 10
+UPSTREAM_HTTP_POOL_MAXSIZE = 10
+UPSTREAM_HTTP_TIMEOUT = 15
+UPSTREAM_HTTP_TRANSPORT = os.environ.get('UPSTREAM_HTTP_TRANSPORT') or None
+
+# Predictions: seed the noise per (symbol, last bar date, model version) and memoize
+# results by input content hash, so repeat requests on the same data return the same numbers
+PREDICTION_DETERMINISTIC = True
+PREDICTION_MEMO_SIZE = 4096
+
+# Forecasting model used when a request does not name one ('sma', 'linear', 'holt', 'ar')
+FORECAST_MODEL = os.environ.get('FORECAST_MODEL', 'sma')
+FORECAST_PARAMS_CACHE_SIZE = 16384
+
+# predict_stock serves forecasts written by `manage.py snapshot_predictions` while the
+# newest snapshot is younger than this many seconds
+PREDICTION_SNAPSHOT_MAX_AGE = 36 * 60 * 60
+
+# Batch prediction: maximum symbols per request and concurrent upstream fetches
+BATCH_PREDICT_MAX_SYMBOLS = 100
+BATCH_PREDICT_MAX_WORKERS = 8
+
+# Prediction charts are downsampled to this many points (clients may ask for up to
+# CHART_MAX_POINTS_LIMIT with ?points=)
+CHART_MAX_POINTS = 120
+CHART_MAX_POINTS_LIMIT = 1000
+
+# Cache-Control max-age of market-data API responses while DSE is open / closed
+API_CACHE_MAX_AGE_OPEN = 60
+API_CACHE_MAX_AGE_CLOSED = 15 * 60
+
+# Live quote stream (/api/quotes/stream/, Server-Sent Events; serve through asgi.py).
+# Heartbeat every QUOTE_STREAM_HEARTBEAT seconds; clients that leave quotes unread for
+# QUOTE_STREAM_MAX_STALL seconds are dropped; other processes' cache writes are picked up
+# every QUOTE_STREAM_POLL_INTERVAL seconds, by a thread that stops QUOTE_WATCH_IDLE seconds
+# after the last /api/quotes/ poll
+QUOTE_STREAM_HEARTBEAT = 15
+QUOTE_STREAM_MAX_STALL = 60
+QUOTE_STREAM_POLL_INTERVAL = 2.0
+QUOTE_WATCH_IDLE = 300
+QUOTE_STREAM_MAX_SYMBOLS = 100
+
+# Most orders accepted in one /api/orders/bulk/ basket
+BULK_ORDER_MAX = 500
+
+# `manage.py archive_orders` moves orders older than this many days out of the hot
+# table, ORDER_ARCHIVE_BATCH_SIZE rows per transaction
+ORDER_ARCHIVE_AFTER_DAYS = 365
+ORDER_ARCHIVE_BATCH_SIZE = 1000
+
+# /api/metrics/ is for staff, or for a scraper sending "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
 # Email Configuration
 # Use SMTP backend to send actual emails
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'